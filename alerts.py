@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Alert Delivery
+Price drops are queued and sent from a background thread, so a slow mail
+server never blocks a monitoring pass. Changes for the same recipient are
+coalesced into one digest per time window, and messages go over one SMTP
+connection that is kept open between digests and reopened when the server
+drops it. A suppression index keeps the same drop from being alerted
+again on every pass.
+"""
+
+import logging
+import math
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import NULL_METRICS
+from storage import Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMAIL = {
+    "smtp_server": "smtp.gmail.com",
+    "smtp_port": 587,
+    "smtp_security": "starttls",     # "starttls", "ssl" (port 465) or "none"
+    "smtp_timeout": 30,
+    "sender_email": "",
+    "sender_password": "",
+    "receiver_email": "",            # One address, or several separated by commas
+    "digest_seconds": 60,            # Price drops queued within this window share one email
+    "idle_seconds": 240,             # Close the SMTP connection after this long without mail
+    "max_send_attempts": 3,
+    "retry_seconds": 60
+}
+
+DEFAULT_SUPPRESSION = {
+    "cooldown_hours": 24,            # Don't alert a seller's price again within this time (0 = off)
+    "bucket_pct": 1.0,               # Prices within this percentage count as the same price
+    "refresh_seconds": 60            # Reload alerts sent by other nodes sharing the database
+}
+
+# Errors after which the connection is reopened and the message sent once more
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def parse_recipients(value) -> List[str]:
+    """receiver_email as a list, from a comma separated string or a list"""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [address.strip() for address in value or [] if address and address.strip()]
+
+
+class SMTPSender:
+    """One SMTP connection reused across messages"""
+
+    def __init__(self, host: str, port: int, username: str = '', password: str = '', security: str = 'starttls',
+                 timeout: float = 30, idle_seconds: float = 240, metrics=NULL_METRICS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self.idle_seconds = idle_seconds
+        self.metrics = metrics
+        self.server: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        with self.metrics.time('price_tracker_smtp_seconds', operation='connect'):
+            if self.security == 'ssl':
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.security == 'starttls':
+                    server.starttls()
+                if self.password:
+                    server.login(self.username, self.password)
+            except Exception:
+                server.close()
+                raise
+        self.server = server
+        logger.debug(f"SMTP connection opened to {self.host}:{self.port}")
+
+    def send(self, sender: str, recipient: str, message: str):
+        """Send one message, reconnecting once if the connection was dropped"""
+        # Servers close idle connections, reopening is cheaper than a failed send
+        if self.server is not None and time.monotonic() - self.last_used > self.idle_seconds:
+            self.close()
+        for attempt in range(2):
+            if self.server is None:
+                self._connect()
+            try:
+                with self.metrics.time('price_tracker_smtp_seconds', operation='send'):
+                    self.server.sendmail(sender, recipient, message)
+                self.last_used = time.monotonic()
+                return
+            except RECONNECT_ERRORS:
+                self.close()
+                if attempt:
+                    raise
+                logger.debug("SMTP connection lost, reconnecting")
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+
+class AlertDispatcher:
+    """
+    Per-recipient digest queue drained by a background thread. A digest is
+    sent digest_seconds after its first change was queued; a newer change
+    for the same product and seller replaces the queued one.
+    """
+
+    def __init__(self, sender: SMTPSender, from_address: str, recipients: List[str],
+                 render: Callable[[List[Dict]], Tuple[str, str]],
+                 on_sent: Optional[Callable[[str, List[Dict], str], None]] = None,
+                 on_dropped: Optional[Callable[[List[Dict]], None]] = None,
+                 digest_seconds: float = 60, max_attempts: int = 3, retry_seconds: float = 60,
+                 metrics=NULL_METRICS):
+        self.sender = sender
+        self.from_address = from_address
+        self.recipients = recipients
+        self.render = render
+        self.on_sent = on_sent
+        self.on_dropped = on_dropped
+        self.digest_seconds = digest_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self.metrics = metrics
+
+        # recipient -> {(product_id, seller_name): change}, due time and failed attempts
+        self.pending: Dict[str, Dict[Tuple, Dict]] = {}
+        self.due_at: Dict[str, float] = {}
+        self.attempts: Dict[str, int] = {}
+        # id(change) -> [change, recipients still to send it to, whether any recipient got it]
+        self.deliveries: Dict[int, list] = {}
+        self.sending = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+
+    def enqueue(self, changes: List[Dict]):
+        """Queue price changes for every recipient, returns immediately"""
+        if not changes:
+            return
+        now = time.monotonic()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Alert dispatcher is closed")
+            for change in changes:
+                self.deliveries[id(change)] = [change, set(self.recipients), False]
+            for recipient in self.recipients:
+                queued = self.pending.setdefault(recipient, {})
+                for change in changes:
+                    replaced = queued.get((change['product_id'], change['seller_name']))
+                    if replaced is not None:
+                        # The recipient gets the newer change instead
+                        self._settle(replaced, recipient, True)
+                    queued[(change['product_id'], change['seller_name'])] = change
+                self.due_at.setdefault(recipient, now + self.digest_seconds)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _settle(self, change: Dict, recipient: str, delivered: bool) -> bool:
+        """
+        Mark change as done for recipient. True when every recipient is done
+        and none received it (call with the condition held).
+        """
+        delivery = self.deliveries.get(id(change))
+        if delivery is None:
+            return False
+        delivery[1].discard(recipient)
+        delivery[2] = delivery[2] or delivered
+        if delivery[1]:
+            return False
+        del self.deliveries[id(change)]
+        return not delivery[2]
+
+    def _take_due(self) -> Optional[List[Tuple[str, List[Dict]]]]:
+        """
+        Wait until digests are due and take them off the queue. Returns an
+        empty list when the connection has been idle for idle_seconds, and
+        None once the dispatcher is closed and drained.
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                due = [recipient for recipient, due_at in self.due_at.items() if due_at <= now or self.closed]
+                if due:
+                    digests = []
+                    for recipient in due:
+                        del self.due_at[recipient]
+                        digests.append((recipient, list(self.pending.pop(recipient).values())))
+                    self.sending += 1
+                    return digests
+                if self.closed:
+                    return None
+                timeout = min(self.due_at.values()) - now if self.due_at else None
+                if self.sender.server is not None:
+                    idle_timeout = self.sender.last_used + self.sender.idle_seconds - now
+                    if idle_timeout <= 0:
+                        return []
+                    timeout = idle_timeout if timeout is None else min(timeout, idle_timeout)
+                self.condition.wait(timeout)
+
+    def _run(self):
+        while True:
+            digests = self._take_due()
+            if digests is None:
+                return
+            if not digests:
+                self.sender.close()
+                continue
+            try:
+                for recipient, changes in digests:
+                    self._deliver(recipient, changes)
+            finally:
+                with self.condition:
+                    self.sending -= 1
+                    self.condition.notify_all()
+
+    def _deliver(self, recipient: str, changes: List[Dict]):
+        subject, body = self.render(changes)
+        msg = MIMEMultipart()
+        msg['From'] = self.from_address
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html'))
+
+        try:
+            self.sender.send(self.from_address, recipient, msg.as_string())
+        except Exception as e:
+            self._failed(recipient, changes, e)
+            return
+
+        self.metrics.inc('price_tracker_alerts_total', result='sent')
+        logger.info(f"Price alert sent to {recipient}: {len(changes)} products")
+        with self.condition:
+            self.attempts.pop(recipient, None)
+            for change in changes:
+                self._settle(change, recipient, True)
+        if self.on_sent is not None:
+            try:
+                self.on_sent(recipient, changes, subject)
+            except Exception as e:
+                logger.error(f"Could not log sent alert: {e}")
+
+    def _failed(self, recipient: str, changes: List[Dict], error: Exception):
+        """Put a failed digest back in the queue, or drop it after max_attempts"""
+        attempts = self.attempts.get(recipient, 0) + 1
+        with self.condition:
+            dropped = attempts >= self.max_attempts or self.closed
+            if dropped:
+                self.attempts.pop(recipient, None)
+                # Only changes no other recipient received count as never alerted
+                lost = [change for change in changes if self._settle(change, recipient, False)]
+            else:
+                self.attempts[recipient] = attempts
+        if dropped:
+            self.metrics.inc('price_tracker_alerts_total', result='failed')
+            logger.error(f"Could not send email to {recipient} ({attempts} attempts), "
+                         f"{len(changes)} price changes dropped: {error}")
+            if lost and self.on_dropped is not None:
+                self.on_dropped(lost)
+            return
+
+        with self.condition:
+            queued = self.pending.setdefault(recipient, {})
+            for change in changes:
+                key = (change['product_id'], change['seller_name'])
+                # Changes queued while sending are newer, keep them
+                if key in queued:
+                    self._settle(change, recipient, True)
+                else:
+                    queued[key] = change
+            self.due_at[recipient] = min(self.due_at.get(recipient, float('inf')),
+                                         time.monotonic() + self.retry_seconds)
+        self.metrics.inc('price_tracker_alerts_total', result='retried')
+        logger.warning(f"Could not send email to {recipient}, retrying in {self.retry_seconds}s: {error}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Send all queued digests now and wait for them; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            for recipient in self.due_at:
+                self.due_at[recipient] = 0.0
+            self.condition.notify_all()
+            while self.due_at or self.sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 30):
+        """Send what is still queued (one attempt each) and stop the thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                logger.warning("Alert dispatcher did not finish within the timeout, queued alerts lost")
+        self.sender.close()
+
+
+class AlertSuppressionIndex:
+    """
+    Recently alerted (product_id, seller_name, price bucket) keys with the
+    time of the alert. Lookups go to an in-memory dict; the keys are also
+    written to the alert_suppression table, so they survive a restart and
+    are seen by other nodes sharing the database.
+    """
+
+    def __init__(self, db: Database, cooldown_hours: float = 24, bucket_pct: float = 1.0,
+                 refresh_seconds: float = 60, metrics=NULL_METRICS):
+        self.db = db
+        self.cooldown = cooldown_hours * 3600
+        # Log-scale buckets: the same relative width at $5 and at $500
+        self.bucket_base = math.log1p(max(bucket_pct, 0.01) / 100)
+        self.refresh_seconds = refresh_seconds
+        self.metrics = metrics
+        self.alerted: Dict[Tuple[int, str, int], float] = {}
+        self.lock = threading.Lock()
+        self.loaded_until = 0.0
+        self.last_refresh = float('-inf')
+
+    def bucket(self, price: Optional[float]) -> int:
+        if not price or price <= 0:
+            return 0
+        return math.floor(math.log(price) / self.bucket_base)
+
+    def key(self, change: Dict) -> Tuple[int, str, int]:
+        return change['product_id'], change['seller_name'], self.bucket(change['current_price'])
+
+    def _refresh(self, now: float):
+        """Drop expired keys and load keys written since the last refresh (by any node)"""
+        expired_before = now - self.cooldown
+        self.alerted = {key: alerted_at for key, alerted_at in self.alerted.items() if alerted_at >= expired_before}
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM alert_suppression WHERE alerted_at < ?', (expired_before,))
+            cursor.execute('''
+                SELECT product_id, seller_name, price_bucket, alerted_at FROM alert_suppression
+                WHERE alerted_at >= ?
+            ''', (max(self.loaded_until, expired_before),))
+            for product_id, seller_name, bucket, alerted_at in cursor.fetchall():
+                key = (product_id, seller_name, bucket)
+                self.alerted[key] = max(self.alerted.get(key, 0.0), alerted_at)
+                self.loaded_until = max(self.loaded_until, alerted_at)
+        self.last_refresh = time.monotonic()
+
+    def filter(self, changes: List[Dict]) -> List[Dict]:
+        """Changes not alerted within the cooldown; they are marked as alerted now"""
+        if self.cooldown <= 0 or not changes:
+            return changes
+        now = time.time()
+        fresh = []
+        with self.lock:
+            if time.monotonic() - self.last_refresh >= self.refresh_seconds:
+                self._refresh(now)
+            for change in changes:
+                key = self.key(change)
+                product_id, seller_name, bucket = key
+                # Neighbouring buckets too, so a price moving across a bucket edge is not news
+                if any(self.alerted.get((product_id, seller_name, neighbour), float('-inf')) >= now - self.cooldown
+                       for neighbour in (bucket - 1, bucket, bucket + 1)):
+                    continue
+                self.alerted[key] = now
+                fresh.append(change)
+            if fresh:
+                with self.db.transaction() as cursor:
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO alert_suppression (product_id, seller_name, price_bucket, alerted_at)
+                        VALUES (?, ?, ?, ?)
+                    ''', [self.key(change) + (now,) for change in fresh])
+
+        suppressed = len(changes) - len(fresh)
+        if suppressed:
+            self.metrics.inc('price_tracker_alerts_suppressed_total', suppressed)
+            logger.info(f"{suppressed} price changes already alerted within the cooldown, suppressed")
+        return fresh
+
+    def forget(self, changes: List[Dict]):
+        """Unmark changes whose alert could not be delivered, so the next check alerts again"""
+        keys = [self.key(change) for change in changes]
+        with self.lock:
+            for key in keys:
+                self.alerted.pop(key, None)
+            with self.db.transaction() as cursor:
+                cursor.executemany('''
+                    DELETE FROM alert_suppression WHERE product_id = ? AND seller_name = ? AND price_bucket = ?
+                ''', keys)
+
+
+def create_suppression_index(db: Database, settings: Dict, metrics=NULL_METRICS) -> AlertSuppressionIndex:
+    """Suppression index for the alert settings"""
+    return AlertSuppressionIndex(db, settings['cooldown_hours'], settings['bucket_pct'],
+                                 settings['refresh_seconds'], metrics)
+
+
+def create_dispatcher(email: Dict, render: Callable[[List[Dict]], Tuple[str, str]],
+                      on_sent: Optional[Callable[[str, List[Dict], str], None]] = None,
+                      on_dropped: Optional[Callable[[List[Dict]], None]] = None,
+                      metrics=NULL_METRICS) -> AlertDispatcher:
+    """Dispatcher for the email settings"""
+    sender = SMTPSender(
+        email['smtp_server'], email['smtp_port'],
+        username=email['sender_email'],
+        password=email['sender_password'],
+        security=email['smtp_security'],
+        timeout=email['smtp_timeout'],
+        idle_seconds=email['idle_seconds'],
+        metrics=metrics
+    )
+    return AlertDispatcher(
+        sender, email['sender_email'], parse_recipients(email['receiver_email']), render, on_sent, on_dropped,
+        digest_seconds=email['digest_seconds'],
+        max_attempts=email['max_send_attempts'],
+        retry_seconds=email['retry_seconds'],
+        metrics=metrics
+    )
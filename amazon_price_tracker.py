@@ -8,10 +8,6 @@ import requests
 from bs4 import BeautifulSoup
 import json
 import time
-import smtplib
-import sqlite3
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import schedule
 import re
@@ -20,16 +16,41 @@ from urllib.parse import urljoin, urlparse
 import os
 from typing import List, Dict, Optional, Tuple
 import random
-
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('price_tracker.log'),
-        logging.StreamHandler()
-    ]
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from alerts import DEFAULT_EMAIL, DEFAULT_SUPPRESSION, create_dispatcher, create_suppression_index
+from rate_limiting import DEFAULT_BLOCKING, BlockedError, HostRateLimiter, create_circuit_breaker
+from session_pool import DEFAULT_SESSIONS, PooledSession, create_session_pool
+from retries import (DEFAULT_RETRIES, RETRY_STATUSES, Deadline, DeadlineExceeded, create_retry_policy,
+                     current_deadline, deadline_scope)
+from storage import Database
+from migrations import migrate, run_backfills
+from retention import DEFAULT_RETENTION, apply_retention
+from offers import DEFAULT_OFFERS, create_offers_fetcher
+from page_cache import PageCache
+from parse_pool import create_parse_pool
+from metrics import MetricsServer, create_metrics
+from scheduling import DEFAULT_SCHEDULING, ProductScheduler
+from work_queue import DEFAULT_QUEUE, create_queue, run_worker
+from page_parser import (
+    TITLE_SELECTORS, PRICE_SELECTORS, AVAILABILITY_SELECTORS, OFFER_SELECTOR,
+    PRICE_REGION_IDS, REQUIRED_PRICE_REGION_IDS, PriceRegionScanner,
+    classify_block, create_page_parser, extract_regions, parse_price, parse_json_offer
 )
+
+# Logging setup (parse pool workers import this module too; only the main process writes the log file)
+if multiprocessing.parent_process() is None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('price_tracker.log'),
+            logging.StreamHandler()
+        ]
+    )
 logger = logging.getLogger(__name__)
 
 class AmazonPriceTracker:
@@ -38,23 +59,80 @@ class AmazonPriceTracker:
         self.config = self.load_config(config_file)
         self.session = requests.Session()
         self.setup_session()
+        self.rate_limiter = self._create_rate_limiter()
+        self.page_parser = create_page_parser(self.config['tracking']['parser_backend'])
+        self.region_extraction = self.config['tracking']['region_extraction']
+        self.page_cache = self._create_page_cache()
+        self.parse_pool = None
+        self.offers = create_offers_fetcher(self)
+        # ASIN -> (time, title, availability) of the last full page fetch, for offers-only refreshes
+        self.full_pages: Dict[str, Tuple[float, str, str]] = {}
+        self.last_pass_stats: Dict = {}
+        self.metrics = create_metrics(self.config['metrics'])
+        self.circuit_breaker = create_circuit_breaker(self.config['blocking'], self.metrics)
+        self.retry_policy = create_retry_policy(self.config['retries'], self.config['tracking']['max_retries'],
+                                                self.metrics)
+        self.pass_deadline = None  # Set while monitor_all_products runs
+        # Several sessions (proxies, cookie jars) instead of self.session when enabled
+        self.sessions = create_session_pool(self.config['sessions'], self._create_pooled_session,
+                                            self.config['amazon']['user_agents'], self.metrics)
+        self.metrics_server = None
+        database = self.config['database']
+        self.db = Database(database['path'], database['batch_size'], change_only=database['change_only_history'],
+                           metrics=self.metrics)
         self.init_database()
+        self.alert_index = create_suppression_index(self.db, self.config['alerts'], self.metrics)
+        self.alerts = create_dispatcher(self.config['email'], self._render_alert, self._log_email_sent,
+                                        self._alert_dropped, self.metrics)
         
     def load_config(self, config_file: str) -> Dict:
         """Load configuration file"""
         default_config = {
-            "email": {
-                "smtp_server": "smtp.gmail.com",
-                "smtp_port": 587,
-                "sender_email": "",
-                "sender_password": "",
-                "receiver_email": ""
-            },
+            "email": dict(DEFAULT_EMAIL),
+            "alerts": dict(DEFAULT_SUPPRESSION),
             "tracking": {
                 "check_interval_hours": 6,
                 "price_drop_threshold": 5.0,
                 "max_retries": 3,
-                "delay_between_requests": 2
+                "delay_between_requests": 2,
+                "max_workers": 4,
+                "requests_per_second_per_host": None,
+                "fetch_mode": "threads",
+                "max_in_flight": 200,
+                "connections_per_host": 20,
+                "parser_backend": "auto",
+                "region_extraction": True,
+                "parse_processes": 0,
+                "parse_batch_size": 8
+            },
+            "database": {
+                "path": "price_tracker.db",
+                "batch_size": 1000,
+                "backfill_chunk_size": 50000,
+                "change_only_history": True
+            },
+            "retention": dict(DEFAULT_RETENTION),
+            "scheduling": dict(DEFAULT_SCHEDULING),
+            "queue": dict(DEFAULT_QUEUE),
+            "blocking": dict(DEFAULT_BLOCKING),
+            "retries": dict(DEFAULT_RETRIES),
+            "sessions": dict(DEFAULT_SESSIONS),
+            "offers": dict(DEFAULT_OFFERS),
+            "price_only": {
+                "enabled": False,
+                "full_refresh_hours": 24,
+                "lookahead_kb": 64
+            },
+            "cache": {
+                "enabled": True,
+                "directory": "page_cache",
+                "ttl_seconds": 600,
+                "max_mb": 500
+            },
+            "metrics": {
+                "enabled": False,
+                "host": "127.0.0.1",
+                "port": 9108
             },
             "amazon": {
                 "base_url": "https://www.amazon.com",
@@ -70,8 +148,12 @@ class AmazonPriceTracker:
             try:
                 with open(config_file, 'r', encoding='utf-8') as f:
                     user_config = json.load(f)
-                    # Merge with defaults
-                    default_config.update(user_config)
+                    # Merge with defaults (section by section so new keys keep their defaults)
+                    for key, value in user_config.items():
+                        if isinstance(value, dict) and isinstance(default_config.get(key), dict):
+                            default_config[key].update(value)
+                        else:
+                            default_config[key] = value
             except Exception as e:
                 logger.warning(f"Config file could not be loaded: {e}, using default settings")
         else:
@@ -84,63 +166,63 @@ class AmazonPriceTracker:
     
     def setup_session(self):
         """Setup HTTP session settings"""
-        self.session.headers.update({
-            'User-Agent': random.choice(self.config['amazon']['user_agents']),
+        self._configure_session(self.session, random.choice(self.config['amazon']['user_agents']))
+    
+    def _configure_session(self, session: requests.Session, user_agent: str):
+        session.headers.update({
+            'User-Agent': user_agent,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
+        # One keep-alive connection per worker, the default pool (10) drops connections above that
+        pool_size = max(10, self.config['tracking']['max_workers'])
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    
+    def _create_pooled_session(self, proxy: Optional[str], user_agent: str) -> requests.Session:
+        """Session of the session pool: own cookie jar and User-Agent, optionally behind a proxy"""
+        session = requests.Session()
+        self._configure_session(session, user_agent)
+        if proxy:
+            session.proxies = {'http': proxy, 'https': proxy}
+        return session
+    
+    def _acquire_session(self, url: str):
+        """Pooled session for a request to url, None without a session pool"""
+        if self.sessions is None:
+            return None
+        return self.sessions.acquire(url, lambda pooled: not self.circuit_breaker.is_open(url, pooled.route))
+    
+    def _release_session(self, pooled, outcome: Optional[str]):
+        """Return a pooled session with the request's outcome (None: no request was sent)"""
+        if pooled is not None:
+            self.sessions.release(pooled, outcome)
+    
+    def _create_rate_limiter(self) -> HostRateLimiter:
+        """Create per-host rate limiter from tracking settings"""
+        tracking = self.config['tracking']
+        rate = tracking.get('requests_per_second_per_host')
+        if not rate:
+            delay = tracking['delay_between_requests']
+            rate = 1.0 / delay if delay > 0 else 1000.0
+        return HostRateLimiter(rate)
+    
+    def _create_page_cache(self) -> Optional[PageCache]:
+        """Create on-disk page cache from cache settings"""
+        cache = self.config['cache']
+        if not cache['enabled']:
+            return None
+        return PageCache(cache['directory'], cache['ttl_seconds'], cache['max_mb'] * 1024 * 1024)
     
     def init_database(self):
-        """Initialize SQLite database"""
-        conn = sqlite3.connect('price_tracker.db')
-        cursor = conn.cursor()
-        
-        # Products table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE NOT NULL,
-                title TEXT,
-                asin TEXT,
-                target_price REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_checked TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE
-            )
-        ''')
-        
-        # Price history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id INTEGER,
-                seller_name TEXT,
-                price REAL,
-                availability TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (product_id) REFERENCES products (id)
-            )
-        ''')
-        
-        # Email history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id INTEGER,
-                email_type TEXT,
-                sent_to TEXT,
-                subject TEXT,
-                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (product_id) REFERENCES products (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized")
+        """Initialize SQLite database (apply pending schema migrations)"""
+        version = migrate(self.db)
+        run_backfills(self.db, self.config['database']['backfill_chunk_size'])
+        logger.info(f"Database initialized (schema version {version})")
     
     def extract_asin_from_url(self, url: str) -> Optional[str]:
         """Extract ASIN from Amazon URL"""
@@ -175,24 +257,22 @@ class AmazonPriceTracker:
         if not asin:
             raise ValueError("Invalid Amazon URL")
         
-        # Rotate user agent
-        self.session.headers['User-Agent'] = random.choice(self.config['amazon']['user_agents'])
-        
         try:
-            response = self.session.get(url)
-            response.raise_for_status()
+            if self.config['offers']['enabled']:
+                product_info = self._get_offers_info(url, asin)
+                if product_info is not None:
+                    return product_info
+            elif self.config['price_only']['enabled']:
+                product_info = self._get_price_only_info(url, asin)
+                if product_info is not None:
+                    return product_info
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            product_info = {
-                'asin': asin,
-                'url': url,
-                'title': self._extract_title(soup),
-                'sellers': self._extract_sellers(soup, asin),
-                'main_price': self._extract_main_price(soup),
-                'availability': self._extract_availability(soup),
-                'timestamp': datetime.now().isoformat()
-            }
+            content, pooled = self._fetch_page(url, asin)
+            product_info = self._parse_page(content, url, asin)
+            if not product_info['sellers'] and product_info['title'] == "Title not found":
+                # Neither title nor price: a block page we don't recognize, or an error page
+                self._record_empty_page(url, asin, pooled)
+            self.full_pages[asin] = (time.monotonic(), product_info['title'], product_info['availability'])
             
             logger.info(f"Product info fetched: {product_info['title']}")
             return product_info
@@ -201,16 +281,285 @@ class AmazonPriceTracker:
             logger.error(f"Could not fetch product info: {e}")
             raise
     
+    def _get_offers_info(self, url: str, asin: str) -> Optional[Dict]:
+        """
+        Product info with seller prices from the offers fragment, and title
+        and availability from the last full page fetch. None when the full
+        page is due (or the fragment had no offers).
+        """
+        full_page = self._recent_full_page(asin, self.config['offers']['full_page_hours'])
+        if full_page is None:
+            return None
+        title, availability = full_page
+        
+        sellers = self.offers.fetch(url, asin)
+        if not sellers:
+            logger.debug(f"No offers for {asin}, fetching the full page")
+            return None
+        
+        return {
+            'asin': asin,
+            'url': url,
+            'title': title,
+            'sellers': sellers,
+            'main_price': next((seller['price'] for seller in sellers if seller['name'] == 'Amazon'), None),
+            'availability': availability,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _get_price_only_info(self, url: str, asin: str) -> Optional[Dict]:
+        """
+        Product info from the price and offer regions of a partly downloaded
+        page, with title and availability from the last full page fetch.
+        None when the full page is due (or the price region was not found).
+        """
+        full_page = self._recent_full_page(asin, self.config['price_only']['full_refresh_hours'])
+        if full_page is None:
+            return None
+        title, availability = full_page
+        
+        content = extract_regions(self._download_price_regions(url, asin), PRICE_REGION_IDS, REQUIRED_PRICE_REGION_IDS)
+        if content is None:
+            logger.debug(f"No price region for {asin}, fetching the full page")
+            return None
+        
+        product_info = self._parse_page(content, url, asin)
+        product_info['title'] = title
+        product_info['availability'] = availability
+        return product_info
+    
+    def _recent_full_page(self, asin: str, max_age_hours: float) -> Optional[Tuple[str, str]]:
+        """(title, availability) of the last full page fetch, None if there was none within max_age_hours"""
+        full_page = self.full_pages.get(asin)
+        if full_page is None or time.monotonic() - full_page[0] > max_age_hours * 3600:
+            return None
+        return full_page[1:]
+    
+    def cache_key(self, url: str, asin: str) -> str:
+        """Page cache key: marketplace host and ASIN, whatever the URL looked like"""
+        return f"{urlparse(url).netloc.lower()}/dp/{asin}"
+    
+    def _download_page(self, url: str, asin: str, cache_key: Optional[str] = None, kind: str = 'page') -> bytes:
+        """Download a product page, served from the page cache while fresh"""
+        return self._fetch_page(url, asin, cache_key, kind)[0]
+    
+    def _fetch_page(self, url: str, asin: str, cache_key: Optional[str] = None,
+                    kind: str = 'page') -> Tuple[bytes, Optional[PooledSession]]:
+        """_download_page, also returning the pooled session that fetched it (None: cached or no pool)"""
+        cached = None
+        if self.page_cache is not None:
+            key = cache_key or self.cache_key(url, asin)
+            cached = self.page_cache.get(key)
+            if cached and cached.is_fresh(self.page_cache.ttl_seconds):
+                logger.debug(f"Page cache hit: {key}")
+                self.metrics.inc('price_tracker_page_cache_total', result='hit')
+                return cached.content, None
+        
+        pooled = self._acquire_session(url)
+        session, route = (pooled.session, pooled.route) if pooled else (self.session, None)
+        # Rotate user agent (per request, the session is shared between workers); pooled sessions keep theirs
+        headers = {} if pooled else {'User-Agent': random.choice(self.config['amazon']['user_agents'])}
+        if cached:
+            headers.update(cached.conditional_headers())
+        
+        outcome = None
+        try:
+            self.circuit_breaker.acquire(url, current_deadline().remaining(), route)
+            self.rate_limiter.acquire(url, route)
+            outcome = 'error'
+            try:
+                with self.metrics.time('price_tracker_http_request_seconds'):
+                    response = session.get(url, headers=headers, timeout=self.retry_policy.timeouts())
+                self.metrics.inc('price_tracker_http_responses_total', status=response.status_code)
+                self._check_blocked(url, response.status_code, response.content, route)
+                if response.status_code != 304 or not cached:
+                    response.raise_for_status()
+            except BlockedError:
+                outcome = 'blocked'
+                raise
+            except Exception:
+                self.circuit_breaker.record_failure(url, route)
+                raise
+            self.circuit_breaker.record_success(url, route)
+            outcome = 'ok'
+        finally:
+            self._release_session(pooled, outcome)
+        
+        if response.status_code == 304:
+            self.page_cache.refresh(key)
+            self.metrics.inc('price_tracker_page_cache_total', result='revalidated')
+            return cached.content, pooled
+        
+        self.metrics.inc('price_tracker_http_bytes_total', len(response.content), kind=kind)
+        if self.page_cache is not None:
+            self.metrics.inc('price_tracker_page_cache_total', result='miss')
+            self.page_cache.put(key, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content, pooled
+    
+    def _download_price_regions(self, url: str, asin: str) -> bytes:
+        """
+        Stream a product page and stop reading once its price and offer
+        regions are complete. A fresh cached full page is used instead.
+        The partial page is not cached.
+        """
+        if self.page_cache is not None:
+            cached = self.page_cache.get(self.cache_key(url, asin))
+            if cached and cached.is_fresh(self.page_cache.ttl_seconds):
+                self.metrics.inc('price_tracker_page_cache_total', result='hit')
+                return cached.content
+        
+        pooled = self._acquire_session(url)
+        session, route = (pooled.session, pooled.route) if pooled else (self.session, None)
+        headers = {} if pooled else {'User-Agent': random.choice(self.config['amazon']['user_agents'])}
+        scanner = PriceRegionScanner(self.config['price_only']['lookahead_kb'] * 1024)
+        
+        outcome = None
+        try:
+            self.circuit_breaker.acquire(url, current_deadline().remaining(), route)
+            self.rate_limiter.acquire(url, route)
+            outcome = 'error'
+            try:
+                with self.metrics.time('price_tracker_http_request_seconds'):
+                    # Closing before the end drops the keep-alive connection, the saved transfer has to outweigh a reconnect
+                    with session.get(url, headers=headers, stream=True,
+                                     timeout=self.retry_policy.timeouts()) as response:
+                        self.metrics.inc('price_tracker_http_responses_total', status=response.status_code)
+                        if response.ok:
+                            for chunk in response.iter_content(chunk_size=16384):
+                                if scanner.feed(chunk):
+                                    break
+                            content = scanner.content
+                        else:
+                            content = response.content
+                self._check_blocked(url, response.status_code, content, route)
+                response.raise_for_status()
+            except BlockedError:
+                outcome = 'blocked'
+                raise
+            except Exception:
+                self.circuit_breaker.record_failure(url, route)
+                raise
+            self.circuit_breaker.record_success(url, route)
+            outcome = 'ok'
+        finally:
+            self._release_session(pooled, outcome)
+        
+        self.metrics.inc('price_tracker_http_bytes_total', len(content), kind='price_only')
+        return content
+    
+    def _check_blocked(self, url: str, status: int, content: bytes, route: Optional[str] = None):
+        """Raise BlockedError (and open the host's circuit) for a captcha or throttling response"""
+        reason = classify_block(status, content)
+        if reason is not None:
+            self.circuit_breaker.record_block(url, reason, route)
+            raise BlockedError(urlparse(url).netloc.lower(), reason)
+    
+    def _record_empty_page(self, url: str, asin: str, pooled: Optional[PooledSession] = None):
+        """Count a page without title or price as a block page of the session that fetched it"""
+        # It was cached as a product page; a retry has to reach the host
+        if self.page_cache is not None:
+            self.page_cache.remove(self.cache_key(url, asin))
+        if pooled is not None:
+            self.sessions.record_block(pooled)
+        self.circuit_breaker.record_block(url, 'empty', pooled.route if pooled else None)
+        raise BlockedError(urlparse(url).netloc.lower(), 'empty')
+    
+    def _parse_page(self, content: bytes, url: str, asin: str) -> Dict:
+        """Parse in the parse pool when it is running, otherwise in this thread"""
+        parse_pool = self.parse_pool
+        if parse_pool is not None:
+            try:
+                with self.metrics.time('price_tracker_parse_seconds', stage='parse_pool'):
+                    return parse_pool.parse(content, url, asin)
+            except BrokenProcessPool as e:
+                logger.error(f"Parse pool failed, parsing in-process from now on: {e}")
+                self.parse_pool = None
+        return self.parse_product_page(content, url, asin)
+    
+    def start_parse_pool(self):
+        """Start and warm up the parser processes (tracking.parse_processes > 0)"""
+        if self.parse_pool is None:
+            self.parse_pool = create_parse_pool(self.config['tracking'])
+    
+    def parse_product_page(self, content: bytes, url: str, asin: str) -> Dict:
+        """Parse a downloaded product page into product information"""
+        metrics = self.metrics
+        if self.region_extraction:
+            # Build the DOM from the product regions only (full page if they are missing)
+            with metrics.time('price_tracker_parse_seconds', stage='regions'):
+                content = extract_regions(content) or content
+        
+        if self.page_parser is not None:
+            with metrics.time('price_tracker_parse_seconds', stage=self.page_parser.name):
+                fields = self.page_parser.parse(content)
+        else:
+            # BeautifulSoup fallback
+            with metrics.time('price_tracker_parse_seconds', stage='beautifulsoup'):
+                soup = BeautifulSoup(content, 'html.parser')
+            with metrics.time('price_tracker_extract_seconds', function='_extract_main_price'):
+                main_price = self._extract_main_price(soup)
+            with metrics.time('price_tracker_extract_seconds', function='_extract_title'):
+                title = self._extract_title(soup)
+            with metrics.time('price_tracker_extract_seconds', function='_extract_sellers'):
+                sellers = self._extract_sellers(soup, asin, main_price)
+            with metrics.time('price_tracker_extract_seconds', function='_extract_availability'):
+                availability = self._extract_availability(soup)
+            fields = {
+                'title': title,
+                'sellers': sellers,
+                'main_price': main_price,
+                'availability': availability
+            }
+        
+        return {
+            'asin': asin,
+            'url': url,
+            'title': fields['title'],
+            'sellers': fields['sellers'],
+            'main_price': fields['main_price'],
+            'availability': fields['availability'],
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _get_product_info_with_retries(self, url: str) -> Dict:
+        """
+        Fetch product information, retrying timeouts, connection errors and
+        5xx responses with backoff, up to max_retries times and within the
+        product's deadline
+        """
+        policy = self.retry_policy
+        deadline = policy.product_deadline(self.pass_deadline)
+        if deadline.expired():
+            policy.stats.record_deadline()
+            raise DeadlineExceeded(f"No time left in this pass to check {url}")
+        
+        with deadline_scope(deadline):
+            attempt = 0
+            while True:
+                started_at = time.monotonic()
+                try:
+                    return self.get_product_info(url)
+                except requests.RequestException as e:
+                    if not self._is_retryable(e):
+                        raise
+                    delay = policy.next_delay(attempt, deadline)
+                    if delay is None:
+                        raise
+                    policy.record_retry(time.monotonic() - started_at, delay, type(e).__name__)
+                    attempt += 1
+                    logger.warning(f"Retrying {url} in {delay:.1f}s ({attempt}/{policy.max_retries}): {e}")
+                    time.sleep(delay)
+    
+    @staticmethod
+    def _is_retryable(error: requests.RequestException) -> bool:
+        """GET is idempotent: retry anything that may go through on a second try"""
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in RETRY_STATUSES
+        return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+    
     def _extract_title(self, soup: BeautifulSoup) -> str:
         """Extract product title"""
-        selectors = [
-            '#productTitle',
-            '.product-title',
-            'h1.a-size-large',
-            '[data-feature-name="title"] h1'
-        ]
-        
-        for selector in selectors:
+        for selector in TITLE_SELECTORS:
             element = soup.select_one(selector)
             if element:
                 return element.get_text(strip=True)
@@ -219,14 +568,7 @@ class AmazonPriceTracker:
     
     def _extract_main_price(self, soup: BeautifulSoup) -> Optional[float]:
         """Extract main price"""
-        price_selectors = [
-            '.a-price-current .a-offscreen',
-            '.a-price .a-offscreen',
-            '#corePrice_feature_div .a-price .a-offscreen',
-            '.a-price-whole'
-        ]
-        
-        for selector in price_selectors:
+        for selector in PRICE_SELECTORS:
             element = soup.select_one(selector)
             if element:
                 price_text = element.get_text(strip=True)
@@ -238,26 +580,20 @@ class AmazonPriceTracker:
     
     def _extract_availability(self, soup: BeautifulSoup) -> str:
         """Extract stock status"""
-        availability_selectors = [
-            '#availability span',
-            '.a-color-success',
-            '.a-color-state',
-            '[data-feature-name="availability"] span'
-        ]
-        
-        for selector in availability_selectors:
+        for selector in AVAILABILITY_SELECTORS:
             element = soup.select_one(selector)
             if element:
                 return element.get_text(strip=True)
         
         return "Status unknown"
     
-    def _extract_sellers(self, soup: BeautifulSoup, asin: str) -> List[Dict]:
-        """Extract different sellers and their prices"""
+    def _extract_sellers(self, soup: BeautifulSoup, asin: str, main_price: Optional[float] = None) -> List[Dict]:
+        """Extract different sellers and their prices (pass main_price if already extracted)"""
         sellers = []
         
         # Main seller (Amazon or default)
-        main_price = self._extract_main_price(soup)
+        if main_price is None:
+            main_price = self._extract_main_price(soup)
         if main_price:
             sellers.append({
                 'name': 'Amazon',
@@ -267,7 +603,7 @@ class AmazonPriceTracker:
             })
         
         # Extract other sellers from "More Buying Choices" section
-        seller_elements = soup.select('#aod-offer-list [data-aod-offer-id]')
+        seller_elements = soup.select(OFFER_SELECTOR)
         for element in seller_elements:
             try:
                 seller_info = self._parse_seller_element(element)
@@ -333,65 +669,29 @@ class AmazonPriceTracker:
     
     def _parse_json_offer(self, offer: Dict) -> Optional[Dict]:
         """Extract seller info from JSON offer"""
-        try:
-            return {
-                'name': offer.get('seller', {}).get('name', 'Unknown'),
-                'price': float(offer.get('price', 0)),
-                'shipping': 'Unknown',
-                'prime': False
-            }
-        except:
-            return None
+        return parse_json_offer(offer)
     
     def _parse_price(self, price_text: str) -> Optional[float]:
         """Convert price text to number"""
-        if not price_text:
-            return None
-        
-        # Remove currency symbols and clean
-        price_clean = re.sub(r'[^\d.,]', '', price_text)
-        price_clean = price_clean.replace(',', '')
-        
-        try:
-            return float(price_clean)
-        except ValueError:
-            return None
+        return parse_price(price_text)
     
     def add_product(self, url: str, target_price: Optional[float] = None) -> int:
-        """Add product to track"""
+        """Add product to track (re-adding a tracked ASIN updates it and keeps its ID)"""
         try:
             product_info = self.get_product_info(url)
-            
-            conn = sqlite3.connect('price_tracker.db')
-            cursor = conn.cursor()
-            
-            # Add product to database
-            cursor.execute('''
-                INSERT OR REPLACE INTO products (url, title, asin, target_price)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                product_info['url'],
-                product_info['title'],
-                product_info['asin'],
-                target_price
-            ))
-            
-            product_id = cursor.lastrowid
-            
+
+            product_id = self.upsert_products([{
+                'url': product_info['url'],
+                'title': product_info['title'],
+                'asin': product_info['asin'],
+                'target_price': target_price
+            }])[product_info['asin']]
+
             # Save initial price information
-            for seller in product_info['sellers']:
-                cursor.execute('''
-                    INSERT INTO price_history (product_id, seller_name, price, availability)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    product_id,
-                    seller['name'],
-                    seller['price'],
-                    product_info['availability']
-                ))
-            
-            conn.commit()
-            conn.close()
+            self.db.record_prices(
+                (product_id, seller['name'], seller['price'], product_info['availability'])
+                for seller in product_info['sellers']
+            )
             
             logger.info(f"Product added: {product_info['title']} (ID: {product_id})")
             return product_id
@@ -399,31 +699,84 @@ class AmazonPriceTracker:
         except Exception as e:
             logger.error(f"Could not add product: {e}")
             raise
+
+    def upsert_products(self, products: List[Dict], batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Insert or update products (dicts with url, asin and optional title and
+        target_price) by ASIN, one transaction per batch. Existing rows keep
+        their ID, so their price history stays attached; a missing title or
+        target price keeps the stored one. Returns {asin: product_id}.
+        """
+        product_ids = {}
+        for start in range(0, len(products), batch_size):
+            batch = products[start:start + batch_size]
+            asins = [product['asin'] for product in batch]
+            with self.db.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT INTO products (url, title, asin, target_price)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (asin) DO UPDATE SET
+                        url = excluded.url,
+                        title = COALESCE(excluded.title, products.title),
+                        target_price = COALESCE(excluded.target_price, products.target_price),
+                        is_active = TRUE
+                ''', [(product['url'], product.get('title'), product['asin'], product.get('target_price'))
+                      for product in batch])
+                # lastrowid is not the row's ID after an update, so look the IDs up
+                for chunk in range(0, len(asins), 400):
+                    chunk_asins = asins[chunk:chunk + 400]
+                    cursor.execute(f'''
+                        SELECT asin, id FROM products WHERE asin IN ({','.join('?' * len(chunk_asins))})
+                    ''', chunk_asins)
+                    product_ids.update(cursor.fetchall())
+        return product_ids
+
+    @staticmethod
+    def _failure_result(error: Exception) -> str:
+        """product_checks_total result of a failed fetch"""
+        if isinstance(error, BlockedError):
+            return 'blocked'
+        if isinstance(error, DeadlineExceeded):
+            return 'deadline'
+        return 'error'
     
-    def check_price_changes(self, product_id: int) -> List[Dict]:
-        """Check price changes"""
-        conn = sqlite3.connect('price_tracker.db')
-        cursor = conn.cursor()
-        
+    def check_price_changes(self, product_id: int, current_info: Optional[Dict] = None,
+                            raise_errors: bool = False) -> List[Dict]:
+        """
+        Check price changes (current_info can be passed in when already fetched).
+        Errors recording the prices are logged and give no changes, or are
+        raised with raise_errors so the caller can undo its own writes.
+        """
         # Get product information
-        cursor.execute('SELECT * FROM products WHERE id = ? AND is_active = TRUE', (product_id,))
-        product = cursor.fetchone()
+        product = self.db.query_one('SELECT * FROM products WHERE id = ? AND is_active = TRUE', (product_id,))
         
         if not product:
             return []
         
+        # Fetch current prices; failures are raised so callers can re-queue the product
+        if current_info is None:
+            try:
+                current_info = self._get_product_info_with_retries(product[1])  # URL
+            except Exception as e:
+                self.metrics.inc('price_tracker_product_checks_total', result=self._failure_result(e))
+                raise
+        
         try:
-            # Fetch current prices
-            current_info = self.get_product_info(product[1])  # URL
-            
             # Get previous lowest price
-            cursor.execute('''
+            previous_min_price = self.db.query_one('''
                 SELECT MIN(price) FROM price_history 
-                WHERE product_id = ? AND timestamp > datetime('now', '-7 days')
-            ''', (product_id,))
-            previous_min_price = cursor.fetchone()[0] or float('inf')
+                WHERE product_id = ? AND COALESCE(last_seen, timestamp) > datetime('now', '-7 days')
+            ''', (product_id,))[0] or float('inf')
+            
+            # Bulk-imported products have no title until a page is fetched
+            title = product[2]  # title
+            if title is None and current_info['title'] not in (None, "Title not found"):
+                title = current_info['title']
+                with self.db.transaction() as cursor:
+                    cursor.execute('UPDATE products SET title = ? WHERE id = ? AND title IS NULL', (title, product_id))
             
             price_changes = []
+            new_prices = []
             
             # Check for each seller
             for seller in current_info['sellers']:
@@ -436,7 +789,7 @@ class AmazonPriceTracker:
                     
                     price_changes.append({
                         'product_id': product_id,
-                        'product_title': product[2],  # title
+                        'product_title': title,
                         'seller_name': seller['name'],
                         'current_price': current_price,
                         'previous_min_price': previous_min_price,
@@ -446,34 +799,24 @@ class AmazonPriceTracker:
                         'is_target_reached': current_price <= product[4] if product[4] else False
                     })
                 
-                # Save new price
-                cursor.execute('''
-                    INSERT INTO price_history (product_id, seller_name, price, availability)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    product_id,
-                    seller['name'],
-                    current_price,
-                    current_info['availability']
-                ))
+                new_prices.append((product_id, seller['name'], current_price, current_info['availability']))
             
-            # Update last check time
-            cursor.execute('''
-                UPDATE products SET last_checked = CURRENT_TIMESTAMP WHERE id = ?
-            ''', (product_id,))
-            
-            conn.commit()
-            conn.close()
+            # Save new prices and update last check time (buffered during a monitoring pass)
+            with self.metrics.time('price_tracker_db_seconds', operation='record_prices'):
+                self.db.record_prices(new_prices, product_id)
             
+            self.metrics.inc('price_tracker_product_checks_total', result='ok')
             return price_changes
             
         except Exception as e:
             logger.error(f"Error in price check: {e}")
-            conn.close()
+            self.metrics.inc('price_tracker_product_checks_total', result='error')
+            if raise_errors:
+                raise
             return []
     
     def send_price_alert(self, price_changes: List[Dict]):
-        """Send price alert email"""
+        """Queue a price alert email, sent in the background as part of a per-recipient digest"""
         if not price_changes:
             return
         
@@ -483,34 +826,17 @@ class AmazonPriceTracker:
             logger.warning("Email configuration incomplete, cannot send email")
             return
         
-        try:
-            # Create email content
-            subject = f"Amazon Price Alert - {len(price_changes)} products!"
-            body = self._create_email_body(price_changes)
-            
-            # Send email
-            msg = MIMEMultipart()
-            msg['From'] = email_config['sender_email']
-            msg['To'] = email_config['receiver_email']
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'html'))
-            
-            server = smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'])
-            server.starttls()
-            server.login(email_config['sender_email'], email_config['sender_password'])
-            
-            text = msg.as_string()
-            server.sendmail(email_config['sender_email'], email_config['receiver_email'], text)
-            server.quit()
-            
-            # Log email to history
-            self._log_email_sent(price_changes, subject)
-            
-            logger.info(f"Price alert sent: {len(price_changes)} products")
-            
-        except Exception as e:
-            logger.error(f"Could not send email: {e}")
+        # The same drop is seen again on later passes, e.g. once the 7-day minimum moves on
+        price_changes = self.alert_index.filter(price_changes)
+        if not price_changes:
+            return
+        
+        self.alerts.enqueue(price_changes)
+        logger.info(f"Price alert queued: {len(price_changes)} products")
+    
+    def _render_alert(self, price_changes: List[Dict]) -> Tuple[str, str]:
+        """Subject and HTML body of an alert email"""
+        return f"Amazon Price Alert - {len(price_changes)} products!", self._create_email_body(price_changes)
     
     def _create_email_body(self, price_changes: List[Dict]) -> str:
         """Create email content"""
@@ -554,100 +880,320 @@ class AmazonPriceTracker:
         
         return html
     
-    def _log_email_sent(self, price_changes: List[Dict], subject: str):
+    def _alert_dropped(self, price_changes: List[Dict]):
+        """No recipient got these alerts, let the next check alert them again"""
+        self.alert_index.forget(price_changes)
+    
+    def _log_email_sent(self, recipient: str, price_changes: List[Dict], subject: str):
         """Log sent email"""
-        conn = sqlite3.connect('price_tracker.db')
-        cursor = conn.cursor()
-        
-        for change in price_changes:
-            cursor.execute('''
+        with self.metrics.time('price_tracker_db_seconds', operation='log_email'), self.db.transaction() as cursor:
+            cursor.executemany('''
                 INSERT INTO email_history (product_id, email_type, sent_to, subject)
                 VALUES (?, ?, ?, ?)
-            ''', (
-                change['product_id'],
-                'price_alert',
-                self.config['email']['receiver_email'],
-                subject
-            ))
-        
-        conn.commit()
-        conn.close()
+            ''', [
+                (change['product_id'], 'price_alert', recipient, subject)
+                for change in price_changes
+            ])
     
-    def monitor_all_products(self):
-        """Monitor all active products"""
-        conn = sqlite3.connect('price_tracker.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id FROM products WHERE is_active = TRUE')
-        product_ids = [row[0] for row in cursor.fetchall()]
-        conn.close()
+    def monitor_all_products(self, product_ids: Optional[List[int]] = None):
+        """Monitor all active products (or only the given ones)"""
+        products = self.db.query('SELECT id, url FROM products WHERE is_active = TRUE')
+        if product_ids is not None:
+            wanted = set(product_ids)
+            products = [row for row in products if row[0] in wanted]
+        product_ids = [row[0] for row in products]
         
         all_changes = []
+        max_workers = max(1, self.config['tracking']['max_workers'])
+        self.start_parse_pool()
+        started_at = time.monotonic()
         
-        for product_id in product_ids:
-            try:
-                changes = self.check_price_changes(product_id)
-                all_changes.extend(changes)
-                
-                # Rate limiting
-                time.sleep(self.config['tracking']['delay_between_requests'])
-                
-            except Exception as e:
-                logger.error(f"Product {product_id} could not be checked: {e}")
-                continue
+        # Checks not started by the deadline are given up, so a slow tail can't push the pass past its interval
+        pass_minutes = self.config['retries']['pass_deadline_minutes']
+        if pass_minutes is None:
+            pass_minutes = self.config['tracking']['check_interval_hours'] * 60
+        self.pass_deadline = Deadline(pass_minutes * 60)
+        self.retry_policy.stats.reset()
+        
+        # Price history rows are buffered and written in large transactions
+        try:
+            with self.db.batch():
+                pending = products
+                for round_number in range(self.config['blocking']['requeue_rounds'] + 1):
+                    if round_number:
+                        if self.pass_deadline.expired():
+                            break
+                        logger.info(f"Re-queueing {len(pending)} failed products (round {round_number})")
+                    changes, failed = self._check_products(pending, max_workers)
+                    all_changes.extend(changes)
+                    if not failed:
+                        break
+                    pending = [row for row in pending if row[0] in failed]
+            deadline_reached = self.pass_deadline.expired()
+        finally:
+            self.pass_deadline = None
+        
+        elapsed = time.monotonic() - started_at
+        checks_per_minute = len(product_ids) / elapsed * 60 if elapsed > 0 else 0.0
+        block_rate = self.circuit_breaker.block_rate()
+        retry_stats = self.retry_policy.stats.snapshot()
+        self.last_pass_stats = {
+            'products': len(product_ids),
+            'failed': len(failed),
+            'block_rate': block_rate,
+            'workers': max_workers,
+            'duration_seconds': elapsed,
+            'checks_per_minute': checks_per_minute,
+            **retry_stats
+        }
+        self.metrics.observe('price_tracker_pass_seconds', elapsed)
+        self.metrics.set('price_tracker_last_pass_products', len(product_ids))
+        self.metrics.set('price_tracker_last_pass_checks_per_minute', checks_per_minute)
         
         # Send email if there are significant price drops
-        significant_changes = [
-            change for change in all_changes
-            if change['percentage_drop'] >= self.config['tracking']['price_drop_threshold']
-            or change['is_target_reached']
-        ]
+        significant_changes = self._significant_changes(all_changes)
         
         if significant_changes:
             self.send_price_alert(significant_changes)
         
-        logger.info(f"Monitoring completed: {len(product_ids)} products checked, {len(significant_changes)} significant changes")
+        logger.info(f"Monitoring completed: {len(product_ids)} products checked, {len(significant_changes)} significant changes "
+                    f"in {elapsed:.1f}s ({checks_per_minute:.1f} checks/min, {max_workers} workers)")
+        if retry_stats['retries']:
+            logger.info(f"Retries: {retry_stats['retries']} taking {retry_stats['retry_seconds']:.1f}s of fetch time, "
+                        f"{retry_stats['retries_exhausted']} products failed after all retries")
+        if deadline_reached:
+            logger.warning(f"Pass deadline of {pass_minutes:g} minutes reached, "
+                           f"{retry_stats['deadline_exceeded']} checks were cut short or not started")
+        if failed:
+            logger.warning(f"{len(failed)} products could not be checked in this pass")
+        if block_rate >= 0.1:
+            logger.warning(f"{block_rate:.0%} of recent responses were block pages, "
+                           f"lower max_workers or requests_per_second_per_host")
+        return self.last_pass_stats
+    
+    def _check_products(self, products: List[Tuple[int, str]], max_workers: int) -> Tuple[List[Dict], set]:
+        """Check (id, url) products, return their price changes and the ids that failed"""
+        changes = []
+        failed = set()
+        if self.config['tracking']['fetch_mode'] == 'async':
+            fetched = asyncio.run(self._fetch_products_async([row[1] for row in products]))
+            for (product_id, _), current_info in zip(products, fetched):
+                if isinstance(current_info, Exception):
+                    if not isinstance(current_info, DeadlineExceeded):
+                        logger.error(f"Product {product_id} could not be checked: {current_info}")
+                    self.metrics.inc('price_tracker_product_checks_total', result=self._failure_result(current_info))
+                    failed.add(product_id)
+                    continue
+                changes.extend(self.check_price_changes(product_id, current_info))
+        else:
+            # Rate limiting is done per host inside get_product_info
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self.check_price_changes, product_id): product_id
+                    for product_id, _ in products
+                }
+                for future in as_completed(futures):
+                    try:
+                        changes.extend(future.result())
+                    except DeadlineExceeded:
+                        failed.add(futures[future])
+                    except Exception as e:
+                        logger.error(f"Product {futures[future]} could not be checked: {e}")
+                        failed.add(futures[future])
+        return changes, failed
+    
+    def _significant_changes(self, changes: List[Dict]) -> List[Dict]:
+        """Price changes worth an alert (drop above threshold or target reached)"""
+        return [
+            change for change in changes
+            if change['percentage_drop'] >= self.config['tracking']['price_drop_threshold']
+            or change['is_target_reached']
+        ]
+    
+    async def _fetch_products_async(self, urls: List[str]) -> List:
+        """Fetch product pages through the async fetcher"""
+        from async_fetcher import AsyncProductFetcher
+        
+        tracking = self.config['tracking']
+        async with AsyncProductFetcher(
+            self,
+            max_in_flight=tracking['max_in_flight'],
+            connections_per_host=tracking['connections_per_host'],
+            parse_workers=tracking['max_workers']
+        ) as fetcher:
+            return await fetcher.get_many(urls)
+    
+    def close(self):
+        """Send queued alerts, flush buffered writes and close the database"""
+        self.stop_metrics_server()
+        self.alerts.close()
+        if self.sessions is not None:
+            self.sessions.close()
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+            self.parse_pool = None
+        self.db.close()
+    
+    def start_metrics_server(self):
+        """Serve /metrics while monitoring runs (metrics.enabled in config)"""
+        if not self.metrics.enabled or self.metrics_server is not None:
+            return
+        settings = self.config['metrics']
+        try:
+            self.metrics_server = MetricsServer(self.metrics, settings['host'], settings['port'])
+            self.metrics_server.start()
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint: {e}")
+            self.metrics_server = None
+    
+    def stop_metrics_server(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+    
+    def apply_retention(self) -> Dict:
+        """Downsample old price history (see retention.py)"""
+        try:
+            return apply_retention(self.db, self.config['retention'])
+        except Exception as e:
+            logger.error(f"Retention job failed: {e}")
+            return {}
     
     def start_monitoring(self):
         """Start periodic monitoring"""
         interval = self.config['tracking']['check_interval_hours']
+        scheduling = self.config['scheduling']
+        adaptive = scheduling['mode'] == 'adaptive'
+        continuous = scheduling['continuous']
+        distributed = self.config['queue']['enabled']
         
-        # Schedule job
-        schedule.every(interval).hours.do(self.monitor_all_products)
+        if distributed:
+            queue = create_queue(self)
+            logger.info(f"Distributed monitoring started as node {queue.node_id} ({scheduling['mode']} intervals)")
+        elif adaptive or continuous:
+            scheduler = ProductScheduler(self.db, scheduling, interval)
+            scheduler.load(spread=continuous)
+            mode = 'Continuous' if continuous else 'Adaptive'
+            logger.info(f"{mode} monitoring started ({scheduling['mode']} intervals): {scheduler.summary()}")
+        else:
+            # Schedule job
+            schedule.every(interval).hours.do(self.monitor_all_products)
+            logger.info(f"Monitoring started: check every {interval} hours")
         
-        logger.info(f"Monitoring started: check every {interval} hours")
+        retention = self.config['retention']
+        if retention['enabled']:
+            schedule.every(retention['interval_hours']).hours.do(self.apply_retention)
+            logger.info(f"History retention: full resolution for {retention['raw_days']} days, "
+                        f"hourly for {retention['hourly_days']} days, then daily")
         
-        # Do first check immediately
-        self.monitor_all_products()
+        self.start_metrics_server()
+        self.start_parse_pool()
         
-        # Scheduler loop
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
+            if distributed:
+                run_worker(self, queue)
+            elif continuous:
+                self._run_continuous(scheduler)
+            elif adaptive:
+                self._run_adaptive_schedule(scheduler)
+            else:
+                # Do first check immediately
+                self.monitor_all_products()
+                
+                # Scheduler loop
+                while True:
+                    schedule.run_pending()
+                    time.sleep(60)  # Check every minute
         except KeyboardInterrupt:
             logger.info("Monitoring stopped")
+        finally:
+            self.stop_metrics_server()
+    
+    def _run_adaptive_schedule(self, scheduler: ProductScheduler):
+        """Check products as they become due, forever"""
+        while True:
+            schedule.run_pending()
+            scheduler.sync()
+            
+            due = scheduler.pop_due()
+            if due:
+                self.monitor_all_products(due)
+                scheduler.reschedule(due)
+                continue
+            
+            # Wake up for the next due product, or after a minute to pick up new products
+            delay = scheduler.seconds_until_next()
+            time.sleep(min(delay if delay is not None else 60, 60))
+    
+    def _run_continuous(self, scheduler: ProductScheduler, stop: Optional[threading.Event] = None):
+        """
+        Check products one at a time on a worker pool as they come due, so
+        requests and writes are spread evenly over the interval. Price drops
+        are coalesced into digests by the alert dispatcher.
+        """
+        max_workers = max(1, self.config['tracking']['max_workers'])
+        retry_seconds = self.config['blocking']['retry_seconds']
+        in_flight = {}
+        last_sync = last_report = time.monotonic()
+        checks = 0
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while stop is None or not stop.is_set():
+                now = time.monotonic()
+                if now - last_sync >= 60:
+                    schedule.run_pending()
+                    scheduler.sync()
+                    last_sync = now
+                
+                for future in [future for future in in_flight if future.done()]:
+                    product_id = in_flight.pop(future)
+                    checks += 1
+                    try:
+                        changes = self._significant_changes(future.result())
+                    except Exception as e:
+                        logger.error(f"Product {product_id} could not be checked: {e}")
+                        scheduler.retry_later([product_id], retry_seconds)
+                        continue
+                    self.send_price_alert(changes)
+                    scheduler.reschedule([product_id])
+                
+                if now - last_report >= 600:
+                    rate = checks / (now - last_report) * 60
+                    logger.info(f"Continuous monitoring: {checks} checks in {now - last_report:.0f}s "
+                                f"({rate:.1f} checks/min, {len(in_flight)} in flight)")
+                    self.metrics.set('price_tracker_last_pass_checks_per_minute', rate)
+                    checks = 0
+                    last_report = now
+                
+                # Keep the pool busy without queueing far ahead of the due times
+                free = max_workers * 2 - len(in_flight)
+                if free > 0:
+                    for product_id in scheduler.pop_due(limit=free):
+                        in_flight[executor.submit(self.check_price_changes, product_id)] = product_id
+                
+                timeout = scheduler.seconds_until_next()
+                timeout = min(timeout if timeout is not None else 1.0, 1.0)
+                if in_flight:
+                    wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                elif timeout > 0:
+                    time.sleep(timeout)
     
     def list_products(self) -> List[Dict]:
         """List tracked products"""
-        conn = sqlite3.connect('price_tracker.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = self.db.query('''
             SELECT p.*, 
-                   COUNT(ph.id) as price_records,
-                   MIN(ph.price) as min_price,
-                   MAX(ph.price) as max_price,
-                   AVG(ph.price) as avg_price
+                   COALESCE(s.price_count, 0) as price_records,
+                   s.min_price,
+                   s.max_price,
+                   s.price_sum / s.price_count as avg_price
             FROM products p
-            LEFT JOIN price_history ph ON p.id = ph.product_id
+            LEFT JOIN product_price_stats s ON p.id = s.product_id
             WHERE p.is_active = TRUE
-            GROUP BY p.id
             ORDER BY p.created_at DESC
         ''')
         
         products = []
-        for row in cursor.fetchall():
+        for row in rows:
             products.append({
                 'id': row[0],
                 'url': row[1],
@@ -662,7 +1208,6 @@ class AmazonPriceTracker:
                 'avg_price': row[11]
             })
         
-        conn.close()
         return products
 
 def main():
@@ -698,10 +1243,11 @@ def main():
             if products:
                 print(f"\nTracked Products ({len(products)} items):")
                 for p in products:
-                    print(f"\n{p['title'][:60]}...")
+                    print(f"\n{(p['title'] or p['asin'])[:60]}...")
                     print(f"   ID: {p['id']} | ASIN: {p['asin']}")
                     print(f"   Target: ${p['target_price'] or 'None'}")
-                    print(f"   Min: ${p['min_price']:.2f} | Max: ${p['max_price']:.2f}")
+                    if p['price_records']:
+                        print(f"   Min: ${p['min_price']:.2f} | Max: ${p['max_price']:.2f}")
                     print(f"   Last check: {p['last_checked'] or 'Never'}")
             else:
                 print("No tracked products found")
@@ -726,6 +1272,8 @@ def main():
         
         else:
             print("Invalid choice!")
+    
+    tracker.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Async Fetcher
+Fetches many product pages concurrently from one event loop.
+Requires aiohttp (pip install aiohttp).
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency
+    aiohttp = None
+
+from rate_limiting import BlockedError
+from retries import RETRY_STATUSES, DeadlineExceeded, current_deadline, deadline_scope
+from session_pool import PooledSession
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncProductFetcher:
+    """Async variant of AmazonPriceTracker.get_product_info with pooled keep-alive connections"""
+
+    def __init__(self, tracker, max_in_flight: int = 200, connections_per_host: int = 20,
+                 parse_workers: Optional[int] = None):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for async fetching: pip install aiohttp")
+        self.tracker = tracker
+        self.max_in_flight = max_in_flight
+        self.connections_per_host = connections_per_host
+        self.parse_workers = parse_workers
+        self.http = None
+        self.connector = None
+        # Pooled session name -> (generation, aiohttp session with its own cookie jar)
+        self.pooled_http: Dict[str, Tuple[int, 'aiohttp.ClientSession']] = {}
+        self.executor = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight,
+            limit_per_host=self.connections_per_host,
+            keepalive_timeout=30
+        )
+        self.http = aiohttp.ClientSession(connector=self.connector, headers=dict(self.tracker.session.headers))
+        # Parsing is CPU work, keep it off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=self.parse_workers)
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for _, http in self.pooled_http.values():
+            await http.close()
+        self.pooled_http.clear()
+        await self.http.close()
+        self.executor.shutdown(wait=True)
+
+    async def _http_for(self, pooled) -> 'aiohttp.ClientSession':
+        """aiohttp session mirroring a pooled session's headers, renewed with it after an eviction"""
+        entry = self.pooled_http.get(pooled.name)
+        if entry is not None and entry[0] == pooled.generation:
+            return entry[1]
+        if entry is not None:
+            await entry[1].close()
+        # The connector is shared; each session keeps its own cookie jar
+        http = aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                     headers=dict(pooled.session.headers))
+        self.pooled_http[pooled.name] = (pooled.generation, http)
+        return http
+
+    async def _download(self, url: str, asin: str) -> Tuple[bytes, Optional[PooledSession]]:
+        """
+        Download a page honouring the per-host rate limit and the page cache,
+        return it with the pooled session that fetched it (None: cached or no pool)
+        """
+        page_cache = self.tracker.page_cache
+        cached = None
+        if page_cache is not None:
+            key = self.tracker.cache_key(url, asin)
+            cached = page_cache.get(key)
+            if cached and cached.is_fresh(page_cache.ttl_seconds):
+                self.tracker.metrics.inc('price_tracker_page_cache_total', result='hit')
+                return cached.content, None
+
+        metrics = self.tracker.metrics
+        circuit_breaker = self.tracker.circuit_breaker
+        deadline = current_deadline()
+        pooled = None
+        if self.tracker.sessions is not None:
+            pooled = await self.tracker.sessions.acquire_async(
+                url, lambda pooled: not circuit_breaker.is_open(url, pooled.route))
+        http, route = (await self._http_for(pooled), pooled.route) if pooled else (self.http, None)
+        # Pooled sessions keep their own User-Agent
+        headers = {} if pooled else {'User-Agent': random.choice(self.tracker.config['amazon']['user_agents'])}
+        if cached:
+            headers.update(cached.conditional_headers())
+
+        outcome = None
+        try:
+            # Wait for a paused host before taking an in-flight slot
+            await circuit_breaker.acquire_async(url, deadline.remaining(), route)
+            async with self.semaphore:
+                await self.tracker.rate_limiter.acquire_async(url, route)
+                connect_timeout, read_timeout = self.tracker.retry_policy.timeouts()
+                remaining = deadline.remaining()
+                # A total of 0 would disable the timeout
+                timeout = aiohttp.ClientTimeout(total=max(0.1, remaining) if remaining is not None else None,
+                                                sock_connect=connect_timeout, sock_read=read_timeout)
+                outcome = 'error'
+                try:
+                    with metrics.time('price_tracker_http_request_seconds'):
+                        async with http.get(url, headers=headers, timeout=timeout,
+                                            proxy=pooled.proxy if pooled else None) as response:
+                            metrics.inc('price_tracker_http_responses_total', status=response.status)
+                            if response.status == 304 and cached:
+                                page_cache.refresh(key)
+                                metrics.inc('price_tracker_page_cache_total', result='revalidated')
+                                circuit_breaker.record_success(url, route)
+                                outcome = 'ok'
+                                return cached.content, pooled
+                            content = await response.read()
+                            self.tracker._check_blocked(url, response.status, content, route)
+                            response.raise_for_status()
+                except BlockedError:
+                    outcome = 'blocked'
+                    raise
+                except Exception:
+                    circuit_breaker.record_failure(url, route)
+                    raise
+            circuit_breaker.record_success(url, route)
+            outcome = 'ok'
+        finally:
+            self.tracker._release_session(pooled, outcome)
+
+        if page_cache is not None:
+            metrics.inc('price_tracker_page_cache_total', result='miss')
+            page_cache.put(key, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return content, pooled
+
+    async def get_product_info(self, url: str) -> Dict:
+        """Fetch product information from Amazon"""
+        url = self.tracker.clean_url(url)
+        asin = self.tracker.extract_asin_from_url(url)
+
+        if not asin:
+            raise ValueError("Invalid Amazon URL")
+
+        policy = self.tracker.retry_policy
+        deadline = policy.product_deadline(self.tracker.pass_deadline)
+        if deadline.expired():
+            policy.stats.record_deadline()
+            raise DeadlineExceeded(f"No time left in this pass to check {url}")
+
+        # Each gathered coroutine runs in its own task, so the deadline stays with this product
+        with deadline_scope(deadline):
+            product_info = await self._partial_product_info(url, asin)
+            if product_info is not None:
+                return product_info
+
+            attempt = 0
+            while True:
+                started_at = time.monotonic()
+                try:
+                    content, pooled = await self._download(url, asin)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    delay = policy.next_delay(attempt, deadline) if self._is_retryable(e) else None
+                    if delay is None:
+                        logger.error(f"Could not fetch product info: {e!r}")
+                        raise
+                    policy.record_retry(time.monotonic() - started_at, delay, type(e).__name__)
+                    attempt += 1
+                    logger.warning(f"Retrying {url} in {delay:.1f}s ({attempt}/{policy.max_retries}): {e!r}")
+                    await asyncio.sleep(delay)
+
+        product_info = await self._parse(content, url, asin)
+        if not product_info['sellers'] and product_info['title'] == "Title not found":
+            self.tracker._record_empty_page(url, asin, pooled)
+        self.tracker.full_pages[asin] = (time.monotonic(), product_info['title'], product_info['availability'])
+
+        logger.info(f"Product info fetched: {product_info['title']}")
+        return product_info
+
+    async def _parse(self, content: bytes, url: str, asin: str) -> Dict:
+        """Parse in the parse pool when it is running, otherwise on the executor"""
+        parse_pool = self.tracker.parse_pool
+        if parse_pool is not None:
+            try:
+                return await asyncio.wrap_future(parse_pool.submit(content, url, asin))
+            except BrokenProcessPool as e:
+                logger.error(f"Parse pool failed, parsing in-process from now on: {e}")
+                self.tracker.parse_pool = None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.tracker.parse_product_page, content, url, asin)
+
+    async def _partial_product_info(self, url: str, asin: str) -> Optional[Dict]:
+        """
+        Product info from the offers fragment or the price regions when one
+        of those modes is enabled and a recent full page is known, None when
+        the full page is due. Their fetches are blocking, so they run on the
+        executor (with this product's deadline).
+        """
+        config = self.tracker.config
+        if config['offers']['enabled']:
+            partial = self.tracker._get_offers_info
+        elif config['price_only']['enabled']:
+            partial = self.tracker._get_price_only_info
+        else:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(contextvars.copy_context().run, partial, url, asin)
+        )
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Timeouts, connection errors and 5xx responses may go through on a second try"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in RETRY_STATUSES
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    async def get_many(self, urls: List[str]) -> List[Union[Dict, Exception]]:
+        """Fetch several products, failed fetches are returned as exceptions"""
+        return await asyncio.gather(
+            *(self.get_product_info(url) for url in urls),
+            return_exceptions=True
+        )
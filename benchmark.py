@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Benchmarks
+Offline benchmarks on saved product pages. A local HTTP server stands in
+for Amazon (with simulated latency, 503s and captcha pages), so results
+are reproducible and can be compared across versions.
+
+Usage:
+  python benchmark.py parser [pages_dir] [--repeat N]
+  python benchmark.py parse-pool [pages_dir] [--processes 1,2,4] [--repeat N]
+  python benchmark.py suite [pages_dir] [--sizes 100,1000,10000] [--output results.json]
+  python benchmark.py compare old.json new.json
+
+Pages can be collected with: python page_cache.py export page_cache benchmark_pages
+"""
+
+import argparse
+import glob
+import http.server
+import json
+import logging
+import os
+import platform
+import random
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from amazon_price_tracker import AmazonPriceTracker
+from metrics import NULL_METRICS
+from page_parser import available_backends, create_page_parser
+from parse_pool import ParsePool
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+DEFAULT_PAGES_DIR = 'benchmark_pages'
+
+CAPTCHA_PAGE = b'''<html><head><title>Amazon.com</title></head><body>
+<h4>Enter the characters you see below</h4>
+<p>Sorry, we just need to make sure you're not a robot.</p>
+<form method="get" action="/errors/validateCaptcha"><input type="text" id="captchacharacters"></form>
+</body></html>'''
+
+
+def load_pages(pages_dir: str):
+    """Load saved .html pages from a directory"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def make_parse_function(backend: str, region_extraction: bool = False):
+    """Return a function parsing page bytes into product fields"""
+    # Only the parsing methods are used, so skip __init__ (config, DB, session)
+    tracker = AmazonPriceTracker.__new__(AmazonPriceTracker)
+    tracker.page_parser = create_page_parser(backend)
+    tracker.region_extraction = region_extraction
+    tracker.metrics = NULL_METRICS
+
+    def parse(content: bytes):
+        info = tracker.parse_product_page(content, '', '')
+        return {key: info[key] for key in ('title', 'sellers', 'main_price', 'availability')}
+
+    return parse
+
+
+def benchmark_parsers(pages_dir: str, repeat: int):
+    """Time every installed backend and check its output against BeautifulSoup"""
+    pages = load_pages(pages_dir)
+    if not pages:
+        print(f"No .html pages found in {pages_dir}")
+        sys.exit(1)
+
+    total_kb = sum(len(content) for _, content in pages) / 1024
+    print(f"Pages: {len(pages)} ({total_kb:.0f} KB), repeat: {repeat}")
+    print()
+
+    backends = ['beautifulsoup'] + [b for b in available_backends() if b != 'beautifulsoup']
+    variants = [(backend, False) for backend in backends] + [(backend, True) for backend in backends]
+    reference = {}
+    baseline = None
+
+    print(f"{'Backend':<24}{'ms/page':>10}{'pages/s':>10}{'speedup':>10}{'mismatches':>12}")
+    for backend, region_extraction in variants:
+        parse = make_parse_function(backend, region_extraction)
+        label = f"{backend}+regions" if region_extraction else backend
+        mismatches = 0
+
+        for name, content in pages:
+            result = parse(content)
+            if name not in reference:
+                reference[name] = result
+            elif result != reference[name]:
+                mismatches += 1
+
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            for _, content in pages:
+                parse(content)
+        elapsed = time.perf_counter() - started_at
+
+        per_page = elapsed / (repeat * len(pages))
+        if baseline is None:
+            baseline = per_page
+        print(f"{label:<24}{per_page * 1000:>10.2f}{1 / per_page:>10.1f}"
+              f"{baseline / per_page:>9.1f}x{mismatches:>12}")
+
+
+def benchmark_parse_pool(pages_dir: str, process_counts: List[int], repeat: int, batch_size: int):
+    """Parse throughput with pages submitted from threads to the process pool"""
+    pages = load_pages(pages_dir)
+    if not pages:
+        print(f"No .html pages found in {pages_dir}")
+        sys.exit(1)
+
+    items = [content for _, content in pages] * repeat
+    print(f"Pages: {len(items)}, CPUs: {os.cpu_count()}, batch size: {batch_size}")
+    print()
+    print(f"{'Processes':<12}{'pages/s':>10}{'scaling':>10}")
+
+    baseline = None
+    for processes in process_counts:
+        pool = ParsePool(processes, batch_size=batch_size)
+        pool.warm_up()
+        started_at = time.perf_counter()
+        futures = [pool.submit(content, '', '') for content in items]
+        for future in futures:
+            future.result()
+        rate = len(items) / (time.perf_counter() - started_at)
+        pool.close()
+
+        baseline = baseline or rate / processes
+        print(f"{processes:<12}{rate:>10.1f}{rate / baseline:>9.2f}x")
+
+
+# Local Amazon stand-in
+
+class BenchmarkServer:
+    """Serves corpus pages for /dp/<ASIN> with simulated latency and failures"""
+
+    def __init__(self, pages: List[bytes], latency_ms: float = 20, jitter_ms: float = 10,
+                 error_rate: float = 0.0, captcha_rate: float = 0.0):
+        self.pages = pages
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.responses = {'ok': 0, 'error': 0, 'captcha': 0}
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+                time.sleep(max(delay, 0) / 1000)
+
+                roll = random.random()
+                if roll < server.error_rate:
+                    status, body, outcome = 503, b'Service Unavailable', 'error'
+                elif roll < server.error_rate + server.captcha_rate:
+                    status, body, outcome = 200, CAPTCHA_PAGE, 'captcha'
+                else:
+                    asin = self.path.split('/dp/')[-1][:10]
+                    status, body, outcome = 200, server.pages[hash(asin) % len(server.pages)], 'ok'
+
+                with server.lock:
+                    server.responses[outcome] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> int:
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self.httpd = Server(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.httpd.server_address[1]
+
+    def url_for(self, asin: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/dp/{asin}"
+
+    def take_responses(self) -> Dict[str, int]:
+        """Return and reset the response counters"""
+        with self.lock:
+            responses, self.responses = self.responses, {'ok': 0, 'error': 0, 'captcha': 0}
+        return responses
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def synthetic_page(index: int) -> bytes:
+    """Product page with Amazon's structure, used when no saved pages exist"""
+    filler = ''.join(f'<li class="nav-item"><a href="/n{i}">Item {i}</a></li>' for i in range(1500))
+    offers = ''.join(
+        f'<div data-aod-offer-id="o{j}"><span class="a-price"><span class="a-offscreen">${20 + j}.{index % 100:02d}</span></span>'
+        f'<a aria-label="seller {j}">Seller {j}</a>'
+        f'<span data-csa-c-content-id="aod-delivery-price">FREE delivery</span></div>'
+        for j in range(index % 4)
+    )
+    return f'''<!DOCTYPE html><html><head><meta charset="utf-8"><title>Product {index}</title>
+<script type="application/ld+json">{{"@type": "Product", "offers": [{{"price": "{25 + index}.00", "seller": {{"name": "Other"}}}}]}}</script>
+</head><body><ul>{filler}</ul>
+<span id="productTitle"> Synthetic product {index} </span>
+<div id="corePrice_feature_div"><span class="a-price"><span class="a-offscreen">${19 + index}.99</span></span></div>
+<div id="availability"><span class="a-color-success">In Stock</span></div>
+<div id="aod-offer-list">{offers}</div>
+</body></html>'''.encode('utf-8')
+
+
+# Measurements
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    """Throughput and latency percentiles (latencies in seconds)"""
+    return {
+        'count': len(latencies),
+        'elapsed_seconds': round(elapsed, 4),
+        'throughput_per_second': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def make_tracker(workdir: str, workers: int) -> AmazonPriceTracker:
+    """Tracker on a scratch database, without page cache or request throttling"""
+    config_file = os.path.join(workdir, 'config.json')
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "tracking": {
+                "max_workers": workers,
+                "requests_per_second_per_host": 100000,
+                "max_retries": 0
+            },
+            "database": {"path": os.path.join(workdir, 'benchmark.db')},
+            "cache": {"enabled": False},
+            "retention": {"enabled": False}
+        }, f)
+    return AmazonPriceTracker(config_file)
+
+
+def add_benchmark_products(tracker: AmazonPriceTracker, server: BenchmarkServer, count: int, prefix: str) -> List[int]:
+    """Insert products directly (no fetch) and make them the only active ones"""
+    rows = [(server.url_for(f"{prefix}{i:08d}"), f"Product {i}", f"{prefix}{i:08d}") for i in range(count)]
+    with tracker.db.transaction() as cursor:
+        cursor.execute('UPDATE products SET is_active = FALSE')
+        cursor.executemany('INSERT INTO products (url, title, asin) VALUES (?, ?, ?)', rows)
+        cursor.execute('SELECT id FROM products WHERE is_active = TRUE ORDER BY id')
+        return [row[0] for row in cursor.fetchall()]
+
+
+def timed_calls(function, arguments) -> Dict:
+    latencies = []
+    started_at = time.perf_counter()
+    for argument in arguments:
+        call_started = time.perf_counter()
+        try:
+            function(argument)
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started_at)
+
+
+def bench_extractors(tracker: AmazonPriceTracker, pages: List[bytes], repeat: int) -> Dict:
+    """Per-call timings of the BeautifulSoup extractors and the single-pass parser"""
+    from bs4 import BeautifulSoup
+
+    soups = [BeautifulSoup(content, 'html.parser') for content in pages]
+    extractors = {
+        '_extract_title': tracker._extract_title,
+        '_extract_main_price': tracker._extract_main_price,
+        '_extract_availability': tracker._extract_availability,
+        '_extract_sellers': lambda soup: tracker._extract_sellers(soup, ''),
+    }
+
+    results = {'beautifulsoup_parse': timed_calls(lambda c: BeautifulSoup(c, 'html.parser'), pages * repeat)}
+    for name, extractor in extractors.items():
+        results[name] = timed_calls(extractor, soups * repeat)
+    if tracker.page_parser is not None:
+        results[f'single_pass_{tracker.page_parser.name}'] = timed_calls(tracker.page_parser.parse, pages * repeat)
+    return results
+
+
+def run_suite(args):
+    pages = [content for _, content in load_pages(args.pages_dir)]
+    corpus = args.pages_dir
+    if not pages:
+        print(f"No .html pages found in {args.pages_dir}, using synthetic pages")
+        pages = [synthetic_page(i) for i in range(20)]
+        corpus = 'synthetic'
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = BenchmarkServer(pages, args.latency_ms, args.jitter_ms, args.error_rate, args.captcha_rate)
+    server.start()
+
+    results = {
+        'version': git_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'settings': {
+            'corpus': corpus,
+            'pages': len(pages),
+            'workers': args.workers,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate,
+            'captcha_rate': args.captcha_rate,
+            'parser_backend': None
+        },
+        'benchmarks': {}
+    }
+    benchmarks = results['benchmarks']
+
+    with tempfile.TemporaryDirectory() as workdir:
+        tracker = make_tracker(workdir, args.workers)
+        results['settings']['parser_backend'] = tracker.page_parser.name if tracker.page_parser else 'beautifulsoup'
+
+        print("Extractors...")
+        benchmarks['extractors'] = bench_extractors(tracker, pages, args.repeat)
+
+        print("get_product_info...")
+        urls = [server.url_for(f"G{i:09d}") for i in range(args.calls)]
+        benchmarks['get_product_info'] = timed_calls(tracker.get_product_info, urls)
+        benchmarks['get_product_info']['responses'] = server.take_responses()
+
+        print("check_price_changes...")
+        product_ids = add_benchmark_products(tracker, server, args.calls, 'CC')
+        benchmarks['check_price_changes'] = timed_calls(tracker.check_price_changes, product_ids)
+        benchmarks['check_price_changes']['responses'] = server.take_responses()
+
+        for index, size in enumerate(sizes):
+            print(f"monitor_all_products ({size} products)...")
+            add_benchmark_products(tracker, server, size, f"M{index:02d}")
+            started_at = time.perf_counter()
+            stats = tracker.monitor_all_products()
+            elapsed = time.perf_counter() - started_at
+            benchmarks[f'monitor_all_products_{size}'] = {
+                'count': size,
+                'elapsed_seconds': round(elapsed, 4),
+                'throughput_per_second': round(size / elapsed, 2) if elapsed > 0 else 0.0,
+                'checks_per_minute': round(stats['checks_per_minute'], 1),
+                'peak_rss_mb': peak_rss_mb(),
+                'responses': server.take_responses()
+            }
+
+        tracker.close()
+
+    server.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"\nResults saved: {args.output}")
+
+
+def git_version() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(benchmarks: Dict) -> Dict[str, Dict]:
+    """Benchmark name -> metrics, with nested groups joined by '/'"""
+    flat = {}
+    for name, value in benchmarks.items():
+        if 'count' in value:
+            flat[name] = value
+        else:
+            for child, metrics in flatten(value).items():
+                flat[f"{name}/{child}"] = metrics
+    return flat
+
+
+def print_results(results: Dict):
+    print(f"\n{'Benchmark':<45}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for name, metrics in flatten(results['benchmarks']).items():
+        p50 = f"{metrics['p50_ms']:.2f}" if 'p50_ms' in metrics else '-'
+        p99 = f"{metrics['p99_ms']:.2f}" if 'p99_ms' in metrics else '-'
+        print(f"{name:<45}{metrics['throughput_per_second']:>12.1f}{p50:>10}{p99:>10}"
+              f"{metrics['peak_rss_mb'] or 0:>9.1f}")
+
+
+def compare_results(old_file: str, new_file: str):
+    """Print throughput and p99 change between two result files"""
+    with open(old_file, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    old_benchmarks = flatten(old['benchmarks'])
+    new_benchmarks = flatten(new['benchmarks'])
+    print(f"{old.get('version')} -> {new.get('version')}")
+    print(f"\n{'Benchmark':<45}{'old ops/s':>12}{'new ops/s':>12}{'speedup':>10}{'p99 change':>12}")
+    for name, metrics in new_benchmarks.items():
+        previous = old_benchmarks.get(name)
+        if not previous:
+            continue
+        old_rate = previous['throughput_per_second']
+        new_rate = metrics['throughput_per_second']
+        speedup = new_rate / old_rate if old_rate else float('nan')
+        p99 = ''
+        if previous.get('p99_ms') and 'p99_ms' in metrics:
+            p99 = f"{(metrics['p99_ms'] / previous['p99_ms'] - 1) * 100:+.0f}%"
+        print(f"{name:<45}{old_rate:>12.1f}{new_rate:>12.1f}{speedup:>9.2f}x{p99:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Amazon Price Tracker benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_bench = subparsers.add_parser('parser', help="Compare parser backends on saved pages")
+    parser_bench.add_argument('pages_dir', nargs='?', default=DEFAULT_PAGES_DIR)
+    parser_bench.add_argument('--repeat', type=int, default=5)
+
+    pool_bench = subparsers.add_parser('parse-pool', help="Measure parse pool scaling with the process count")
+    pool_bench.add_argument('pages_dir', nargs='?', default=DEFAULT_PAGES_DIR)
+    pool_bench.add_argument('--processes', default='1,2,4')
+    pool_bench.add_argument('--repeat', type=int, default=5)
+    pool_bench.add_argument('--batch-size', type=int, default=8)
+
+    suite = subparsers.add_parser('suite', help="Run the offline benchmark suite against a local server")
+    suite.add_argument('pages_dir', nargs='?', default=DEFAULT_PAGES_DIR)
+    suite.add_argument('--sizes', default='100,1000,10000', help="Products per monitoring pass")
+    suite.add_argument('--calls', type=int, default=200, help="Calls for the per-call benchmarks")
+    suite.add_argument('--repeat', type=int, default=3, help="Passes over the corpus for extractor timings")
+    suite.add_argument('--workers', type=int, default=16)
+    suite.add_argument('--latency-ms', type=float, default=20)
+    suite.add_argument('--jitter-ms', type=float, default=10)
+    suite.add_argument('--error-rate', type=float, default=0.0, help="Share of 503 responses")
+    suite.add_argument('--captcha-rate', type=float, default=0.0, help="Share of captcha pages")
+    suite.add_argument('--output', default='benchmark_results.json')
+
+    compare = subparsers.add_parser('compare', help="Compare two suite result files")
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    args = parser.parse_args()
+
+    if args.command == 'parser':
+        benchmark_parsers(args.pages_dir, args.repeat)
+    elif args.command == 'parse-pool':
+        benchmark_parse_pool(args.pages_dir, [int(n) for n in args.processes.split(',')], args.repeat, args.batch_size)
+    elif args.command == 'suite':
+        run_suite(args)
+    elif args.command == 'compare':
+        compare_results(args.old, args.new)
+
+
+if __name__ == "__main__":
+    main()
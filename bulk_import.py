@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Bulk Import
+Imports product lists (URLs or ASINs, optional target prices) from TXT,
+CSV or JSONL files. Products are deduplicated by ASIN and upserted in
+batched transactions, then their initial prices are fetched concurrently.
+Re-running the same import resumes it: known ASINs keep their ID (a given
+target price is updated) and only products that were never checked are
+fetched.
+
+Usage:
+  python bulk_import.py <file> [file ...] [--no-backfill] [--batch-size N]
+
+File formats:
+  .txt    one URL or ASIN per line, optionally followed by a target price
+  .csv    columns url or asin, optional target_price (header row optional)
+  .jsonl  one object per line: {"url": ..., "asin": ..., "target_price": ...}
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+ASIN_PATTERN = re.compile(r'^[A-Z0-9]{10}$')
+
+
+def _parse_target(value) -> Optional[float]:
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return float(str(value).strip().lstrip('$').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def read_import_file(path: str) -> Iterator[Dict]:
+    """Yield {'ref': url or ASIN, 'target_price': float or None} entries"""
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if extension == '.jsonl':
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"{path}:{line_number}: invalid JSON, skipped")
+                    continue
+                yield {'ref': entry.get('url') or entry.get('asin') or '', 'target_price': _parse_target(entry.get('target_price'))}
+
+        elif extension == '.csv':
+            rows = csv.reader(f)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [column.strip().lower() for column in header]
+            if 'url' in columns or 'asin' in columns:
+                ref_columns = [columns.index(name) for name in ('url', 'asin') if name in columns]
+                target_column = columns.index('target_price') if 'target_price' in columns else None
+            else:
+                # No header: first column is the product, second the target price
+                ref_columns, target_column = [0], 1
+                rows = [header] + list(rows)
+            for row in rows:
+                ref = next((row[i].strip() for i in ref_columns if i < len(row) and row[i].strip()), '')
+                target = row[target_column] if target_column is not None and target_column < len(row) else None
+                yield {'ref': ref, 'target_price': _parse_target(target)}
+
+        else:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.replace(',', ' ').split()
+                yield {'ref': parts[0], 'target_price': _parse_target(parts[1]) if len(parts) > 1 else None}
+
+
+def normalize_entries(tracker, entries: Iterable[Dict]) -> Dict[str, Dict]:
+    """Map ASIN -> {'url', 'asin', 'target_price'}; the last entry of a duplicate ASIN wins"""
+    base_url = tracker.config['amazon']['base_url'].rstrip('/')
+    products = {}
+    invalid = 0
+
+    for entry in entries:
+        ref = entry['ref'].strip()
+        if ASIN_PATTERN.match(ref):
+            asin = ref
+            url = f"{base_url}/dp/{asin}"
+        else:
+            url = tracker.clean_url(ref)
+            asin = tracker.extract_asin_from_url(url)
+            if asin:
+                # One canonical URL per marketplace and ASIN
+                parsed = urlparse(url)
+                url = f"{parsed.scheme}://{parsed.netloc}/dp/{asin}"
+        if not asin:
+            invalid += 1
+            continue
+        products[asin] = {'url': url, 'asin': asin, 'target_price': entry['target_price']}
+
+    if invalid:
+        logger.warning(f"{invalid} entries without a recognizable ASIN were skipped")
+    return products
+
+
+def insert_products(tracker, products: Dict[str, Dict], batch_size: int = 1000) -> Dict:
+    """Upsert products by ASIN, one transaction per batch; tracked ones keep their ID"""
+    known = {row[0] for row in tracker.db.query('SELECT asin FROM products WHERE asin IS NOT NULL')}
+    tracked = sum(1 for asin in products if asin in known)
+
+    rows = list(products.values())
+    for start in range(0, len(rows), batch_size):
+        tracker.upsert_products(rows[start:start + batch_size], batch_size)
+        logger.info(f"Upserted {min(start + batch_size, len(rows))}/{len(rows)} products")
+
+    return {'entries': len(products), 'already_tracked': tracked, 'inserted': len(products) - tracked}
+
+
+class Progress:
+    """Periodic 'done/total, rate, ETA' log lines"""
+
+    def __init__(self, total: int, label: str, every_seconds: float = 5.0):
+        self.total = total
+        self.label = label
+        self.every_seconds = every_seconds
+        self.done = 0
+        self.failed = 0
+        self.started_at = self.last_report = time.monotonic()
+
+    def update(self, ok: bool):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self.last_report >= self.every_seconds or self.done == self.total:
+            self.last_report = now
+            rate = self.done / max(now - self.started_at, 1e-9)
+            eta = (self.total - self.done) / rate if rate else 0
+            logger.info(f"{self.label}: {self.done}/{self.total} ({self.failed} failed), "
+                        f"{rate:.1f}/s, ETA {eta / 60:.1f} min")
+
+
+def backfill_initial_prices(tracker, limit: Optional[int] = None) -> Dict:
+    """
+    Fetch title and first prices of active products that were never checked.
+    Products that fail stay unchecked, so running it again resumes.
+    """
+    sql = 'SELECT id, url FROM products WHERE is_active = TRUE AND last_checked IS NULL ORDER BY id'
+    products = tracker.db.query(sql + (f' LIMIT {int(limit)}' if limit else ''))
+    if not products:
+        return {'products': 0, 'fetched': 0, 'failed': 0}
+
+    progress = Progress(len(products), "Initial prices")
+    max_workers = max(1, tracker.config['tracking']['max_workers'])
+    tracker.start_parse_pool()
+    titles = []
+
+    def write_titles():
+        with tracker.db.transaction() as cursor:
+            cursor.executemany('UPDATE products SET title = ? WHERE id = ?', titles)
+        titles.clear()
+
+    with tracker.db.batch(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(tracker._get_product_info_with_retries, url): product_id for product_id, url in products}
+        try:
+            for future in as_completed(futures):
+                product_id = futures[future]
+                try:
+                    product_info = future.result()
+                except Exception as e:
+                    logger.warning(f"Product {product_id}: {e}")
+                    progress.update(False)
+                    continue
+
+                titles.append((product_info['title'], product_id))
+                if len(titles) >= 500:
+                    write_titles()
+                tracker.db.record_prices(
+                    ((product_id, seller['name'], seller['price'], product_info['availability'])
+                     for seller in product_info['sellers']),
+                    product_id
+                )
+                progress.update(True)
+        except KeyboardInterrupt:
+            logger.info("Backfill interrupted, run the import again to resume")
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            write_titles()
+
+    return {'products': progress.total, 'fetched': progress.done - progress.failed, 'failed': progress.failed}
+
+
+def import_files(tracker, paths: List[str], batch_size: int = 1000, backfill: bool = True) -> Dict:
+    """Read, deduplicate and insert products from files, then fetch their initial prices"""
+    entries = (entry for path in paths for entry in read_import_file(path))
+    products = normalize_entries(tracker, entries)
+    result = insert_products(tracker, products, batch_size)
+    logger.info(f"Import: {result['entries']} unique ASINs, {result['inserted']} inserted, "
+                f"{result['already_tracked']} already tracked (updated)")
+    if backfill:
+        result['backfill'] = backfill_initial_prices(tracker)
+    return result
+
+
+def main():
+    from amazon_price_tracker import AmazonPriceTracker
+
+    args = sys.argv[1:]
+    if not args or args[0] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(1)
+
+    batch_size = 1000
+    if '--batch-size' in args:
+        index = args.index('--batch-size')
+        batch_size = int(args[index + 1])
+        del args[index:index + 2]
+    backfill = '--no-backfill' not in args
+    paths = [arg for arg in args if not arg.startswith('--')]
+
+    tracker = AmazonPriceTracker()
+    try:
+        result = import_files(tracker, paths, batch_size, backfill)
+        print(json.dumps(result, indent=2))
+    except KeyboardInterrupt:
+        print("\nImport stopped, run the same command again to resume")
+    finally:
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()
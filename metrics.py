@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Metrics
+In-process counters, gauges and latency histograms for the hot paths
+(HTTP, parsing, SQLite, SMTP), served in the Prometheus text format from
+a small local HTTP endpoint. When metrics are disabled NULL_METRICS is
+used, whose methods do nothing.
+"""
+
+import http.server
+import logging
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached page parse to a slow SMTP handshake
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    'price_tracker_http_request_seconds': ('histogram', "Time spent downloading product pages"),
+    'price_tracker_http_responses_total': ('counter', "HTTP responses by status code"),
+    'price_tracker_http_bytes_total': ('counter', "Decoded response bytes read, by kind (page, offers, price_only)"),
+    'price_tracker_page_cache_total': ('counter', "Page lookups by cache result (hit, revalidated, miss)"),
+    'price_tracker_parse_seconds': ('histogram', "Time spent parsing product pages, by stage"),
+    'price_tracker_extract_seconds': ('histogram', "Time spent in each BeautifulSoup _extract_* function"),
+    'price_tracker_db_seconds': ('histogram', "Time spent in database writes, by operation"),
+    'price_tracker_db_rows_total': ('counter', "Price history rows flushed, by kind (inserted, unchanged)"),
+    'price_tracker_smtp_seconds': ('histogram', "Time spent on SMTP, by operation (connect, send)"),
+    'price_tracker_alerts_total': ('counter', "Alert emails by result (sent, retried, failed)"),
+    'price_tracker_alerts_suppressed_total': ('counter', "Price changes not alerted again within the cooldown"),
+    'price_tracker_product_checks_total': ('counter', "Product checks by result (ok, blocked, deadline, error)"),
+    'price_tracker_session_health': ('gauge', "Health score of each pooled session (1 healthy, 0 blocked)"),
+    'price_tracker_session_evictions_total': ('counter', "Pooled sessions evicted after block pages"),
+    'price_tracker_retries_total': ('counter', "Fetch retries by error type"),
+    'price_tracker_retry_seconds_total': ('counter', "Time spent on failed attempts and backoff before retries"),
+    'price_tracker_blocks_total': ('counter', "Block pages by host and reason (captcha, throttled, empty)"),
+    'price_tracker_block_rate': ('gauge', "Share of block pages in the last 100 responses, by host"),
+    'price_tracker_circuit_open': ('gauge', "1 while requests to the host are paused after a block page"),
+    'price_tracker_pass_seconds': ('histogram', "Duration of full monitoring passes"),
+    'price_tracker_last_pass_products': ('gauge', "Products checked in the last monitoring pass"),
+    'price_tracker_last_pass_checks_per_minute': ('gauge', "Throughput of the last monitoring pass"),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Timer:
+    """Context manager observing its elapsed time into a histogram"""
+
+    __slots__ = ('metrics', 'name', 'labels', 'started_at')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started_at, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Thread-safe metric store, metric names must be listed in METRICS"""
+
+    enabled = True
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.values: Dict[str, Dict[LabelKey, float]] = {name: {} for name in METRICS}
+        # Histogram series: [bucket counts..., sum, count]
+        self.histograms: Dict[str, Dict[LabelKey, list]] = {
+            name: {} for name, (kind, _) in METRICS.items() if kind == 'histogram'
+        }
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms[name].get(key)
+            if series is None:
+                series = self.histograms[name][key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def time(self, name: str, **labels):
+        """with metrics.time('price_tracker_parse_seconds', stage='dom'): ..."""
+        return _Timer(self, name, labels)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'histogram':
+                    for key, series in sorted(self.histograms[name].items()):
+                        for bound, count in zip(self.buckets, series):
+                            lines.append(f"{name}_bucket{_labels(key, ('le', repr(bound)))} {count}")
+                        lines.append(f"{name}_bucket{_labels(key, ('le', '+Inf'))} {series[-1]}")
+                        lines.append(f"{name}_sum{_labels(key)} {series[-2]:.6f}")
+                        lines.append(f"{name}_count{_labels(key)} {series[-1]}")
+                else:
+                    for key, value in sorted(self.values[name].items()):
+                        lines.append(f"{name}{_labels(key)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics:
+    """Same interface as Metrics, records nothing"""
+
+    enabled = False
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        pass
+
+    def set(self, name: str, value: float, **labels):
+        pass
+
+    def observe(self, name: str, seconds: float, **labels):
+        pass
+
+    def time(self, name: str, **labels):
+        return _NULL_TIMER
+
+    def render(self) -> str:
+        return ''
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsServer:
+    """Serves GET /metrics from a daemon thread"""
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.httpd = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+
+        self.httpd = Server((self.host, self.port), Handler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True).start()
+        logger.info(f"Metrics endpoint: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+def create_metrics(settings: Dict):
+    """Metrics store for the metrics config section (NULL_METRICS when disabled)"""
+    return Metrics() if settings.get('enabled') else NULL_METRICS
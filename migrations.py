@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Schema Migrations
+Versioned schema upgrades for price_tracker.db. Pending migrations are
+applied in one transaction, data backfills run afterwards in small
+resumable chunks so a large database is never locked for long.
+
+Usage:
+  python migrations.py [db_path]
+"""
+
+import logging
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from storage import Database
+
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    """One schema version step"""
+
+    def __init__(self, version: int, description: str, upgrade: Callable):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+def _create_base_tables(cursor):
+    """Version 1: products, price_history and email_history"""
+    # Products table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE NOT NULL,
+            title TEXT,
+            asin TEXT,
+            target_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_checked TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    ''')
+
+    # Price history table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            seller_name TEXT,
+            price REAL,
+            availability TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+    # Email history table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            email_type TEXT,
+            sent_to TEXT,
+            subject TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+
+def _create_price_stats(cursor):
+    """Version 2: history index and incrementally maintained price summaries"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_price_stats'")
+    stats_exist = cursor.fetchone() is not None
+
+    # Covering index for the per-product 7-day minimum and history range scans
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_product_time
+        ON price_history (product_id, timestamp, price)
+    ''')
+
+    # All-time price summary per product, maintained on insert
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_price_stats (
+            product_id INTEGER PRIMARY KEY,
+            min_price REAL,
+            max_price REAL,
+            price_sum REAL DEFAULT 0,
+            price_count INTEGER DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+    # Last price seen per seller
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_seller_prices (
+            product_id INTEGER,
+            seller_name TEXT,
+            price REAL,
+            availability TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (product_id, seller_name),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+    cursor.execute('DROP TRIGGER IF EXISTS trg_price_history_stats')
+    cursor.execute('''
+        CREATE TRIGGER trg_price_history_stats
+        AFTER INSERT ON price_history
+        WHEN NEW.price IS NOT NULL
+        BEGIN
+            INSERT INTO product_price_stats (product_id, min_price, max_price, price_sum, price_count)
+            VALUES (NEW.product_id, NEW.price, NEW.price, NEW.price, 1)
+            ON CONFLICT (product_id) DO UPDATE SET
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                price_sum = price_sum + excluded.price_sum,
+                price_count = price_count + 1;
+
+            INSERT INTO product_seller_prices (product_id, seller_name, price, availability, updated_at)
+            VALUES (NEW.product_id, NEW.seller_name, NEW.price, NEW.availability, NEW.timestamp)
+            ON CONFLICT (product_id, seller_name) DO UPDATE SET
+                price = excluded.price,
+                availability = excluded.availability,
+                updated_at = excluded.updated_at
+            WHERE excluded.updated_at >= product_seller_prices.updated_at;
+        END
+    ''')
+
+    # Rows inserted from now on go through the trigger, older ones are backfilled.
+    # Databases that already had the summary tables need no backfill.
+    if stats_exist:
+        _register_backfill(cursor, 'price_stats', 0)
+    else:
+        _register_backfill(cursor, 'price_stats', None)
+
+
+def _backfill_price_stats(cursor, start_id: int, end_id: int):
+    """Fold price_history rows with start_id < id <= end_id into the summaries"""
+    cursor.execute('''
+        INSERT INTO product_price_stats (product_id, min_price, max_price, price_sum, price_count)
+        SELECT product_id, MIN(price), MAX(price), SUM(price), COUNT(price)
+        FROM price_history
+        WHERE id > ? AND id <= ? AND price IS NOT NULL
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price),
+            price_sum = price_sum + excluded.price_sum,
+            price_count = price_count + excluded.price_count
+    ''', (start_id, end_id))
+
+    cursor.execute('''
+        INSERT INTO product_seller_prices (product_id, seller_name, price, availability, updated_at)
+        SELECT product_id, seller_name, price, availability, timestamp
+        FROM price_history
+        WHERE id IN (
+            SELECT MAX(id) FROM price_history
+            WHERE id > ? AND id <= ? AND price IS NOT NULL
+            GROUP BY product_id, seller_name
+        )
+        ON CONFLICT (product_id, seller_name) DO UPDATE SET
+            price = excluded.price,
+            availability = excluded.availability,
+            updated_at = excluded.updated_at
+        WHERE excluded.updated_at >= product_seller_prices.updated_at
+    ''', (start_id, end_id))
+
+
+def _create_price_rollups(cursor):
+    """Version 3: OHLC buckets for downsampled price history"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history_rollup (
+            product_id INTEGER,
+            seller_name TEXT,
+            resolution TEXT,
+            bucket_start TIMESTAMP,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            sample_count INTEGER,
+            price_sum REAL,
+            PRIMARY KEY (product_id, seller_name, resolution, bucket_start),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_rollup_time
+        ON price_history_rollup (resolution, bucket_start)
+    ''')
+
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(f'PRAGMA table_info({table})')
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _add_last_seen(cursor):
+    """Version 4: change-only history (rows cover timestamp..last_seen)"""
+    if not _column_exists(cursor, 'price_history', 'last_seen'):
+        cursor.execute('ALTER TABLE price_history ADD COLUMN last_seen TIMESTAMP')
+    if not _column_exists(cursor, 'product_seller_prices', 'history_id'):
+        cursor.execute('ALTER TABLE product_seller_prices ADD COLUMN history_id INTEGER')
+
+    # A row counts for the 7-day window while it was still being observed
+    cursor.execute('DROP INDEX IF EXISTS idx_price_history_product_time')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_product_seen
+        ON price_history (product_id, COALESCE(last_seen, timestamp), price)
+    ''')
+
+    cursor.execute('DROP TRIGGER IF EXISTS trg_price_history_stats')
+    cursor.execute('''
+        CREATE TRIGGER trg_price_history_stats
+        AFTER INSERT ON price_history
+        WHEN NEW.price IS NOT NULL
+        BEGIN
+            INSERT INTO product_price_stats (product_id, min_price, max_price, price_sum, price_count)
+            VALUES (NEW.product_id, NEW.price, NEW.price, NEW.price, 1)
+            ON CONFLICT (product_id) DO UPDATE SET
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                price_sum = price_sum + excluded.price_sum,
+                price_count = price_count + 1;
+
+            INSERT INTO product_seller_prices (product_id, seller_name, price, availability, updated_at, history_id)
+            VALUES (NEW.product_id, NEW.seller_name, NEW.price, NEW.availability, NEW.timestamp, NEW.id)
+            ON CONFLICT (product_id, seller_name) DO UPDATE SET
+                price = excluded.price,
+                availability = excluded.availability,
+                updated_at = excluded.updated_at,
+                history_id = excluded.history_id
+            WHERE excluded.updated_at >= product_seller_prices.updated_at;
+        END
+    ''')
+
+    _register_backfill(cursor, 'seller_history_ids', None)
+
+
+def _backfill_seller_history_ids(cursor, start_id: int, end_id: int):
+    """Point product_seller_prices at the latest history row per seller"""
+    cursor.execute('''
+        UPDATE product_seller_prices
+        SET history_id = latest.max_id
+        FROM (
+            SELECT product_id, seller_name, MAX(id) AS max_id
+            FROM price_history
+            WHERE id > ? AND id <= ? AND price IS NOT NULL
+            GROUP BY product_id, seller_name
+        ) AS latest
+        WHERE product_seller_prices.product_id = latest.product_id
+          AND product_seller_prices.seller_name = latest.seller_name
+          AND (product_seller_prices.history_id IS NULL OR product_seller_prices.history_id < latest.max_id)
+    ''', (start_id, end_id))
+
+
+def _create_work_queue(cursor):
+    """Version 5: leased product checks shared by several worker nodes"""
+    # Times are epoch seconds, lease_token increases with every claim
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_queue (
+            product_id INTEGER PRIMARY KEY,
+            next_due REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            lease_token INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_work_queue_due ON work_queue (next_due)')
+
+
+def _unique_product_asin(cursor):
+    """Version 6: one product row per ASIN, so add_product can upsert on it"""
+    # Products added twice under different URLs are merged into the newest row
+    cursor.execute('''
+        CREATE TEMP TABLE product_merge AS
+        SELECT p.id AS old_id, d.keep_id
+        FROM products p
+        JOIN (
+            SELECT asin, MAX(id) AS keep_id FROM products
+            WHERE asin IS NOT NULL GROUP BY asin HAVING COUNT(*) > 1
+        ) d ON p.asin = d.asin AND p.id != d.keep_id
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM product_merge')
+    merged = cursor.fetchone()[0]
+
+    if merged:
+        logger.info(f"Merging {merged} duplicate product rows into their newest row per ASIN")
+        keep_id = '(SELECT keep_id FROM product_merge WHERE old_id = product_id)'
+        old_ids = 'product_id IN (SELECT old_id FROM product_merge)'
+
+        for table in ('price_history', 'email_history'):
+            cursor.execute(f'UPDATE {table} SET product_id = {keep_id} WHERE {old_ids}')
+        # Buckets both rows have for the same hour/day cannot be merged exactly, the kept row's win
+        cursor.execute(f'UPDATE OR IGNORE price_history_rollup SET product_id = {keep_id} WHERE {old_ids}')
+
+        cursor.execute('''
+            INSERT INTO product_price_stats (product_id, min_price, max_price, price_sum, price_count)
+            SELECT m.keep_id, MIN(s.min_price), MAX(s.max_price), SUM(s.price_sum), SUM(s.price_count)
+            FROM product_price_stats s JOIN product_merge m ON s.product_id = m.old_id
+            WHERE true
+            GROUP BY m.keep_id
+            ON CONFLICT (product_id) DO UPDATE SET
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                price_sum = price_sum + excluded.price_sum,
+                price_count = price_count + excluded.price_count
+        ''')
+        cursor.execute('''
+            INSERT INTO product_seller_prices (product_id, seller_name, price, availability, updated_at, history_id)
+            SELECT m.keep_id, s.seller_name, s.price, s.availability, s.updated_at, s.history_id
+            FROM product_seller_prices s JOIN product_merge m ON s.product_id = m.old_id
+            WHERE true
+            ON CONFLICT (product_id, seller_name) DO UPDATE SET
+                price = excluded.price,
+                availability = excluded.availability,
+                updated_at = excluded.updated_at,
+                history_id = excluded.history_id
+            WHERE (excluded.updated_at, COALESCE(excluded.history_id, 0))
+                > (product_seller_prices.updated_at, COALESCE(product_seller_prices.history_id, 0))
+        ''')
+
+        for table in ('price_history_rollup', 'product_price_stats', 'product_seller_prices', 'work_queue'):
+            cursor.execute(f'DELETE FROM {table} WHERE {old_ids}')
+        # The kept row takes the newest title and target price any of the rows has
+        cursor.execute('''
+            UPDATE products SET
+                created_at = (SELECT MIN(p.created_at) FROM products p WHERE p.asin = products.asin),
+                title = (
+                    SELECT p.title FROM products p WHERE p.asin = products.asin AND p.title IS NOT NULL
+                    ORDER BY p.id DESC LIMIT 1
+                ),
+                target_price = (
+                    SELECT p.target_price FROM products p WHERE p.asin = products.asin AND p.target_price IS NOT NULL
+                    ORDER BY p.id DESC LIMIT 1
+                )
+            WHERE id IN (SELECT keep_id FROM product_merge)
+        ''')
+        cursor.execute('DELETE FROM products WHERE id IN (SELECT old_id FROM product_merge)')
+
+    cursor.execute('DROP TABLE product_merge')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_products_asin ON products (asin)')
+
+
+def _create_alert_suppression(cursor):
+    """Version 7: recently alerted (product, seller, price bucket) keys"""
+    # alerted_at is epoch seconds, rows older than the cooldown are pruned
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alert_suppression (
+            product_id INTEGER NOT NULL,
+            seller_name TEXT NOT NULL,
+            price_bucket INTEGER NOT NULL,
+            alerted_at REAL NOT NULL,
+            PRIMARY KEY (product_id, seller_name, price_bucket)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alert_suppression_time ON alert_suppression (alerted_at)')
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Base tables", _create_base_tables),
+    Migration(2, "Price history index and summary tables", _create_price_stats),
+    Migration(3, "Price history rollup table", _create_price_rollups),
+    Migration(4, "Change-only price history", _add_last_seen),
+    Migration(5, "Work queue for multi-node monitoring", _create_work_queue),
+    Migration(6, "Unique product ASIN", _unique_product_asin),
+    Migration(7, "Alert suppression index", _create_alert_suppression),
+]
+
+# Chunked data backfills: name -> function(cursor, start_id, end_id)
+BACKFILLS: Dict[str, Callable] = {
+    'price_stats': _backfill_price_stats,
+    'seller_history_ids': _backfill_seller_history_ids,
+}
+
+
+def _register_backfill(cursor, name: str, end_id: Optional[int]):
+    """Schedule a backfill over price_history ids up to end_id (default: current max id)"""
+    if end_id is None:
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM price_history')
+        end_id = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT OR REPLACE INTO schema_backfills (name, last_id, end_id)
+        VALUES (?, 0, ?)
+    ''', (name, end_id))
+
+
+def _create_version_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            end_id INTEGER NOT NULL
+        )
+    ''')
+
+
+def current_version(db: Database) -> int:
+    """Highest applied schema version (0 for a new database)"""
+    with db.transaction() as cursor:
+        _create_version_tables(cursor)
+        cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+        return cursor.fetchone()[0]
+
+
+def migrate(db: Database) -> int:
+    """Apply pending migrations in one transaction, return the new version"""
+    with db.transaction() as cursor:
+        _create_version_tables(cursor)
+        cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+        version = cursor.fetchone()[0]
+
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info(f"Applying migration {migration.version}: {migration.description}")
+            migration.upgrade(cursor)
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, description) VALUES (?, ?)
+            ''', (migration.version, migration.description))
+            version = migration.version
+
+    return version
+
+
+def run_backfills(db: Database, chunk_size: int = 50000, time_budget: Optional[float] = None) -> bool:
+    """
+    Run pending backfills, one short transaction per chunk of ids. Progress
+    is stored so an interrupted backfill resumes where it stopped. Returns
+    True when every backfill is complete, False if the time budget ran out.
+    """
+    started_at = time.monotonic()
+    pending = db.query('SELECT name, last_id, end_id FROM schema_backfills WHERE last_id < end_id')
+
+    for name, last_id, end_id in pending:
+        backfill = BACKFILLS[name]
+        logger.info(f"Backfilling {name}: ids {last_id}-{end_id}")
+
+        while last_id < end_id:
+            upper = min(last_id + chunk_size, end_id)
+            with db.transaction() as cursor:
+                backfill(cursor, last_id, upper)
+                cursor.execute('UPDATE schema_backfills SET last_id = ? WHERE name = ?', (upper, name))
+            last_id = upper
+
+            if time_budget is not None and time.monotonic() - started_at > time_budget and last_id < end_id:
+                logger.info(f"Backfill {name} paused at id {last_id}/{end_id}")
+                return False
+
+        logger.info(f"Backfill {name} completed")
+
+    return True
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'price_tracker.db'
+
+    db = Database(db_path)
+    print(f"Schema version: {current_version(db)}")
+    print(f"Migrated to version: {migrate(db)}")
+    run_backfills(db)
+    print("Backfills completed")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
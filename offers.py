@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Offers Fetcher
+Reads seller offers from the All Offers Display (AOD) fragment of a
+product instead of the full product page. The offer list on the product
+page is loaded lazily and usually missing; the fragment always has it,
+is a fraction of the page size and is paginated (10 offers per page).
+"""
+
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from page_parser import AOD_OFFER_SELECTOR, AOD_PINNED_SELECTOR, AOD_TOTAL_SELECTOR, parse_offer_count
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OFFERS = {
+    "enabled": False,                # Refresh seller prices from the offers fragment between full page fetches
+    "full_page_hours": 24,           # Fetch the full product page (title, availability) at least this often
+    "max_pages": 5                   # Offer pages fetched per product
+}
+
+OFFERS_PAGE_SIZE = 10
+
+
+def offers_url(product_url: str, asin: str, page: int = 1) -> str:
+    """AOD fragment URL on the product's marketplace"""
+    parsed = urlparse(product_url)
+    url = f"{parsed.scheme}://{parsed.netloc}/gp/aod/ajax/?asin={asin}&pc=dp"
+    if page > 1:
+        url += f"&isonlyrenderofferlist=true&pageno={page}"
+    return url
+
+
+class OffersFetcher:
+    """Seller offers of a product, fetched through the tracker's session, rate limiter and page cache"""
+
+    def __init__(self, tracker, max_pages: int = 5):
+        self.tracker = tracker
+        self.max_pages = max(1, max_pages)
+
+    def parse(self, content: bytes) -> Dict:
+        """{'pinned': seller or None, 'offers': [sellers], 'total': offer count or None}"""
+        page_parser = self.tracker.page_parser
+        if page_parser is not None:
+            return page_parser.parse_offers(content)
+
+        # BeautifulSoup fallback, with the tracker's seller parsing
+        soup = BeautifulSoup(content, 'html.parser')
+        pinned = soup.select_one(AOD_PINNED_SELECTOR)
+        total = soup.select_one(AOD_TOTAL_SELECTOR)
+        offers = [self.tracker._parse_seller_element(element) for element in soup.select(AOD_OFFER_SELECTOR)]
+        return {
+            'pinned': self.tracker._parse_seller_element(pinned) if pinned else None,
+            'offers': [offer for offer in offers if offer],
+            'total': parse_offer_count(total.get('value')) if total else None
+        }
+
+    def fetch(self, url: str, asin: str) -> List[Dict]:
+        """
+        Sellers of a product, following the offer pages until every offer
+        was seen or max_pages. The pinned offer is the buy box, named
+        'Amazon' like the main price of a full page fetch so both modes
+        write the same seller series.
+        """
+        host = urlparse(url).netloc.lower()
+        sellers = []
+        seen = set()
+        offer_count = 0
+
+        for page in range(1, self.max_pages + 1):
+            content = self.tracker._download_page(offers_url(url, asin, page), asin,
+                                                  cache_key=f"{host}/aod/{asin}/{page}", kind='offers')
+            with self.tracker.metrics.time('price_tracker_parse_seconds', stage='offers'):
+                parsed = self.parse(content)
+
+            if page == 1 and parsed['pinned']:
+                sellers.append({**parsed['pinned'], 'name': 'Amazon'})
+
+            new = 0
+            for offer in parsed['offers']:
+                key = (offer.get('name'), offer['price'])
+                if not offer.get('name') or key in seen:
+                    continue
+                seen.add(key)
+                sellers.append(offer)
+                new += 1
+            offer_count += len(parsed['offers'])
+
+            total = parsed['total']
+            if not new or len(parsed['offers']) < OFFERS_PAGE_SIZE or (total is not None and offer_count >= total):
+                break
+
+        logger.debug(f"Offers fetched for {asin}: {len(sellers)} sellers in {page} pages")
+        return sellers
+
+
+def create_offers_fetcher(tracker) -> OffersFetcher:
+    """Offers fetcher for the tracker's offers settings"""
+    return OffersFetcher(tracker, tracker.config['offers']['max_pages'])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Page Cache
+Size-bounded on-disk LRU cache of product pages, stored gzip-compressed and
+keyed by the cleaned ASIN URL. Keeps ETag/Last-Modified for revalidation.
+
+Usage:
+  python page_cache.py export [cache_dir] [out_dir]   # write cached pages as .html
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPage:
+    """A cached response body with its validators"""
+
+    def __init__(self, url: str, content: bytes, stored_at: float,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.url = url
+        self.content = content
+        self.stored_at = stored_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, ttl_seconds: float) -> bool:
+        return time.time() - self.stored_at < ttl_seconds
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers asking the server to answer 304 if the page is unchanged"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    One file per page: a JSON metadata line followed by the gzip body.
+    File mtimes track recency, the least recently used files are removed
+    when the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory: str = 'page_cache', ttl_seconds: float = 600, max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.gz')
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        """Return the cached page (fresh or stale) or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = gzip.decompress(f.read())
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        return CachedPage(key, content, meta['stored_at'], meta.get('etag'), meta.get('last_modified'))
+
+    def put(self, key: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a page, evicting least recently used pages if needed"""
+        meta = {'url': key, 'stored_at': time.time(), 'etag': etag, 'last_modified': last_modified}
+        data = json.dumps(meta).encode('utf-8') + b'\n' + gzip.compress(content, compresslevel=5)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, key: str):
+        """Mark a cached page as revalidated (server answered 304)"""
+        page = self.get(key)
+        if page:
+            self.put(key, page.content, page.etag, page.last_modified)
+
+    def remove(self, key: str):
+        """Drop a cached page (e.g. a block page that was stored as a product page)"""
+        with self.lock:
+            self._remove(self._path(key))
+
+    def _remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.total_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least recently used files until under 90% of max_bytes"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.gz')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self.total_bytes <= target:
+                break
+            self._remove(entry.path)
+
+    def export(self, out_dir: str) -> int:
+        """Write every cached page as a plain .html file (e.g. for benchmark.py)"""
+        os.makedirs(out_dir, exist_ok=True)
+        count = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.gz'):
+                continue
+            with open(entry.path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = gzip.decompress(f.read())
+            name = meta['url'].rstrip('/').rsplit('/', 1)[-1] or entry.name[:-3]
+            with open(os.path.join(out_dir, f"{name}.html"), 'wb') as f:
+                f.write(content)
+            count += 1
+        return count
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'export':
+        print("Usage: python page_cache.py export [cache_dir] [out_dir]")
+        sys.exit(1)
+
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else 'page_cache'
+    out_dir = sys.argv[3] if len(sys.argv) > 3 else 'benchmark_pages'
+    count = PageCache(cache_dir).export(out_dir)
+    print(f"Exported {count} pages to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
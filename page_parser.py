@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Page Parser
+Single-pass product page extraction on top of fast HTML parsers.
+selectolax is used when installed, otherwise lxml. AmazonPriceTracker keeps
+its BeautifulSoup extraction as the fallback.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:  # Optional dependency
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # Optional dependency
+    LexborHTMLParser = None
+
+# Selectors are tried in order, the first one with a usable match wins
+TITLE_SELECTORS = [
+    '#productTitle',
+    '.product-title',
+    'h1.a-size-large',
+    '[data-feature-name="title"] h1'
+]
+
+PRICE_SELECTORS = [
+    '.a-price-current .a-offscreen',
+    '.a-price .a-offscreen',
+    '#corePrice_feature_div .a-price .a-offscreen',
+    '.a-price-whole'
+]
+
+AVAILABILITY_SELECTORS = [
+    '#availability span',
+    '.a-color-success',
+    '.a-color-state',
+    '[data-feature-name="availability"] span'
+]
+
+OFFER_SELECTOR = '#aod-offer-list [data-aod-offer-id]'
+
+# All Offers Display fragment (see offers.py): later pages have no #aod-offer-list
+AOD_PINNED_SELECTOR = '#aod-pinned-offer'
+AOD_OFFER_SELECTOR = '[data-aod-offer-id]'
+AOD_TOTAL_SELECTOR = '#aod-total-offer-count'
+JSON_LD_SELECTOR = 'script[type="application/ld+json"]'
+
+SELLER_NAME_SELECTOR = '[aria-label*="seller"]'
+SELLER_PRICE_SELECTOR = '.a-price .a-offscreen'
+SELLER_SHIPPING_SELECTOR = '[data-csa-c-content-id="aod-delivery-price"]'
+SELLER_PRIME_SELECTOR = '.aod-prime-logo'
+
+TEXT_SKIP_TAGS = ('script', 'style')
+
+# Page regions holding every field we extract, cut out before building a DOM
+REGION_IDS = (b'productTitle', b'corePrice_feature_div', b'availability', b'aod-offer-list')
+REQUIRED_REGION_IDS = (b'productTitle', b'corePrice_feature_div')
+# Price-only checks: title and availability are already known
+PRICE_REGION_IDS = (b'corePrice_feature_div', b'aod-offer-list')
+REQUIRED_PRICE_REGION_IDS = (b'corePrice_feature_div',)
+
+REGION_ID_RE = re.compile(
+    rb'(?<![\w-])id\s*=\s*["\']?(' + b'|'.join(REGION_IDS) + rb')(?=["\'\s/>])'
+)
+JSON_LD_RE = re.compile(rb'<script[^>]*type\s*=\s*["\']?application/ld\+json[^>]*>', re.IGNORECASE)
+SCRIPT_END_RE = re.compile(rb'</script\s*>', re.IGNORECASE)
+TAG_NAME_RE = re.compile(rb'<([a-zA-Z][\w-]*)')
+CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w-]+)', re.IGNORECASE)
+
+
+# Amazon's robot check page
+CAPTCHA_MARKERS = (
+    b'/errors/validateCaptcha',
+    b'Type the characters you see in this image',
+    b"Sorry, we just need to make sure you're not a robot",
+)
+
+
+def classify_block(status: int, content: bytes) -> Optional[str]:
+    """Block reason of a response ('captcha' or 'throttled'), None for a normal page"""
+    # The robot check is small, a product page is not worth scanning in full
+    if len(content) < 65536 and any(marker in content for marker in CAPTCHA_MARKERS):
+        return 'captcha'
+    if status in (429, 503):
+        return 'throttled'
+    return None
+
+
+def parse_price(price_text: str) -> Optional[float]:
+    """Convert price text to number"""
+    if not price_text:
+        return None
+
+    # Remove currency symbols and clean
+    price_clean = re.sub(r'[^\d.,]', '', price_text)
+    price_clean = price_clean.replace(',', '')
+
+    try:
+        return float(price_clean)
+    except ValueError:
+        return None
+
+
+def parse_offer_count(value: Optional[str]) -> Optional[int]:
+    """Offer count from the AOD total count field"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_json_offer(offer: Dict) -> Optional[Dict]:
+    """Extract seller info from JSON offer"""
+    try:
+        return {
+            'name': offer.get('seller', {}).get('name', 'Unknown'),
+            'price': float(offer.get('price', 0)),
+            'shipping': 'Unknown',
+            'prime': False
+        }
+    except:
+        return None
+
+
+def parse_json_ld_sellers(scripts: List[Optional[str]]) -> List[Dict]:
+    """Extract sellers from JSON-LD Product offers"""
+    sellers = []
+
+    for script in scripts:
+        try:
+            data = json.loads(script)
+            if isinstance(data, dict) and data.get('@type') == 'Product':
+                offers = data.get('offers', {})
+                if isinstance(offers, list):
+                    for offer in offers:
+                        seller = parse_json_offer(offer)
+                        if seller:
+                            sellers.append(seller)
+        except:
+            continue
+
+    return sellers
+
+
+def _find_element_end(content: bytes, tag_start: int) -> Optional[Tuple[bytes, int]]:
+    """Return (tag name, end offset) of the element whose start tag begins at tag_start"""
+    name_match = TAG_NAME_RE.match(content, tag_start)
+    if not name_match:
+        return None
+    tag = name_match.group(1).lower()
+    open_end = content.find(b'>', name_match.end())
+    if open_end < 0:
+        return None
+    if content[open_end - 1:open_end] == b'/':
+        return tag, open_end + 1
+
+    # Count nested tags with the same name until the matching close tag
+    tag_re = re.compile(rb'<(/?)' + re.escape(tag) + rb'(?=[\s/>])[^>]*>', re.IGNORECASE)
+    depth = 1
+    for match in tag_re.finditer(content, open_end + 1):
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return tag, match.end()
+        elif not match.group(0).endswith(b'/>'):
+            depth += 1
+    return None
+
+
+def extract_regions(content: bytes, region_ids: Tuple[bytes, ...] = REGION_IDS,
+                    required_ids: Tuple[bytes, ...] = REQUIRED_REGION_IDS) -> Optional[bytes]:
+    """
+    Cut the product regions and JSON-LD scripts out of a raw page by byte
+    offset scanning. Returns a small standalone document, or None when a
+    required region is missing and the full page should be parsed instead.
+    """
+    spans = []
+    seen = set()
+
+    for match in REGION_ID_RE.finditer(content):
+        region_id = match.group(1)
+        if region_id in seen or region_id not in region_ids:
+            continue
+        tag_start = content.rfind(b'<', 0, match.start())
+        found = _find_element_end(content, tag_start) if tag_start >= 0 else None
+        if found is None:
+            continue
+        seen.add(region_id)
+        spans.append((tag_start, found[1]))
+
+    if any(region_id not in seen for region_id in required_ids):
+        return None
+
+    for match in JSON_LD_RE.finditer(content):
+        end = SCRIPT_END_RE.search(content, match.end())
+        if end:
+            spans.append((match.start(), end.end()))
+
+    # Keep document order and drop regions nested in an earlier one
+    regions = []
+    last_end = -1
+    for start, end in sorted(spans):
+        if start >= last_end:
+            regions.append(content[start:end])
+            last_end = end
+
+    charset = CHARSET_RE.search(content, 0, 8192)
+    charset = charset.group(1) if charset else b'utf-8'
+    return (b'<html><head><meta charset="' + charset + b'"></head><body>'
+            + b''.join(regions) + b'</body></html>')
+
+
+class PriceRegionScanner:
+    """
+    Fed a page while it downloads; tells when the price and offer regions
+    are complete, so the rest of the page does not have to be read. Without
+    an offer list, reading stops lookahead bytes after the price region.
+    """
+
+    def __init__(self, lookahead: int = 65536):
+        self.buffer = bytearray()
+        self.lookahead = lookahead
+        self.scanned = 0
+        self.starts: Dict[bytes, int] = {}
+        self.ends: Dict[bytes, int] = {}
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add downloaded bytes, True once the needed regions are complete"""
+        self.buffer += chunk
+        content = self.buffer
+        # Step back so an id split between chunks is still found
+        for match in REGION_ID_RE.finditer(content, max(self.scanned - 256, 0)):
+            region_id = match.group(1)
+            if region_id in PRICE_REGION_IDS and region_id not in self.starts:
+                tag_start = content.rfind(b'<', 0, match.start())
+                if tag_start >= 0:
+                    self.starts[region_id] = tag_start
+        self.scanned = len(content)
+
+        for region_id, tag_start in self.starts.items():
+            if region_id not in self.ends:
+                found = _find_element_end(content, tag_start)
+                if found is not None:
+                    self.ends[region_id] = found[1]
+
+        price_end = self.ends.get(b'corePrice_feature_div')
+        if price_end is None:
+            return False
+        if b'aod-offer-list' in self.starts:
+            return b'aod-offer-list' in self.ends
+        return len(content) - price_end >= self.lookahead
+
+    @property
+    def content(self) -> bytes:
+        return bytes(self.buffer)
+
+
+class CompiledSelector:
+    """Small CSS selector subset: tag, #id, .class, [attr], [attr=v], [attr*=v] and descendant combinators"""
+
+    PART_RE = re.compile(r'(?:\[[^\]]*\]|[^\s\[])+')
+    TOKEN_RE = re.compile(r'#([\w-]+)|\.([\w-]+)|\[([\w-]+)(?:([*]?=)"?([^"\]]*)"?)?\]|^([a-zA-Z][\w-]*)')
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        self.parts = [self._compile_part(part) for part in self.PART_RE.findall(selector)]
+        if not self.parts:
+            raise ValueError(f"Empty selector: {selector!r}")
+
+    def _compile_part(self, text: str) -> Dict:
+        part = {'tag': None, 'id': None, 'classes': [], 'attrs': []}
+        for match in self.TOKEN_RE.finditer(text):
+            element_id, class_name, attr, op, value, tag = match.groups()
+            if element_id:
+                part['id'] = element_id
+            elif class_name:
+                part['classes'].append(class_name)
+            elif attr:
+                part['attrs'].append((attr, op, value))
+            elif tag:
+                part['tag'] = tag.lower()
+        return part
+
+    @property
+    def key(self):
+        """Cheapest attribute of the rightmost part, used to index selectors"""
+        part = self.parts[-1]
+        if part['id']:
+            return ('id', part['id'])
+        if part['classes']:
+            return ('class', part['classes'][0])
+        if part['attrs']:
+            return ('attr', part['attrs'][0][0])
+        return ('tag', part['tag'])
+
+    @staticmethod
+    def _part_matches(part: Dict, tag: str, attrs) -> bool:
+        if part['tag'] and part['tag'] != tag:
+            return False
+        if part['id'] and attrs.get('id') != part['id']:
+            return False
+        if part['classes']:
+            classes = (attrs.get('class') or '').split()
+            if any(name not in classes for name in part['classes']):
+                return False
+        for name, op, value in part['attrs']:
+            if name not in attrs:
+                return False
+            actual = attrs.get(name) or ''
+            if op == '=' and actual != value:
+                return False
+            if op == '*=' and value not in actual:
+                return False
+        return True
+
+    def matches(self, adapter, element, tag: str, attrs) -> bool:
+        """Match the element, walking its ancestors for descendant parts"""
+        if not self._part_matches(self.parts[-1], tag, attrs):
+            return False
+
+        remaining = len(self.parts) - 2
+        ancestor = adapter.parent(element)
+        while remaining >= 0 and ancestor is not None:
+            if self._part_matches(self.parts[remaining], adapter.tag(ancestor), adapter.attrs(ancestor)):
+                remaining -= 1
+            ancestor = adapter.parent(ancestor)
+        return remaining < 0
+
+
+class SelectorIndex:
+    """Groups of selectors evaluated together in one traversal"""
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.groups = {name: [CompiledSelector(s) for s in selectors] for name, selectors in groups.items()}
+        self.by_id = {}
+        self.by_class = {}
+        self.by_attr = {}
+        self.by_tag = {}
+        for name, selectors in self.groups.items():
+            for position, selector in enumerate(selectors):
+                kind, value = selector.key
+                index = {'id': self.by_id, 'class': self.by_class, 'attr': self.by_attr, 'tag': self.by_tag}[kind]
+                index.setdefault(value, []).append((name, position, selector))
+
+    def scan(self, adapter, elements, collect_all=()) -> Dict[str, List]:
+        """
+        Walk elements once. For each group returns, per selector, the first
+        match (or every match for groups listed in collect_all).
+        """
+        results = {name: [[] for _ in selectors] for name, selectors in self.groups.items()}
+
+        for element in elements:
+            tag = adapter.tag(element)
+            attrs = adapter.attrs(element)
+            candidates = list(self.by_tag.get(tag, ()))
+            element_id = attrs.get('id')
+            if element_id and element_id in self.by_id:
+                candidates.extend(self.by_id[element_id])
+            class_attr = attrs.get('class')
+            if class_attr:
+                for class_name in set(class_attr.split()):
+                    candidates.extend(self.by_class.get(class_name, ()))
+            for attr_name, entries in self.by_attr.items():
+                if attr_name in attrs:
+                    candidates.extend(entries)
+
+            for name, position, selector in candidates:
+                found = results[name][position]
+                if found and name not in collect_all:
+                    continue
+                if selector.matches(adapter, element, tag, attrs):
+                    found.append(element)
+
+        return results
+
+
+PAGE_INDEX = SelectorIndex({
+    'title': TITLE_SELECTORS,
+    'price': PRICE_SELECTORS,
+    'availability': AVAILABILITY_SELECTORS,
+    'offers': [OFFER_SELECTOR],
+    'json_ld': [JSON_LD_SELECTOR]
+})
+
+OFFERS_INDEX = SelectorIndex({
+    'pinned': [AOD_PINNED_SELECTOR],
+    'offers': [AOD_OFFER_SELECTOR],
+    'total': [AOD_TOTAL_SELECTOR]
+})
+
+SELLER_INDEX = SelectorIndex({
+    'name': [SELLER_NAME_SELECTOR],
+    'price': [SELLER_PRICE_SELECTOR],
+    'shipping': [SELLER_SHIPPING_SELECTOR],
+    'prime': [SELLER_PRIME_SELECTOR]
+})
+
+
+class LxmlAdapter:
+    """Tree access for lxml.html documents"""
+
+    name = 'lxml'
+
+    def parse(self, content: bytes):
+        try:
+            return lxml.html.document_fromstring(content)
+        except (etree.ParserError, ValueError):
+            return lxml.html.document_fromstring('<html></html>')
+
+    def iter_elements(self, root):
+        return root.iter(etree.Element)
+
+    def iter_descendants(self, element):
+        return element.iterdescendants(etree.Element)
+
+    def tag(self, element) -> str:
+        return element.tag
+
+    def attrs(self, element):
+        return element.attrib
+
+    def parent(self, element):
+        return element.getparent()
+
+    def text(self, element) -> str:
+        # Same result as BeautifulSoup get_text(strip=True): no script/style/comment text
+        parts = []
+
+        def walk(node):
+            if node.text and node.tag not in TEXT_SKIP_TAGS:
+                parts.append(node.text)
+            for child in node:
+                if isinstance(child.tag, str):
+                    walk(child)
+                if child.tail:
+                    parts.append(child.tail)
+
+        walk(element)
+        return ''.join(part.strip() for part in parts)
+
+    def string(self, element) -> Optional[str]:
+        return element.text
+
+
+class SelectolaxAdapter:
+    """Tree access for selectolax (lexbor) documents"""
+
+    name = 'selectolax'
+
+    def parse(self, content: bytes):
+        return LexborHTMLParser(content).root
+
+    def iter_elements(self, root):
+        if root is None:
+            return
+        for node in root.traverse():
+            if node.tag[0] not in '-_':
+                yield node
+
+    def iter_descendants(self, element):
+        nodes = self.iter_elements(element)
+        next(nodes, None)  # traverse() starts with the element itself
+        return nodes
+
+    def tag(self, element) -> str:
+        return element.tag
+
+    def attrs(self, element):
+        return element.attributes
+
+    def parent(self, element):
+        parent = element.parent
+        if parent is None or parent.tag[0] in '-_':
+            return None
+        return parent
+
+    def text(self, element) -> str:
+        parts = []
+        for node in element.traverse(include_text=True):
+            if node.tag == '-text' and node.parent.tag not in TEXT_SKIP_TAGS:
+                parts.append((node.text_content or '').strip())
+        return ''.join(parts)
+
+    def string(self, element) -> Optional[str]:
+        return element.text(deep=True)
+
+
+class SinglePassParser:
+    """Extracts every product field from one traversal of the page"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.name = adapter.name
+
+    def parse(self, content: bytes) -> Dict:
+        """Return title, main_price, availability and sellers for a page"""
+        adapter = self.adapter
+        root = adapter.parse(content)
+        found = PAGE_INDEX.scan(adapter, adapter.iter_elements(root), collect_all=('offers', 'json_ld'))
+
+        title = "Title not found"
+        for matches in found['title']:
+            if matches:
+                title = adapter.text(matches[0])
+                break
+
+        main_price = None
+        for matches in found['price']:
+            if matches:
+                main_price = parse_price(adapter.text(matches[0]))
+                if main_price:
+                    break
+
+        availability = "Status unknown"
+        for matches in found['availability']:
+            if matches:
+                availability = adapter.text(matches[0])
+                break
+
+        sellers = []
+        if main_price:
+            sellers.append({
+                'name': 'Amazon',
+                'price': main_price,
+                'shipping': 'Free',
+                'prime': True
+            })
+
+        for element in found['offers'][0]:
+            seller = self._parse_offer(element)
+            if seller:
+                sellers.append(seller)
+
+        if len(sellers) <= 1:
+            sellers.extend(parse_json_ld_sellers([adapter.string(e) for e in found['json_ld'][0]]))
+
+        return {
+            'title': title,
+            'sellers': sellers,
+            'main_price': main_price,
+            'availability': availability
+        }
+
+    def parse_offers(self, content: bytes) -> Dict:
+        """Return the pinned (buy box) offer, the other offers and the total offer count of an AOD fragment"""
+        adapter = self.adapter
+        root = adapter.parse(content)
+        found = OFFERS_INDEX.scan(adapter, adapter.iter_elements(root), collect_all=('offers',))
+
+        pinned = self._parse_offer(found['pinned'][0][0]) if found['pinned'][0] else None
+        offers = [seller for seller in map(self._parse_offer, found['offers'][0]) if seller]
+
+        total = None
+        if found['total'][0]:
+            total = parse_offer_count(adapter.attrs(found['total'][0][0]).get('value'))
+
+        return {'pinned': pinned, 'offers': offers, 'total': total}
+
+    def _parse_offer(self, element) -> Optional[Dict]:
+        """Single-pass equivalent of AmazonPriceTracker._parse_seller_element"""
+        adapter = self.adapter
+        found = SELLER_INDEX.scan(adapter, adapter.iter_descendants(element))
+        seller = {}
+
+        if found['name'][0]:
+            seller['name'] = adapter.text(found['name'][0][0])
+
+        if found['price'][0]:
+            price = parse_price(adapter.text(found['price'][0][0]))
+            if price:
+                seller['price'] = price
+
+        if found['shipping'][0]:
+            seller['shipping'] = adapter.text(found['shipping'][0][0])
+
+        seller['prime'] = bool(found['prime'][0])
+
+        return seller if seller.get('price') else None
+
+
+def available_backends() -> List[str]:
+    """Installed parser backends, fastest first"""
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append('selectolax')
+    if lxml is not None:
+        backends.append('lxml')
+    backends.append('beautifulsoup')
+    return backends
+
+
+def create_page_parser(backend: str = 'auto') -> Optional[SinglePassParser]:
+    """
+    Create a single-pass parser for the backend. Returns None for
+    'beautifulsoup' (or 'auto' with nothing faster installed), meaning the
+    BeautifulSoup extraction should be used.
+    """
+    if backend == 'auto':
+        backend = available_backends()[0]
+
+    if backend == 'selectolax':
+        if LexborHTMLParser is None:
+            raise ImportError("selectolax is not installed: pip install selectolax")
+        return SinglePassParser(SelectolaxAdapter())
+    if backend == 'lxml':
+        if lxml is None:
+            raise ImportError("lxml is not installed: pip install lxml")
+        return SinglePassParser(LxmlAdapter())
+    if backend == 'beautifulsoup':
+        return None
+
+    raise ValueError(f"Unknown parser backend: {backend}")
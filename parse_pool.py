@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Parse Pool
+Parses product pages in worker processes so parsing is not limited to one
+core by the GIL. Workers are started and warmed up front, and pages
+submitted by concurrent fetch threads are grouped into small batches to
+keep the per-task IPC overhead low.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from page_parser import extract_regions
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PAGE = b'''<html><head><meta charset="utf-8"></head><body>
+<span id="productTitle">Warm-up</span>
+<div id="corePrice_feature_div"><span class="a-price"><span class="a-offscreen">$1.00</span></span></div>
+<div id="availability"><span>In Stock</span></div>
+</body></html>'''
+
+# Parser of the current worker process
+_worker_tracker = None
+
+
+def _init_worker(backend: str):
+    """Import the parsing code and run it once, so the first real page is not slower"""
+    global _worker_tracker
+    # Workers log their warnings to stderr; the parent owns price_tracker.log
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+    from amazon_price_tracker import AmazonPriceTracker
+    from metrics import NULL_METRICS
+    from page_parser import create_page_parser
+
+    # Only the parsing methods are used, so skip __init__ (config, DB, session)
+    tracker = AmazonPriceTracker.__new__(AmazonPriceTracker)
+    tracker.page_parser = create_page_parser(backend)
+    tracker.region_extraction = False  # Done in the parent, so less data is pickled
+    tracker.metrics = NULL_METRICS
+    tracker.parse_product_page(WARMUP_PAGE, '', '')
+    _worker_tracker = tracker
+
+
+def _ping(delay: float) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _parse_batch(items: List[Tuple[bytes, str, str]]) -> List:
+    """Parse several pages, a failed page returns its exception"""
+    results = []
+    for content, url, asin in items:
+        try:
+            results.append(_worker_tracker.parse_product_page(content, url, asin))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class ParsePool:
+    """Process pool fed through a small batching queue"""
+
+    def __init__(self, processes: int, backend: str = 'auto', region_extraction: bool = True,
+                 batch_size: int = 8, max_delay: float = 0.002):
+        self.processes = processes
+        self.region_extraction = region_extraction
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        # spawn: forking a process that already runs fetch threads can copy held locks
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(backend,)
+        )
+        self.pending: List[Tuple[Tuple[bytes, str, str], Future]] = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch, name='parse-pool-dispatcher', daemon=True)
+        self.dispatcher.start()
+
+    def warm_up(self):
+        """Start every worker process now instead of on the first pages"""
+        started_at = time.monotonic()
+        # One slow task per worker makes the executor start all of them
+        pids = set(future.result() for future in [self.executor.submit(_ping, 0.05) for _ in range(self.processes)])
+        logger.info(f"Parse pool ready: {len(pids)} processes in {time.monotonic() - started_at:.1f}s")
+
+    def submit(self, content: bytes, url: str, asin: str) -> Future:
+        """Queue a page for parsing, the future resolves to the product_info dict"""
+        if self.region_extraction:
+            # Cheap byte search, ships a few KB instead of the full page
+            content = extract_regions(content) or content
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Parse pool is closed")
+            self.pending.append(((content, url, asin), future))
+            self.condition.notify()
+        return future
+
+    def parse(self, content: bytes, url: str, asin: str) -> Dict:
+        return self.submit(content, url, asin).result()
+
+    def _dispatch(self):
+        """Send pending pages in batches of batch_size (or whatever arrived within max_delay)"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending and self.closed:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while len(self.pending) < self.batch_size and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+
+            futures = [future for _, future in batch]
+            try:
+                task = self.executor.submit(_parse_batch, [item for item, _ in batch])
+            except Exception as e:  # Pool broken or shut down
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            task.add_done_callback(lambda task, futures=futures: self._resolve(task, futures))
+
+    @staticmethod
+    def _resolve(task: Future, futures: List[Future]):
+        try:
+            results = task.result()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+
+def create_parse_pool(tracking: Dict) -> Optional[ParsePool]:
+    """Parse pool for the tracking settings (None when parse_processes is 0)"""
+    processes = tracking.get('parse_processes') or 0
+    if processes <= 0:
+        return None
+    pool = ParsePool(processes, tracking['parser_backend'], tracking['region_extraction'],
+                     tracking['parse_batch_size'])
+    pool.warm_up()
+    return pool
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Rate Limiting
+Token bucket rate limiters shared by the concurrent fetch workers, and a
+per-host circuit breaker that pauses a host after it served a block page.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCKING = {
+    "backoff_seconds": 30,           # Pause after the first block page, doubled for every further one
+    "max_backoff_seconds": 1800,
+    "jitter_pct": 50,                # Random spread of each pause, so workers do not probe in lockstep
+    "max_wait_seconds": 60,          # Fail a request (and re-queue the product) instead of waiting longer
+    "requeue_rounds": 1,             # Passes retry failed products this many times at the end
+    "retry_seconds": 300             # Continuous mode: retry a failed product after this delay
+}
+
+
+def route_key(url: str, route: Optional[str] = None) -> str:
+    """Host of a URL, qualified by the proxy route requests to it take (None: direct)"""
+    host = urlparse(url).netloc.lower()
+    return host if route is None else f"{host} via {route}"
+
+
+class TokenBucket:
+    """Thread-safe token bucket"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """rate: tokens added per second, capacity: maximum burst size"""
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available, otherwise return seconds to wait"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available, return seconds waited"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self) -> float:
+        """Wait for a token without blocking the event loop"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """One token bucket per marketplace host (and proxy route)"""
+
+    def __init__(self, rate_per_host: float, burst: float = 1.0):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url: str, route: Optional[str] = None) -> TokenBucket:
+        """Get (or create) the bucket for the host of a URL"""
+        host = route_key(url, route)
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_per_host, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url: str, route: Optional[str] = None) -> float:
+        """Wait for permission to send a request to the URL's host"""
+        return self.bucket_for(url, route).acquire()
+
+    async def acquire_async(self, url: str, route: Optional[str] = None) -> float:
+        """Async variant of acquire"""
+        return await self.bucket_for(url, route).acquire_async()
+
+
+class BlockedError(Exception):
+    """The host answered with a block page (captcha, throttling) instead of the product"""
+
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"{host} blocked the request ({reason})")
+        self.host = host
+        self.reason = reason
+
+
+class CircuitOpenError(BlockedError):
+    """Requests to the host are paused by its circuit breaker"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(host, f"circuit open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class _HostCircuit:
+    __slots__ = ('blocks', 'open_until', 'probing', 'recent')
+
+    def __init__(self, window: int):
+        self.blocks = 0            # Consecutive block pages
+        self.open_until = 0.0
+        self.probing = False       # A request is testing whether the block is over
+        self.recent = deque(maxlen=window)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. A block page opens the host's circuit for an
+    exponentially growing, jittered backoff. When it ends a single probe
+    request goes out: success closes the circuit, another block page opens
+    it again for twice as long. Requests wait while the circuit is open, or
+    fail with CircuitOpenError when that would take over max_wait_seconds.
+    Requests sent through a proxy (route) have circuits of their own.
+    """
+
+    def __init__(self, backoff_seconds: float = 30, max_backoff_seconds: float = 1800, jitter_pct: float = 50,
+                 max_wait_seconds: float = 60, window: int = 100, metrics=NULL_METRICS):
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.jitter = jitter_pct / 100
+        self.max_wait_seconds = max_wait_seconds
+        self.window = window
+        self.metrics = metrics
+        self.hosts: Dict[str, _HostCircuit] = {}
+        self.lock = threading.Lock()
+
+    def _host(self, host: str) -> _HostCircuit:
+        circuit = self.hosts.get(host)
+        if circuit is None:
+            circuit = self.hosts[host] = _HostCircuit(self.window)
+        return circuit
+
+    def is_open(self, url: str, route: Optional[str] = None) -> bool:
+        """Whether requests to the URL's host over route are paused"""
+        with self.lock:
+            circuit = self.hosts.get(route_key(url, route))
+            return circuit is not None and time.monotonic() < circuit.open_until
+
+    def try_acquire(self, url: str, route: Optional[str] = None) -> float:
+        """Allow a request to the URL's host (returns 0) or return seconds to wait"""
+        host = route_key(url, route)
+        with self.lock:
+            circuit = self._host(host)
+            now = time.monotonic()
+            if circuit.blocks == 0:
+                return 0.0
+            if now < circuit.open_until:
+                return circuit.open_until - now
+            if circuit.probing:
+                return 0.5
+            circuit.probing = True
+            return 0.0
+
+    def _check_wait(self, url: str, waited: float, delay: float, max_wait: Optional[float]):
+        if max_wait is None or max_wait > self.max_wait_seconds:
+            max_wait = self.max_wait_seconds
+        if waited + delay > max_wait:
+            raise CircuitOpenError(urlparse(url).netloc.lower(), delay)
+
+    def acquire(self, url: str, max_wait: Optional[float] = None, route: Optional[str] = None) -> float:
+        """
+        Block until the host's circuit lets a request through, return seconds
+        waited. max_wait shortens max_wait_seconds (e.g. to a deadline).
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(url, route)
+            if delay <= 0:
+                return waited
+            self._check_wait(url, waited, delay, max_wait)
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, url: str, max_wait: Optional[float] = None, route: Optional[str] = None) -> float:
+        """Async variant of acquire"""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(url, route)
+            if delay <= 0:
+                return waited
+            self._check_wait(url, waited, delay, max_wait)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def record_success(self, url: str, route: Optional[str] = None):
+        host = route_key(url, route)
+        with self.lock:
+            circuit = self._host(host)
+            if circuit.blocks:
+                logger.info(f"{host} is answering again, circuit closed after {circuit.blocks} block pages")
+            circuit.blocks = 0
+            circuit.probing = False
+            circuit.recent.append(False)
+            block_rate = sum(circuit.recent) / len(circuit.recent)
+        self.metrics.set('price_tracker_circuit_open', 0, host=host)
+        self.metrics.set('price_tracker_block_rate', block_rate, host=host)
+
+    def record_failure(self, url: str, route: Optional[str] = None):
+        """A request failed for another reason (timeout, connection error): only ends a probe"""
+        with self.lock:
+            self._host(route_key(url, route)).probing = False
+
+    def record_block(self, url: str, reason: str, route: Optional[str] = None):
+        """The host served a block page: open (or re-open) its circuit"""
+        host = route_key(url, route)
+        with self.lock:
+            circuit = self._host(host)
+            now = time.monotonic()
+            circuit.recent.append(True)
+            block_rate = sum(circuit.recent) / len(circuit.recent)
+            # Responses to requests sent before the circuit opened don't extend the pause
+            if now >= circuit.open_until:
+                circuit.blocks += 1
+                backoff = min(self.backoff_seconds * 2 ** (circuit.blocks - 1), self.max_backoff_seconds)
+                backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                circuit.open_until = now + backoff
+                logger.warning(f"{host} served a block page ({reason}), pausing it for {backoff:.0f}s "
+                               f"(block {circuit.blocks} in a row)")
+            circuit.probing = False
+        self.metrics.inc('price_tracker_blocks_total', host=host, reason=reason)
+        self.metrics.set('price_tracker_circuit_open', 1, host=host)
+        self.metrics.set('price_tracker_block_rate', block_rate, host=host)
+
+    def block_rate(self) -> float:
+        """Share of block pages among the recent responses of all hosts"""
+        with self.lock:
+            responses = [blocked for circuit in self.hosts.values() for blocked in circuit.recent]
+        return sum(responses) / len(responses) if responses else 0.0
+
+    def status(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        with self.lock:
+            return {
+                host: {
+                    'open': now < circuit.open_until,
+                    'consecutive_blocks': circuit.blocks,
+                    'block_rate': sum(circuit.recent) / len(circuit.recent) if circuit.recent else 0.0
+                }
+                for host, circuit in self.hosts.items()
+            }
+
+
+def create_circuit_breaker(settings: Dict, metrics=NULL_METRICS) -> CircuitBreaker:
+    """Circuit breaker for the blocking settings"""
+    return CircuitBreaker(settings['backoff_seconds'], settings['max_backoff_seconds'], settings['jitter_pct'],
+                          settings['max_wait_seconds'], metrics=metrics)
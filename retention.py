@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - History Retention
+Keeps full-resolution price_history for a limited window. Older rows are
+downsampled into hourly OHLC buckets, old hourly buckets into daily ones,
+and freed pages are returned with an incremental vacuum.
+
+Usage:
+  python retention.py [db_path] [--vacuum]
+"""
+
+import logging
+import sys
+import time
+from typing import Dict
+
+from migrations import migrate
+from storage import Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION = {
+    "enabled": True,
+    "raw_days": 30,
+    "hourly_days": 180,
+    "interval_hours": 24,
+    "chunk_size": 10000,
+    "vacuum_pages": 2000
+}
+
+# Drop detection compares against the 7-day minimum of raw rows
+MIN_RAW_DAYS = 7
+
+ROLLUP_MERGE = '''
+    ON CONFLICT (product_id, seller_name, resolution, bucket_start) DO UPDATE SET
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        close = excluded.close,
+        sample_count = sample_count + excluded.sample_count,
+        price_sum = price_sum + excluded.price_sum
+'''
+
+
+def _rollup_raw_chunk(db: Database, cutoff: str, chunk_size: int) -> int:
+    """Move the oldest chunk of raw rows before cutoff into hourly buckets"""
+    with db.transaction() as cursor:
+        # Raw ids grow with time, so the rows to roll up are at the start of the table
+        cursor.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id FROM price_history WHERE COALESCE(last_seen, timestamp) < ? ORDER BY id LIMIT ?
+            )
+        ''', (cutoff, chunk_size))
+        max_id = cursor.fetchone()[0]
+        if max_id is None:
+            return 0
+
+        cursor.execute('''
+            INSERT INTO price_history_rollup
+                (product_id, seller_name, resolution, bucket_start, open, high, low, close, sample_count, price_sum)
+            SELECT product_id, seller_name, 'hour', bucket, MIN(first_price), MAX(price), MIN(price),
+                   MIN(last_price), COUNT(price), TOTAL(price)
+            FROM (
+                SELECT product_id, seller_name, price,
+                       strftime('%Y-%m-%d %H:00:00', timestamp) AS bucket,
+                       FIRST_VALUE(price) OVER w AS first_price,
+                       FIRST_VALUE(price) OVER w_desc AS last_price
+                FROM price_history
+                WHERE id <= ? AND COALESCE(last_seen, timestamp) < ?
+                WINDOW w AS (PARTITION BY product_id, seller_name, strftime('%Y-%m-%d %H', timestamp) ORDER BY id),
+                       w_desc AS (PARTITION BY product_id, seller_name, strftime('%Y-%m-%d %H', timestamp) ORDER BY id DESC)
+            )
+            WHERE true
+            GROUP BY product_id, seller_name, bucket
+        ''' + ROLLUP_MERGE, (max_id, cutoff))
+
+        cursor.execute('''
+            DELETE FROM price_history WHERE id <= ? AND COALESCE(last_seen, timestamp) < ?
+        ''', (max_id, cutoff))
+        return cursor.rowcount
+
+
+def _rollup_hourly_day(db: Database, cutoff: str) -> int:
+    """Merge the oldest day of hourly buckets before cutoff into a daily bucket"""
+    with db.transaction() as cursor:
+        cursor.execute('''
+            SELECT date(MIN(bucket_start)) FROM price_history_rollup
+            WHERE resolution = 'hour' AND bucket_start < ?
+        ''', (cutoff,))
+        day = cursor.fetchone()[0]
+        if day is None:
+            return 0
+
+        day_start = f"{day} 00:00:00"
+        day_end = min(f"{day} 23:59:59", cutoff)
+        params = (day_start, day_end)
+
+        cursor.execute('''
+            INSERT INTO price_history_rollup
+                (product_id, seller_name, resolution, bucket_start, open, high, low, close, sample_count, price_sum)
+            SELECT product_id, seller_name, 'day', ?, MIN(first_open), MAX(high), MIN(low),
+                   MIN(last_close), SUM(sample_count), SUM(price_sum)
+            FROM (
+                SELECT product_id, seller_name, high, low, sample_count, price_sum,
+                       FIRST_VALUE(open) OVER w AS first_open,
+                       FIRST_VALUE(close) OVER w_desc AS last_close
+                FROM price_history_rollup
+                WHERE resolution = 'hour' AND bucket_start >= ? AND bucket_start <= ?
+                WINDOW w AS (PARTITION BY product_id, seller_name ORDER BY bucket_start),
+                       w_desc AS (PARTITION BY product_id, seller_name ORDER BY bucket_start DESC)
+            )
+            WHERE true
+            GROUP BY product_id, seller_name
+        ''' + ROLLUP_MERGE, (day_start,) + params)
+
+        cursor.execute('''
+            DELETE FROM price_history_rollup
+            WHERE resolution = 'hour' AND bucket_start >= ? AND bucket_start <= ?
+        ''', params)
+        return cursor.rowcount
+
+
+def incremental_vacuum(db: Database, pages: int) -> bool:
+    """Return up to `pages` free pages to the file system"""
+    if db.query_one('PRAGMA auto_vacuum')[0] != 2:
+        logger.info("Incremental vacuum unavailable, run 'python retention.py --vacuum' once to enable it")
+        return False
+    with db.lock:
+        # execute() only steps the pragma once (one page), executescript runs it to completion
+        db.conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+    return True
+
+
+def enable_incremental_vacuum(db: Database):
+    """Switch an existing database to incremental auto-vacuum (full VACUUM, slow on large files)"""
+    with db.lock:
+        db.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        db.conn.execute('VACUUM')
+
+
+def apply_retention(db: Database, settings: Dict) -> Dict:
+    """Downsample history older than the configured windows, return row counts"""
+    settings = {**DEFAULT_RETENTION, **settings}
+    raw_days = max(settings['raw_days'], MIN_RAW_DAYS)
+    hourly_days = max(settings['hourly_days'], raw_days)
+    started_at = time.monotonic()
+
+    raw_cutoff = db.query_one("SELECT datetime('now', ?)", (f'-{raw_days} days',))[0]
+    hourly_cutoff = db.query_one("SELECT datetime('now', ?)", (f'-{hourly_days} days',))[0]
+
+    # One short transaction per chunk so monitoring writes can interleave
+    raw_rows = 0
+    while True:
+        moved = _rollup_raw_chunk(db, raw_cutoff, settings['chunk_size'])
+        if not moved:
+            break
+        raw_rows += moved
+
+    hourly_rows = 0
+    while True:
+        moved = _rollup_hourly_day(db, hourly_cutoff)
+        if not moved:
+            break
+        hourly_rows += moved
+
+    if raw_rows or hourly_rows:
+        incremental_vacuum(db, settings['vacuum_pages'])
+
+    result = {
+        'raw_rows_downsampled': raw_rows,
+        'hourly_buckets_downsampled': hourly_rows,
+        'duration_seconds': time.monotonic() - started_at
+    }
+    logger.info(f"Retention completed: {raw_rows} raw rows and {hourly_rows} hourly buckets downsampled "
+                f"in {result['duration_seconds']:.1f}s")
+    return result
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    db_path = args[0] if args else 'price_tracker.db'
+
+    db = Database(db_path)
+    migrate(db)
+    if '--vacuum' in sys.argv:
+        print("Running full VACUUM to enable incremental vacuum...")
+        enable_incremental_vacuum(db)
+    print(apply_retention(db, {}))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Retries
+Timeouts, retries with exponential backoff and deadlines for product
+fetches. Every product check has a deadline, capped by the deadline of
+the monitoring pass it belongs to, so a slow host or a hung connection
+cannot hold up a pass past its interval.
+"""
+
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from metrics import NULL_METRICS
+
+DEFAULT_RETRIES = {
+    "connect_timeout_seconds": 5,    # Establishing the connection
+    "read_timeout_seconds": 20,      # Silence between two reads of the response
+    "backoff_seconds": 1,            # Wait before the first retry, doubled for every further one
+    "max_backoff_seconds": 30,
+    "product_deadline_seconds": 120, # All attempts for one product, waits included
+    "pass_deadline_minutes": None    # Stop starting checks after this, defaults to check_interval_hours
+}
+
+# HTTP statuses worth retrying; 429 and 503 are block pages and pause the host instead
+RETRY_STATUSES = frozenset((408, 500, 502, 504))
+
+
+class DeadlineExceeded(Exception):
+    """The product check (or its monitoring pass) ran out of time"""
+
+
+class Deadline:
+    """Point in (monotonic) time by which work has to be finished"""
+
+    def __init__(self, seconds: Optional[float], parent: Optional['Deadline'] = None):
+        expires_at = time.monotonic() + seconds if seconds is not None else None
+        if parent is not None and parent.expires_at is not None:
+            expires_at = parent.expires_at if expires_at is None else min(expires_at, parent.expires_at)
+        self.expires_at = expires_at
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def cap(self, seconds: float) -> float:
+        """seconds, shortened to the time left"""
+        remaining = self.remaining()
+        return seconds if remaining is None else min(seconds, remaining)
+
+    def check(self, what: str):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded for {what}")
+
+
+NO_DEADLINE = Deadline(None)
+
+# Deadline of the product check running in this thread (or asyncio task)
+_current_deadline = contextvars.ContextVar('deadline', default=NO_DEADLINE)
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline):
+    """Make deadline the current one for the requests sent inside the block"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Deadline:
+    return _current_deadline.get()
+
+
+class RetryStats:
+    """Thread-safe counters of the time spent on retries, reset for every pass"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.retries = 0
+            self.retry_seconds = 0.0         # Failed attempts and backoff waits
+            self.exhausted = 0               # Products that failed after all retries
+            self.deadline_exceeded = 0
+
+    def record_retry(self, seconds: float):
+        with self.lock:
+            self.retries += 1
+            self.retry_seconds += seconds
+
+    def record_exhausted(self):
+        with self.lock:
+            self.exhausted += 1
+
+    def record_deadline(self):
+        with self.lock:
+            self.deadline_exceeded += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'retries': self.retries,
+                'retry_seconds': self.retry_seconds,
+                'retries_exhausted': self.exhausted,
+                'deadline_exceeded': self.deadline_exceeded
+            }
+
+
+class RetryPolicy:
+    """Timeouts and backoff of product fetches"""
+
+    def __init__(self, max_retries: int = 3, connect_timeout: float = 5, read_timeout: float = 20,
+                 backoff_seconds: float = 1, max_backoff_seconds: float = 30,
+                 product_deadline_seconds: Optional[float] = 120, metrics=NULL_METRICS):
+        self.max_retries = max(0, max_retries)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.product_deadline_seconds = product_deadline_seconds
+        self.metrics = metrics
+        self.stats = RetryStats()
+
+    def product_deadline(self, pass_deadline: Optional[Deadline] = None) -> Deadline:
+        return Deadline(self.product_deadline_seconds, pass_deadline)
+
+    def timeouts(self) -> Tuple[float, float]:
+        """(connect, read) timeouts for requests, shortened to the current deadline"""
+        deadline = current_deadline()
+        # A timeout of 0 means "no timeout" to some clients
+        return (max(0.1, deadline.cap(self.connect_timeout)), max(0.1, deadline.cap(self.read_timeout)))
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1"""
+        return random.uniform(0, min(self.backoff_seconds * 2 ** attempt, self.max_backoff_seconds))
+
+    def next_delay(self, attempt: int, deadline: Deadline) -> Optional[float]:
+        """Seconds to wait before retrying, None when out of retries or time"""
+        if attempt >= self.max_retries:
+            self.stats.record_exhausted()
+            return None
+        delay = self.backoff(attempt)
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            self.stats.record_deadline()
+            return None
+        return delay
+
+    def record_retry(self, attempt_seconds: float, delay: float, reason: str):
+        self.stats.record_retry(attempt_seconds + delay)
+        self.metrics.inc('price_tracker_retries_total', reason=reason)
+        self.metrics.inc('price_tracker_retry_seconds_total', attempt_seconds + delay)
+
+
+def create_retry_policy(settings: Dict, max_retries: int, metrics=NULL_METRICS) -> RetryPolicy:
+    """Retry policy for the retries settings and tracking.max_retries"""
+    return RetryPolicy(max_retries, settings['connect_timeout_seconds'], settings['read_timeout_seconds'],
+                       settings['backoff_seconds'], settings['max_backoff_seconds'],
+                       settings['product_deadline_seconds'], metrics)
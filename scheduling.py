@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Scheduling
+Keeps products in a heap keyed by their next due time. In adaptive mode
+every product gets its own check interval, derived from how often its
+price changed recently and how close it is to its target price.
+"""
+
+import heapq
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from storage import Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULING = {
+    "mode": "fixed",                 # "fixed" (check_interval_hours) or "adaptive"
+    "continuous": False,             # Check products one by one as they come due instead of in passes
+    "jitter_pct": 10,                # Continuous: random spread of each next due time
+    "min_interval_hours": 1,
+    "max_interval_hours": 48,
+    "volatility_window_days": 30,
+    "changes_per_check": 0.5,        # Aim for one price change every this many checks
+    "target_proximity_pct": 10       # Check more often within this distance of target_price
+}
+
+# Per product: price changes and observed span in the window, current price and target
+VOLATILITY_QUERY = '''
+    WITH recent AS (
+        SELECT product_id, timestamp,
+               LAG(price) OVER w IS NOT NULL AND price IS NOT LAG(price) OVER w AS changed
+        FROM price_history
+        WHERE COALESCE(last_seen, timestamp) > datetime('now', ?) {filter}
+        WINDOW w AS (PARTITION BY product_id, seller_name ORDER BY id)
+    ),
+    volatility AS (
+        SELECT product_id, SUM(changed) AS changes,
+               (julianday('now') - julianday(MIN(timestamp))) * 24 AS observed_hours
+        FROM recent
+        GROUP BY product_id
+    )
+    SELECT p.id, p.target_price, CAST(strftime('%s', p.last_checked) AS INTEGER),
+           v.changes, v.observed_hours,
+           (SELECT MIN(price) FROM product_seller_prices s WHERE s.product_id = p.id)
+    FROM products p
+    LEFT JOIN volatility v ON v.product_id = p.id
+    WHERE p.is_active = TRUE {filter_products}
+'''
+
+
+def check_interval_hours(changes: Optional[int], observed_hours: Optional[float], current_price: Optional[float],
+                         target_price: Optional[float], settings: Dict, default_hours: float) -> float:
+    """Check interval for one product, within the configured bounds"""
+    if changes is None or not observed_hours or observed_hours < default_hours:
+        # Too little history (e.g. a new product) to tell how often its price changes
+        interval = default_hours
+    else:
+        # Add-one smoothing: no change in 30 days reads as one change per 30 days
+        observed_hours = min(observed_hours, settings['volatility_window_days'] * 24)
+        changes_per_hour = (changes + 1) / observed_hours
+        interval = settings['changes_per_check'] / changes_per_hour
+    interval = min(max(interval, settings['min_interval_hours']), settings['max_interval_hours'])
+
+    if target_price and current_price and settings['target_proximity_pct'] > 0:
+        distance_pct = (current_price - target_price) / target_price * 100
+        if distance_pct <= settings['target_proximity_pct']:
+            # Linearly down to a quarter of the interval at (or below) the target
+            interval *= 0.25 + 0.75 * max(distance_pct, 0) / settings['target_proximity_pct']
+
+    return max(interval, settings['min_interval_hours'])
+
+
+class ProductScheduler:
+    """Heap of (next due time, product id), with per-product intervals from price history"""
+
+    def __init__(self, db: Database, settings: Dict, default_hours: float):
+        self.db = db
+        self.settings = {**DEFAULT_SCHEDULING, **settings}
+        self.default_hours = default_hours
+        self.adaptive = self.settings['mode'] == 'adaptive'
+        self.jitter = self.settings['jitter_pct'] / 100 if self.settings['continuous'] else 0.0
+        self.heap = []
+        self.due_at: Dict[int, float] = {}
+        self.intervals: Dict[int, float] = {}
+        # Popped by pop_due and not rescheduled yet (their check is still running)
+        self.in_flight: Set[int] = set()
+
+    def _compute(self, product_ids: Optional[List[int]] = None) -> List[tuple]:
+        """(product_id, interval_hours, last_checked epoch) for active products"""
+        ids = list(product_ids) if product_ids is not None else []
+        placeholders = ','.join('?' * len(ids))
+        history_filter = f'AND product_id IN ({placeholders})' if product_ids is not None else ''
+        products_filter = f'AND p.id IN ({placeholders})' if product_ids is not None else ''
+
+        if not self.adaptive:
+            rows = self.db.query(f'''
+                SELECT p.id, CAST(strftime('%s', p.last_checked) AS INTEGER) FROM products p
+                WHERE p.is_active = TRUE {products_filter}
+            ''', ids)
+            return [(product_id, self.default_hours, last_checked) for product_id, last_checked in rows]
+
+        window = f"-{self.settings['volatility_window_days']} days"
+        rows = self.db.query(VOLATILITY_QUERY.format(filter=history_filter, filter_products=products_filter),
+                             [window] + ids + ids)
+        return [
+            (product_id, check_interval_hours(changes, observed_hours, current_price, target_price,
+                                              self.settings, self.default_hours), last_checked)
+            for product_id, target_price, last_checked, changes, observed_hours, current_price in rows
+        ]
+
+    def _push(self, product_id: int, due_at: float):
+        self.due_at[product_id] = due_at
+        heapq.heappush(self.heap, (due_at, product_id))
+
+    def load(self, spread: bool = False):
+        """
+        Schedule all active products, due one interval after their last
+        check. With spread, overdue products are spread over their interval
+        (most overdue first) instead of all being due at once.
+        """
+        self.heap = []
+        self.due_at = {}
+        self.intervals = {}
+        self.in_flight = set()
+        now = time.time()
+        overdue = []
+        for product_id, interval, last_checked in self._compute():
+            self.intervals[product_id] = interval
+            due_at = last_checked + interval * 3600 if last_checked else 0
+            if due_at <= now:
+                overdue.append((due_at, product_id))
+            else:
+                self._push(product_id, due_at)
+
+        overdue.sort()
+        for position, (_, product_id) in enumerate(overdue):
+            offset = position / len(overdue) * self.intervals[product_id] * 3600 if spread else 0
+            self._push(product_id, now + offset)
+        logger.info(f"Schedule loaded: {len(self.intervals)} products, {len(overdue)} overdue")
+
+    def sync(self):
+        """Add newly added products (due now) and forget deactivated ones"""
+        active = {row[0] for row in self.db.query('SELECT id FROM products WHERE is_active = TRUE')}
+        for product_id in set(self.due_at) - active:
+            del self.due_at[product_id]
+            self.intervals.pop(product_id, None)
+        # Products being checked are rescheduled when their check finishes
+        added = [product_id for product_id in active
+                 if product_id not in self.due_at and product_id not in self.in_flight]
+        if added:
+            self.reschedule(added, now_due=True)
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[int]:
+        """Remove and return products whose due time has passed, most overdue first"""
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now and (limit is None or len(due) < limit):
+            due_at, product_id = heapq.heappop(self.heap)
+            # Skip entries superseded by a later reschedule
+            if self.due_at.get(product_id) == due_at:
+                del self.due_at[product_id]
+                self.in_flight.add(product_id)
+                due.append(product_id)
+        return due
+
+    def intervals_for(self, product_ids: Iterable[int]) -> Dict[int, float]:
+        """Check interval in hours for each of the given active products"""
+        product_ids = list(product_ids)
+        intervals = {}
+        # Stay below SQLite's host parameter limit
+        for start in range(0, len(product_ids), 400):
+            for product_id, interval, _ in self._compute(product_ids[start:start + 400]):
+                intervals[product_id] = interval
+        return intervals
+
+    def next_delay(self, interval_hours: float) -> float:
+        """Seconds until the next check, jittered so products checked together drift apart"""
+        return interval_hours * 3600 * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def reschedule(self, product_ids: Iterable[int], now_due: bool = False):
+        """Recompute intervals after a check and schedule the next one"""
+        product_ids = list(product_ids)
+        self.in_flight.difference_update(product_ids)
+        now = time.time()
+        for product_id, interval in self.intervals_for(product_ids).items():
+            self.intervals[product_id] = interval
+            self._push(product_id, now if now_due else now + self.next_delay(interval))
+
+    def retry_later(self, product_ids: Iterable[int], delay_seconds: float):
+        """Schedule failed checks again after delay_seconds instead of a full interval"""
+        now = time.time()
+        for product_id in product_ids:
+            self.in_flight.discard(product_id)
+            self._push(product_id, now + delay_seconds)
+
+    def seconds_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """Time until the next product is due (None when nothing is scheduled)"""
+        now = time.time() if now is None else now
+        while self.heap and self.due_at.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - now, 0.0)
+
+    def summary(self) -> Dict:
+        """Interval distribution, to log how the request budget is spread"""
+        intervals = sorted(self.intervals.values())
+        if not intervals:
+            return {'products': 0}
+        return {
+            'products': len(intervals),
+            'min_hours': intervals[0],
+            'median_hours': intervals[len(intervals) // 2],
+            'max_hours': intervals[-1],
+            'checks_per_day': sum(24 / interval for interval in intervals)
+        }
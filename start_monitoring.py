@@ -32,7 +32,7 @@ def main():
     # List products
     print("Tracked products:")
     for i, product in enumerate(products[:5], 1):
-        print(f"  {i}. {product['title'][:50]}...")
+        print(f"  {i}. {(product['title'] or product['asin'])[:50]}...")
         if product['target_price']:
             print(f"     Target: ${product['target_price']}")
     
@@ -56,6 +56,8 @@ def main():
     except KeyboardInterrupt:
         print("\nMonitoring stopped")
         print("Goodbye!")
+    finally:
+        tracker.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Storage
+Long-lived SQLite connection in WAL mode with buffered price history writes.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = [
+    "PRAGMA auto_vacuum = INCREMENTAL",  # Only takes effect on new files (or after VACUUM)
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",     # Safe with WAL, avoids an fsync per commit
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",      # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+]
+
+
+class Database:
+    """One SQLite connection shared by the tracker and its worker threads"""
+
+    def __init__(self, path: str = 'price_tracker.db', batch_size: int = 1000, busy_timeout: float = 30.0,
+                 change_only: bool = False, metrics=NULL_METRICS):
+        self.path = path
+        self.metrics = metrics
+        self.batch_size = batch_size
+        # Only store a new price_history row when a seller's price or availability changes
+        self.change_only = change_only
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+
+        self.pending_history: List[Tuple] = []
+        self.pending_checked: List[Tuple] = []
+        self.batch_depth = 0
+        self.transaction_depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run statements (DDL included) in one transaction, rolled back on
+        error. Nested calls join the outer transaction.
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            outermost = self.transaction_depth == 0
+            if outermost:
+                # Take the write lock up front so concurrent writers wait instead of failing
+                cursor.execute('BEGIN IMMEDIATE')
+            self.transaction_depth += 1
+            try:
+                yield cursor
+                if outermost:
+                    self.conn.commit()
+            except Exception:
+                if outermost:
+                    self.conn.rollback()
+                raise
+            finally:
+                self.transaction_depth -= 1
+                cursor.close()
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Inside a transaction, roll back only the statements of this block
+        on error (the error is re-raised) and keep the rest of the transaction.
+        """
+        with self.lock:
+            if self.transaction_depth == 0:
+                raise RuntimeError("savepoint() needs an open transaction")
+            self.conn.execute('SAVEPOINT block')
+            try:
+                yield
+            except Exception:
+                self.conn.execute('ROLLBACK TO block')
+                raise
+            finally:
+                self.conn.execute('RELEASE block')
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        """Run a read query and return all rows"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[Tuple]:
+        """Run a read query and return the first row"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    @contextmanager
+    def batch(self):
+        """Buffer price history writes until the outermost batch ends"""
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.flush()
+
+    def record_prices(self, rows: Iterable[Tuple], product_id: Optional[int] = None):
+        """
+        Queue price_history rows (product_id, seller_name, price, availability)
+        and mark the product as checked. Written immediately outside a batch.
+        """
+        with self.lock:
+            self.pending_history.extend(rows)
+            if product_id is not None:
+                self.pending_checked.append((product_id,))
+            if self.batch_depth == 0 or len(self.pending_history) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Write buffered rows with executemany in one transaction"""
+        with self.lock:
+            if not self.pending_history and not self.pending_checked:
+                return
+            history = self.pending_history
+            checked = self.pending_checked
+            unchanged = []
+            nested = self.transaction_depth > 0
+            try:
+                with self.metrics.time('price_tracker_db_seconds', operation='flush'), self.transaction() as cursor:
+                    if self.change_only:
+                        history, unchanged = self._split_unchanged(cursor, history)
+                        self._touch_unchanged(cursor, unchanged)
+                    cursor.executemany('''
+                        INSERT INTO price_history (product_id, seller_name, price, availability, last_seen)
+                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ''', history)
+                    cursor.executemany('''
+                        UPDATE products SET last_checked = CURRENT_TIMESTAMP WHERE id = ?
+                    ''', checked)
+            except Exception as e:
+                if nested:
+                    # The rows belong to the caller's transaction, which rolls them back with the rest
+                    self.pending_history = []
+                    self.pending_checked = []
+                    raise
+                # The transaction was rolled back, keep the rows for the next flush
+                logger.warning(f"Could not write {len(self.pending_history)} buffered price records, keeping them: {e}")
+                raise
+            # Only drop the buffers once the transaction committed
+            self.pending_history = []
+            self.pending_checked = []
+            self.metrics.inc('price_tracker_db_rows_total', len(history), kind='inserted')
+            self.metrics.inc('price_tracker_db_rows_total', len(unchanged), kind='unchanged')
+            logger.debug(f"Flushed {len(history)} price records, {len(checked)} products")
+
+    def _split_unchanged(self, cursor, rows: List[Tuple]) -> Tuple[List[Tuple], List[Tuple]]:
+        """
+        Split rows into (rows to insert, (history_id, product_id, price) of
+        rows identical to the seller's latest stored observation)
+        """
+        changed = []
+        unchanged = []
+        batch_latest = {}
+
+        for row in rows:
+            product_id, seller_name, price, availability = row
+            key = (product_id, seller_name)
+            if key in batch_latest:
+                latest = batch_latest[key]
+            else:
+                cursor.execute('''
+                    SELECT h.id, h.price, h.availability
+                    FROM product_seller_prices s
+                    JOIN price_history h ON h.id = s.history_id
+                    WHERE s.product_id = ? AND s.seller_name = ?
+                ''', key)
+                latest = cursor.fetchone()
+
+            if latest is not None and latest[0] is not None and latest[1:] == (price, availability):
+                unchanged.append((latest[0], product_id, price))
+            else:
+                changed.append(row)
+                # The id is unknown until insert, later duplicates in this batch are inserted too
+                batch_latest[key] = (None, price, availability)
+
+        return changed, unchanged
+
+    def _touch_unchanged(self, cursor, unchanged: List[Tuple]):
+        """Extend the latest rows' last_seen and count the observations in the summary"""
+        cursor.executemany('''
+            UPDATE price_history SET last_seen = CURRENT_TIMESTAMP WHERE id = ?
+        ''', [(history_id,) for history_id, _, _ in unchanged])
+        cursor.executemany('''
+            UPDATE product_price_stats
+            SET price_count = price_count + 1, price_sum = price_sum + ?
+            WHERE product_id = ?
+        ''', [(price, product_id) for _, product_id, price in unchanged if price is not None])
+
+    def close(self):
+        """Flush pending rows and close the connection"""
+        with self.lock:
+            self.flush()
+            self.conn.close()
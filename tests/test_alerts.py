@@ -0,0 +1,263 @@
+import email
+import socketserver
+import threading
+import time
+
+import pytest
+
+from alerts import AlertDispatcher, AlertSuppressionIndex, SMTPSender
+from migrations import migrate
+from storage import Database
+
+
+class SMTPStandIn:
+    """Minimal local SMTP server recording (recipients, subject) of each message"""
+
+    def __init__(self, delay: float = 0.0, close_after_message: bool = False):
+        self.delay = delay
+        self.close_after_message = close_after_message
+        self.refusals = {}               # recipient -> RCPT commands still to refuse
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def refuse(self, recipient: str) -> bool:
+        with self.lock:
+            if self.refusals.get(recipient, 0) > 0:
+                self.refusals[recipient] -= 1
+                return True
+            return False
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                with stand_in.lock:
+                    stand_in.connections += 1
+                self.reply('220 stand-in ESMTP')
+                recipients = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode().strip()
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.reply('250 stand-in')
+                    elif verb == 'MAIL':
+                        recipients = []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        address = command.split(':', 1)[1].strip().strip('<>')
+                        if stand_in.refuse(address):
+                            self.reply('450 Mailbox busy')
+                        else:
+                            recipients.append(address)
+                            self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        while True:
+                            data = self.rfile.readline()
+                            if data in (b'.\r\n', b''):
+                                break
+                            lines.append(data)
+                        time.sleep(stand_in.delay)
+                        message = email.message_from_bytes(b''.join(lines))
+                        with stand_in.lock:
+                            stand_in.messages.append((recipients, message['Subject']))
+                        self.reply('250 OK')
+                        if stand_in.close_after_message:
+                            return
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('500 Unknown command')
+
+        return Handler
+
+    def start(self) -> int:
+        class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def smtp():
+    stand_in = SMTPStandIn()
+    stand_in.start()
+    yield stand_in
+    stand_in.stop()
+
+
+def render(changes):
+    return f"{len(changes)} changes", ''.join(f"<p>{change['current_price']}</p>" for change in changes)
+
+
+def change(product_id, price, seller='Amazon'):
+    return {'product_id': product_id, 'seller_name': seller, 'current_price': price}
+
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+        self.dropped = []
+
+    def on_sent(self, recipient, changes, subject):
+        self.sent.append((recipient, changes, subject))
+
+    def on_dropped(self, changes):
+        self.dropped.append(changes)
+
+
+def make_dispatcher(smtp, recipients, recorder, **kwargs):
+    sender = SMTPSender('127.0.0.1', smtp.server.server_address[1], security='none', timeout=5)
+    settings = {'digest_seconds': 0, 'max_attempts': 3, 'retry_seconds': 0.05, **kwargs}
+    return AlertDispatcher(sender, 'tracker@example.com', recipients, render,
+                           recorder.on_sent, recorder.on_dropped, **settings)
+
+
+def test_enqueue_does_not_wait_for_the_server(smtp):
+    smtp.delay = 0.5
+    dispatcher = make_dispatcher(smtp, ['a@example.com'], Recorder())
+    try:
+        started_at = time.monotonic()
+        dispatcher.enqueue([change(1, 10.0)])
+        assert time.monotonic() - started_at < 0.1
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+    assert smtp.messages == [(['a@example.com'], '1 changes')]
+
+
+def test_changes_are_coalesced_into_one_digest_per_recipient(smtp):
+    recorder = Recorder()
+    dispatcher = make_dispatcher(smtp, ['a@example.com', 'b@example.com'], recorder, digest_seconds=0.3)
+    try:
+        dispatcher.enqueue([change(1, 10.0)])
+        dispatcher.enqueue([change(2, 20.0)])
+        # A newer change for the same product and seller replaces the queued one
+        dispatcher.enqueue([change(1, 9.0)])
+        assert smtp.messages == []
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+
+    assert sorted(smtp.messages) == [(['a@example.com'], '2 changes'), (['b@example.com'], '2 changes')]
+    assert smtp.connections == 1
+    for _, changes, _ in recorder.sent:
+        assert sorted((c['product_id'], c['current_price']) for c in changes) == [(1, 9.0), (2, 20.0)]
+
+
+def test_failed_digest_is_retried(smtp):
+    smtp.refusals['a@example.com'] = 2
+    recorder = Recorder()
+    dispatcher = make_dispatcher(smtp, ['a@example.com'], recorder)
+    try:
+        dispatcher.enqueue([change(1, 10.0)])
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+    assert smtp.messages == [(['a@example.com'], '1 changes')]
+    assert len(recorder.sent) == 1
+    assert recorder.dropped == []
+
+
+def test_digest_is_dropped_after_max_attempts(smtp):
+    smtp.refusals['a@example.com'] = 10
+    recorder = Recorder()
+    dispatcher = make_dispatcher(smtp, ['a@example.com'], recorder, max_attempts=2)
+    try:
+        dispatcher.enqueue([change(1, 10.0)])
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+    assert smtp.messages == []
+    assert smtp.refusals['a@example.com'] == 8
+    assert [[c['product_id'] for c in changes] for changes in recorder.dropped] == [[1]]
+
+
+def test_sender_reconnects_when_the_server_drops_the_connection(smtp):
+    smtp.close_after_message = True
+    dispatcher = make_dispatcher(smtp, ['a@example.com'], Recorder())
+    try:
+        dispatcher.enqueue([change(1, 10.0)])
+        assert dispatcher.flush(5)
+        dispatcher.enqueue([change(2, 20.0)])
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+    assert len(smtp.messages) == 2
+    assert smtp.connections == 2
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'tracker.db')
+    db = Database(path)
+    migrate(db)
+    db.close()
+    return path
+
+
+@pytest.fixture
+def index(db_path):
+    db = Database(db_path)
+    yield AlertSuppressionIndex(db, cooldown_hours=24, bucket_pct=1.0)
+    db.close()
+
+
+def test_neighbouring_price_buckets_are_suppressed(index):
+    assert index.filter([change(1, 100.0)]) == [change(1, 100.0)]
+    # In the alerted price's bucket or a neighbouring one: the same drop
+    assert index.filter([change(1, 100.4), change(1, 99.2), change(1, 100.9)]) == []
+    fresh = [change(1, 90.0), change(1, 100.0, seller='Other'), change(2, 100.0)]
+    assert index.filter(fresh) == fresh
+
+
+def test_suppression_survives_a_restart(db_path, index):
+    index.filter([change(1, 100.0), change(2, 50.0)])
+    with index.db.transaction() as cursor:
+        # Product 2 was alerted longer ago than the cooldown
+        cursor.execute('UPDATE alert_suppression SET alerted_at = alerted_at - 25 * 3600 WHERE product_id = 2')
+
+    db = Database(db_path)
+    try:
+        restarted = AlertSuppressionIndex(db, cooldown_hours=24, bucket_pct=1.0)
+        assert restarted.filter([change(1, 100.0), change(2, 50.0)]) == [change(2, 50.0)]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize('refused, suppressed', [(['a@example.com'], True),
+                                                 (['a@example.com', 'b@example.com'], False)])
+def test_only_alerts_no_recipient_received_are_unsuppressed(smtp, index, refused, suppressed):
+    for recipient in refused:
+        smtp.refusals[recipient] = 10
+    recorder = Recorder()
+    dispatcher = make_dispatcher(smtp, ['a@example.com', 'b@example.com'], recorder, max_attempts=1)
+    try:
+        dispatcher.enqueue(index.filter([change(1, 100.0)]))
+        assert dispatcher.flush(5)
+    finally:
+        dispatcher.close()
+    for changes in recorder.dropped:
+        index.forget(changes)
+
+    assert (index.filter([change(1, 100.0)]) == []) == suppressed
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from benchmark import BenchmarkServer, synthetic_page
+
+pytest.importorskip('aiohttp')
+
+
+@pytest.fixture
+def server():
+    server = BenchmarkServer([synthetic_page(2)], latency_ms=0, jitter_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_tracker(tmp_path, **sections):
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({
+        "tracking": {"requests_per_second_per_host": 100000, "max_retries": 0, "fetch_mode": "async"},
+        "database": {"path": str(tmp_path / 'tracker.db')},
+        "cache": {"enabled": False},
+        "retention": {"enabled": False},
+        **sections
+    }))
+    return AmazonPriceTracker(str(config_file))
+
+
+def test_price_only_mode_between_full_pages(tmp_path, server, monkeypatch):
+    tracker = make_tracker(tmp_path, price_only={"enabled": True})
+    partial_results = []
+    get_price_only_info = tracker._get_price_only_info
+
+    def spy(url, asin):
+        partial_results.append(get_price_only_info(url, asin))
+        return partial_results[-1]
+
+    monkeypatch.setattr(tracker, '_get_price_only_info', spy)
+    url = server.url_for('B000000001')
+    try:
+        [full] = asyncio.run(tracker._fetch_products_async([url]))
+        assert partial_results == [None]
+        assert 'B000000001' in tracker.full_pages
+
+        [partial] = asyncio.run(tracker._fetch_products_async([url]))
+    finally:
+        tracker.close()
+
+    assert partial_results[-1] is partial
+    assert partial['title'] == full['title'] == 'Synthetic product 2'
+    assert partial['sellers'] == full['sellers']
+
+
+def test_broken_parse_pool_falls_back_to_in_process_parsing(tmp_path, server):
+    tracker = make_tracker(tmp_path, tracking={
+        "requests_per_second_per_host": 100000, "max_retries": 0, "fetch_mode": "async", "parse_processes": 1
+    })
+    try:
+        tracker.start_parse_pool()
+        parse_pool = tracker.parse_pool
+        for process in list(parse_pool.executor._processes.values()):
+            process.kill()
+            process.join()
+
+        results = asyncio.run(tracker._fetch_products_async([server.url_for('B000000001'), server.url_for('B000000002')]))
+    finally:
+        parse_pool.close()
+        tracker.close()
+
+    assert [product_info['title'] for product_info in results] == ['Synthetic product 2'] * 2
+    assert tracker.parse_pool is None
@@ -0,0 +1,173 @@
+"""Block page detection, the circuit breaker and re-queueing, against the benchmark stand-in server"""
+
+import json
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from benchmark import CAPTCHA_PAGE, BenchmarkServer, synthetic_page
+from page_parser import classify_block
+from rate_limiting import BlockedError, CircuitBreaker, CircuitOpenError
+
+EMPTY_PAGE = b'<html><head><title>Amazon.com</title></head><body><p>Something went wrong</p></body></html>'
+URL = 'https://www.amazon.com/dp/B000000001'
+
+
+@pytest.fixture
+def server():
+    server = BenchmarkServer([synthetic_page(1)], latency_ms=0, jitter_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_tracker(tmp_path, fetch_mode='threads') -> AmazonPriceTracker:
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({
+        "tracking": {"requests_per_second_per_host": 100000, "max_retries": 0, "fetch_mode": fetch_mode},
+        "blocking": {"backoff_seconds": 0.05, "jitter_pct": 0, "max_wait_seconds": 5, "requeue_rounds": 1},
+        "database": {"path": str(tmp_path / 'tracker.db')},
+        "cache": {"enabled": True, "directory": str(tmp_path / 'page_cache')},
+        "retention": {"enabled": False}
+    }))
+    return AmazonPriceTracker(str(config_file))
+
+
+def circuit_open(tracker, url) -> bool:
+    return tracker.circuit_breaker.status()[urlparse(url).netloc]['open']
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = make_tracker(tmp_path)
+    yield tracker
+    tracker.close()
+
+
+def fetch_modes():
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return ['threads']
+    return ['threads', 'async']
+
+
+def test_classify_block():
+    assert classify_block(200, CAPTCHA_PAGE) == 'captcha'
+    assert classify_block(429, b'Too Many Requests') == 'throttled'
+    assert classify_block(503, b'Service Unavailable') == 'throttled'
+    assert classify_block(200, synthetic_page(1)) is None
+    assert classify_block(404, b'Not Found') is None
+    # Product pages are large; a marker far into one is not a robot check
+    assert classify_block(200, b'x' * 70000 + CAPTCHA_PAGE) is None
+
+
+def test_captcha_page_opens_circuit(server, tracker):
+    server.captcha_rate = 1.0
+    url = server.url_for('B000000001')
+    with pytest.raises(BlockedError) as error:
+        tracker.get_product_info(url)
+    assert error.value.reason == 'captcha'
+    assert circuit_open(tracker, url)
+
+
+def test_throttled_response_opens_circuit(server, tracker):
+    server.error_rate = 1.0
+    url = server.url_for('B000000001')
+    with pytest.raises(BlockedError) as error:
+        tracker.get_product_info(url)
+    assert error.value.reason == 'throttled'
+    assert circuit_open(tracker, url)
+
+
+def test_empty_page_is_a_block_and_not_cached(server, tracker):
+    server.pages = [EMPTY_PAGE]
+    url = server.url_for('B000000001')
+    with pytest.raises(BlockedError) as error:
+        tracker.get_product_info(url)
+    assert error.value.reason == 'empty'
+    assert tracker.page_cache.get(tracker.cache_key(url, 'B000000001')) is None
+
+
+def test_circuit_open_probe_close():
+    breaker = CircuitBreaker(backoff_seconds=0.05, jitter_pct=0)
+    assert breaker.try_acquire(URL) == 0
+
+    breaker.record_block(URL, 'captcha')
+    assert breaker.status()['www.amazon.com']['open']
+    assert breaker.try_acquire(URL) > 0
+
+    time.sleep(0.06)
+    # One probe goes out, the others wait for its outcome
+    assert breaker.try_acquire(URL) == 0
+    assert breaker.try_acquire(URL) > 0
+
+    breaker.record_success(URL)
+    assert not breaker.status()['www.amazon.com']['open']
+    assert breaker.try_acquire(URL) == 0
+    assert breaker.status()['www.amazon.com']['consecutive_blocks'] == 0
+
+
+def test_blocked_probe_doubles_backoff():
+    breaker = CircuitBreaker(backoff_seconds=0.05, jitter_pct=0)
+    breaker.record_block(URL, 'captcha')
+    time.sleep(0.06)
+    assert breaker.try_acquire(URL) == 0
+    breaker.record_block(URL, 'captcha')
+    assert breaker.try_acquire(URL) == pytest.approx(0.1, abs=0.02)
+    assert breaker.status()['www.amazon.com']['consecutive_blocks'] == 2
+
+
+def test_acquire_gives_up_after_max_wait():
+    breaker = CircuitBreaker(backoff_seconds=10, jitter_pct=0, max_wait_seconds=1)
+    breaker.record_block(URL, 'throttled')
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire(URL)
+
+
+def recover_after_first_round(monkeypatch, tracker, recover):
+    check_products = tracker._check_products
+
+    def check_then_recover(products, max_workers):
+        result = check_products(products, max_workers)
+        recover()
+        return result
+
+    monkeypatch.setattr(tracker, '_check_products', check_then_recover)
+
+
+@pytest.mark.parametrize('fetch_mode', fetch_modes())
+def test_blocked_products_are_requeued(server, tmp_path, monkeypatch, fetch_mode):
+    tracker = make_tracker(tmp_path, fetch_mode)
+    try:
+        tracker.upsert_products([{'asin': f'B00000000{i}', 'url': server.url_for(f'B00000000{i}')} for i in range(4)])
+        server.captcha_rate = 1.0
+        recover_after_first_round(monkeypatch, tracker, lambda: setattr(server, 'captcha_rate', 0.0))
+
+        stats = tracker.monitor_all_products()
+
+        assert stats['failed'] == 0
+        assert server.take_responses() == {'ok': 4, 'error': 0, 'captcha': 4}
+        assert tracker.db.query_one('SELECT COUNT(DISTINCT product_id) FROM price_history')[0] == 4
+    finally:
+        tracker.close()
+
+
+@pytest.mark.parametrize('fetch_mode', fetch_modes())
+def test_requeued_empty_page_reaches_the_host(server, tmp_path, monkeypatch, fetch_mode):
+    tracker = make_tracker(tmp_path, fetch_mode)
+    try:
+        tracker.upsert_products([{'asin': 'B000000001', 'url': server.url_for('B000000001')}])
+        server.pages = [EMPTY_PAGE]
+        recover_after_first_round(monkeypatch, tracker, lambda: setattr(server, 'pages', [synthetic_page(1)]))
+
+        stats = tracker.monitor_all_products()
+
+        # The retry is sent to the server instead of reading the block page back from the cache
+        assert stats['failed'] == 0
+        assert server.take_responses()['ok'] == 2
+        assert tracker.circuit_breaker.status()[f"127.0.0.1:{server.httpd.server_address[1]}"]['consecutive_blocks'] == 0
+    finally:
+        tracker.close()
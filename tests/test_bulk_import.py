@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from benchmark import BenchmarkServer, synthetic_page
+from bulk_import import import_files
+
+
+@pytest.fixture
+def server():
+    server = BenchmarkServer([synthetic_page(1)], latency_ms=0, jitter_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({
+        "tracking": {"requests_per_second_per_host": 100000, "max_retries": 0},
+        "database": {"path": str(tmp_path / 'tracker.db')},
+        "cache": {"enabled": False},
+        "retention": {"enabled": False}
+    }))
+    tracker = AmazonPriceTracker(str(config_file))
+    yield tracker
+    tracker.close()
+
+
+def test_first_check_fills_the_title_of_imported_products(tmp_path, server, tracker):
+    import_file = tmp_path / 'products.txt'
+    import_file.write_text(f"{server.url_for('B000000001')} 15\n")
+    import_files(tracker, [str(import_file)], backfill=False)
+    product_id, title = tracker.db.query_one('SELECT id, title FROM products')
+    assert title is None
+
+    changes = tracker.check_price_changes(product_id, raise_errors=True)
+
+    assert changes and all(change['product_title'] == 'Synthetic product 1' for change in changes)
+    assert tracker.db.query_one('SELECT title FROM products WHERE id = ?', (product_id,))[0] == 'Synthetic product 1'
@@ -0,0 +1,141 @@
+import json
+import sqlite3
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from migrations import MIGRATIONS, _create_base_tables, _create_version_tables, current_version, migrate, run_backfills
+from storage import Database
+
+
+def migrate_to(db, version):
+    """Apply the migrations up to version, like an older release did"""
+    with db.transaction() as cursor:
+        _create_version_tables(cursor)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                migration.upgrade(cursor)
+                cursor.execute('INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                               (migration.version, migration.description))
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'tracker.db'))
+    yield db
+    db.close()
+
+
+def test_duplicate_asins_merge_into_one_product(db):
+    migrate_to(db, 5)
+    with db.transaction() as cursor:
+        cursor.executemany('INSERT INTO products (url, title, asin, target_price) VALUES (?, ?, ?, ?)', [
+            ('https://www.amazon.com/dp/B000000001', 'Kettle', 'B000000001', 30.0),
+            ('https://www.amazon.com/gp/product/B000000001', 'Electric kettle', 'B000000001', None),
+            ('https://www.amazon.com/dp/B000000001?ref=x', None, 'B000000001', None),
+            ('https://www.amazon.com/dp/B000000002', 'Toaster', 'B000000002', None),
+        ])
+        cursor.executemany('INSERT INTO price_history (product_id, seller_name, price, availability) VALUES (?, ?, ?, ?)', [
+            (1, 'Amazon', 40.0, 'In Stock'),
+            (2, 'Amazon', 35.0, 'In Stock'),
+            (3, 'Other', 33.0, 'In Stock'),
+            (4, 'Amazon', 20.0, 'In Stock'),
+        ])
+
+    assert migrate(db) == MIGRATIONS[-1].version
+
+    products = db.query('SELECT id, title, target_price FROM products ORDER BY id')
+    assert products == [(3, 'Electric kettle', 30.0), (4, 'Toaster', None)]
+    history = db.query('SELECT product_id, price FROM price_history ORDER BY price DESC')
+    assert history == [(3, 40.0), (3, 35.0), (3, 33.0), (4, 20.0)]
+    assert db.query_one('SELECT min_price, max_price, price_count FROM product_price_stats WHERE product_id = 3') == \
+        (33.0, 40.0, 3)
+
+
+def test_upsert_keeps_stored_title_and_target(tmp_path):
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({
+        "database": {"path": str(tmp_path / 'tracker.db')},
+        "cache": {"enabled": False},
+        "retention": {"enabled": False}
+    }))
+    tracker = AmazonPriceTracker(str(config_file))
+    try:
+        first = tracker.upsert_products([{'asin': 'B000000001', 'url': 'https://www.amazon.com/dp/B000000001',
+                                          'title': 'Kettle', 'target_price': 30.0}])
+        again = tracker.upsert_products([{'asin': 'B000000001', 'url': 'https://www.amazon.com/gp/product/B000000001'}])
+        assert again == first
+        assert tracker.db.query('SELECT url, title, target_price FROM products') == \
+            [('https://www.amazon.com/gp/product/B000000001', 'Kettle', 30.0)]
+    finally:
+        tracker.close()
+
+
+def make_baseline_db(path):
+    """Database as created before schema versioning, with some price history"""
+    conn = sqlite3.connect(path)
+    _create_base_tables(conn.cursor())
+    conn.executemany('INSERT INTO products (url, title, asin) VALUES (?, ?, ?)', [
+        (f'https://www.amazon.com/dp/B00000000{i}', f'Product {i}', f'B00000000{i}') for i in (1, 2)
+    ])
+    conn.executemany('INSERT INTO price_history (product_id, seller_name, price, availability) VALUES (?, ?, ?, ?)', [
+        (1 + i % 2, 'Amazon' if i % 3 else 'Other', 10.0 + i, 'In Stock') for i in range(25)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def expected_stats(db):
+    return db.query('''
+        SELECT product_id, MIN(price), MAX(price), SUM(price), COUNT(price) FROM price_history
+        GROUP BY product_id ORDER BY product_id
+    ''')
+
+
+def test_baseline_database_migrates_to_the_latest_version(tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    make_baseline_db(path)
+    db = Database(path)
+    try:
+        assert current_version(db) == 0
+        assert migrate(db) == MIGRATIONS[-1].version
+        assert migrate(db) == MIGRATIONS[-1].version
+        assert [row[0] for row in db.query('SELECT version FROM schema_migrations ORDER BY version')] == \
+            [migration.version for migration in MIGRATIONS]
+        assert run_backfills(db, chunk_size=10)
+
+        assert db.query('SELECT * FROM product_price_stats ORDER BY product_id') == expected_stats(db)
+        # The latest row per seller, with its id
+        assert db.query('''
+            SELECT product_id, seller_name, price, history_id FROM product_seller_prices ORDER BY product_id, seller_name
+        ''') == db.query('''
+            SELECT product_id, seller_name, price, id FROM price_history
+            WHERE id IN (SELECT MAX(id) FROM price_history GROUP BY product_id, seller_name)
+            ORDER BY product_id, seller_name
+        ''')
+    finally:
+        db.close()
+
+
+def test_interrupted_backfill_resumes_where_it_stopped(tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    make_baseline_db(path)
+    db = Database(path)
+    migrate(db)
+    # No time budget left after the first chunk
+    assert not run_backfills(db, chunk_size=10, time_budget=0)
+    assert db.query('SELECT name, last_id, end_id FROM schema_backfills ORDER BY name') == \
+        [('price_stats', 10, 25), ('seller_history_ids', 0, 25)]
+    db.close()
+
+    db = Database(path)
+    try:
+        # Rows written after the upgrade are counted by the trigger, not the backfill
+        db.record_prices([(1, 'Amazon', 5.0, 'In Stock')], 1)
+        assert run_backfills(db, chunk_size=10)
+        assert db.query('SELECT last_id FROM schema_backfills') == [(25,), (25,)]
+        assert db.query('SELECT * FROM product_price_stats ORDER BY product_id') == expected_stats(db)
+        assert db.query_one("SELECT history_id FROM product_seller_prices WHERE product_id = 1 AND seller_name = 'Amazon'") == \
+            (26,)
+    finally:
+        db.close()
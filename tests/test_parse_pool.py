@@ -0,0 +1,23 @@
+import logging
+
+from benchmark import synthetic_page
+from parse_pool import ParsePool
+
+
+def root_handlers():
+    return [type(handler).__name__ for handler in logging.getLogger().handlers]
+
+
+def test_workers_do_not_write_the_log_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pool = ParsePool(2)
+    try:
+        pool.warm_up()
+        product_info = pool.parse(synthetic_page(1), 'https://www.amazon.com/dp/B000000001', 'B000000001')
+        handlers = [pool.executor.submit(root_handlers).result() for _ in range(4)]
+    finally:
+        pool.close()
+
+    assert product_info['title'] == 'Synthetic product 1'
+    assert all(names == ['StreamHandler'] for names in handlers)
+    assert not (tmp_path / 'price_tracker.log').exists()
@@ -0,0 +1,72 @@
+import pytest
+
+from migrations import migrate
+from retention import apply_retention
+from storage import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'tracker.db'))
+    migrate(db)
+    with db.transaction() as cursor:
+        cursor.execute("INSERT INTO products (url, title, asin) VALUES ('https://www.amazon.com/dp/B000000001', 'Kettle', 'B000000001')")
+    yield db
+    db.close()
+
+
+def add_history(db, rows):
+    """rows of (seller_name, price, days_ago, time of day, last seen days ago)"""
+    with db.transaction() as cursor:
+        cursor.executemany('''
+            INSERT INTO price_history (product_id, seller_name, price, availability, timestamp, last_seen)
+            VALUES (1, ?, ?, 'In Stock', datetime(date('now', ?), ?), datetime(date('now', ?), ?))
+        ''', [(seller, price, f'-{days} days', time_of_day, f'-{seen_days} days', time_of_day)
+              for seller, price, days, time_of_day, seen_days in rows])
+
+
+def rollups(db, resolution):
+    return db.query('''
+        SELECT seller_name, open, high, low, close, sample_count, price_sum FROM price_history_rollup
+        WHERE resolution = ? ORDER BY bucket_start, seller_name
+    ''', (resolution,))
+
+
+def test_old_rows_are_downsampled_into_hourly_ohlc_buckets(db):
+    add_history(db, [
+        ('Amazon', 10.0, 40, '+10 hours', 40),
+        ('Amazon', 8.0, 40, '+10 hours', 40),
+        ('Amazon', 12.0, 40, '+10 hours', 40),
+        ('Amazon', 11.0, 40, '+11 hours', 40),
+        ('Other', 15.0, 40, '+10 hours', 40),
+        # Recent, and old but still observed recently (change-only storage): both kept
+        ('Amazon', 9.0, 2, '+10 hours', 2),
+        ('Amazon', 13.0, 60, '+10 hours', 1),
+    ])
+
+    result = apply_retention(db, {'raw_days': 30, 'hourly_days': 180})
+
+    assert result['raw_rows_downsampled'] == 5
+    assert rollups(db, 'hour') == [
+        ('Amazon', 10.0, 12.0, 8.0, 12.0, 3, 30.0),
+        ('Other', 15.0, 15.0, 15.0, 15.0, 1, 15.0),
+        ('Amazon', 11.0, 11.0, 11.0, 11.0, 1, 11.0),
+    ]
+    assert sorted(row[0] for row in db.query('SELECT price FROM price_history')) == [9.0, 13.0]
+
+
+def test_old_hourly_buckets_are_merged_into_days(db):
+    add_history(db, [
+        ('Amazon', 10.0, 200, '+09 hours', 200),
+        ('Amazon', 7.0, 200, '+09 hours', 200),
+        ('Amazon', 12.0, 200, '+15 hours', 200),
+        ('Amazon', 11.0, 200, '+20 hours', 200),
+    ])
+
+    result = apply_retention(db, {'raw_days': 30, 'hourly_days': 180})
+
+    assert (result['raw_rows_downsampled'], result['hourly_buckets_downsampled']) == (4, 3)
+    assert rollups(db, 'hour') == []
+    assert rollups(db, 'day') == [('Amazon', 10.0, 12.0, 7.0, 11.0, 4, 40.0)]
+    # Running again finds nothing left to do
+    assert apply_retention(db, {'raw_days': 30, 'hourly_days': 180})['raw_rows_downsampled'] == 0
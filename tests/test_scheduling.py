@@ -0,0 +1,23 @@
+import pytest
+
+from scheduling import DEFAULT_SCHEDULING, check_interval_hours
+
+SETTINGS = dict(DEFAULT_SCHEDULING, mode='adaptive')
+
+
+@pytest.mark.parametrize('changes, observed_hours', [(None, None), (0, 0.0), (0, 0.2), (1, 3.0)])
+def test_new_products_use_the_default_interval(changes, observed_hours):
+    assert check_interval_hours(changes, observed_hours, None, None, SETTINGS, 6) == 6
+
+
+def test_interval_follows_price_changes_once_observed_long_enough():
+    # Two changes a day: one change every two checks means a check every 6 hours
+    assert check_interval_hours(19, 240, None, None, SETTINGS, 6) == pytest.approx(6)
+    assert check_interval_hours(0, 30 * 24, None, None, SETTINGS, 6) == SETTINGS['max_interval_hours']
+    assert check_interval_hours(100, 24, None, None, SETTINGS, 6) == SETTINGS['min_interval_hours']
+
+
+def test_near_target_checks_more_often():
+    assert check_interval_hours(None, None, 100.0, 100.0, SETTINGS, 8) == 2
+    assert check_interval_hours(None, None, 105.0, 100.0, SETTINGS, 8) == pytest.approx(5)
+    assert check_interval_hours(None, None, 120.0, 100.0, SETTINGS, 8) == 8
@@ -0,0 +1,153 @@
+"""Session health, eviction and renewal, and per-route circuits"""
+
+import json
+import time
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from benchmark import BenchmarkServer, synthetic_page
+from rate_limiting import BlockedError, CircuitBreaker
+from session_pool import SessionPool
+
+EMPTY_PAGE = b'<html><head><title>Amazon.com</title></head><body><p>Something went wrong</p></body></html>'
+URL = 'https://www.amazon.com/dp/B000000001'
+
+
+class FakeSession:
+    def __init__(self, proxy, user_agent):
+        self.proxy = proxy
+        self.headers = {'User-Agent': user_agent}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(size=1, **kwargs):
+    settings = {'min_spacing_seconds': 0, 'evict_after_blocks': 2, 'min_health': 0.3, 'eviction_minutes': 30,
+                **kwargs}
+    return SessionPool(FakeSession, ['agent'], size=size, **settings)
+
+
+def test_health_is_an_ewma_of_request_outcomes():
+    pool = make_pool(evict_after_blocks=10, min_health=0.0)
+    pooled = pool.acquire(URL)
+    for outcome in ('error', 'blocked', 'ok'):
+        pool.release(pooled, outcome)
+    # 1.0 -> 0.9 (error) -> 0.72 (blocked) -> 0.776 (ok)
+    assert pooled.health == pytest.approx(0.776)
+    assert pooled.blocks == 0
+    # No request sent: frees the slot without a score
+    pool.release(pool.acquire(URL), None)
+    assert pooled.health == pytest.approx(0.776)
+    assert pooled.in_flight == 0
+
+
+def test_blocked_session_is_evicted_and_the_others_take_over():
+    pool = make_pool(size=2)
+    blocked = pool.acquire(URL)
+    pool.release(blocked, 'blocked')
+    pool.record_block(blocked)
+    assert blocked.evicted_until > time.monotonic()
+
+    for _ in range(3):
+        pooled = pool.acquire(URL)
+        assert pooled is not blocked
+        pool.release(pooled, 'ok')
+
+    pool.release(pooled, 'blocked')
+    pool.release(pooled, 'blocked')
+    with pytest.raises(BlockedError):
+        pool.try_acquire(URL)
+
+
+def test_low_health_evicts_without_consecutive_blocks():
+    pool = make_pool(evict_after_blocks=10, min_health=0.5)
+    pooled = pool.acquire(URL)
+    for outcome in ('blocked', 'blocked', 'ok', 'blocked'):
+        pool.release(pooled, outcome)
+        assert not pooled.evicted_until
+    pool.release(pooled, 'blocked')
+    assert pooled.evicted_until and pooled.blocks == 2
+
+
+def test_evicted_session_comes_back_renewed():
+    pool = make_pool(eviction_minutes=0.05 / 60)
+    pooled = pool.acquire(URL)
+    old_session = pooled.session
+    pool.release(pooled, 'blocked')
+    pool.release(pooled, 'blocked')
+    with pytest.raises(BlockedError):
+        pool.try_acquire(URL)
+
+    time.sleep(0.06)
+    assert pool.acquire(URL) is pooled
+    assert old_session.closed and pooled.session is not old_session
+    assert (pooled.generation, pooled.health, pooled.blocks, pooled.evicted_until) == (1, 1.0, 0, 0.0)
+
+
+def test_sessions_with_an_open_circuit_are_avoided():
+    pool = SessionPool(FakeSession, ['agent'], proxies=['http://u:p@10.0.0.1:3128', 'http://10.0.0.2:3128'],
+                       min_spacing_seconds=0)
+    breaker = CircuitBreaker(backoff_seconds=10, jitter_pct=0)
+    breaker.record_block(URL, 'captcha', route='10.0.0.1:3128')
+    for _ in range(3):
+        pooled = pool.acquire(URL, lambda pooled: not breaker.is_open(URL, pooled.route))
+        assert pooled.route == '10.0.0.2:3128'
+        pool.release(pooled, 'ok')
+
+
+def test_circuits_are_per_route():
+    breaker = CircuitBreaker(backoff_seconds=10, jitter_pct=0)
+    breaker.record_block(URL, 'captcha', route='proxy-1')
+    assert breaker.is_open(URL, 'proxy-1')
+    assert not breaker.is_open(URL)
+    assert not breaker.is_open(URL, 'proxy-2')
+
+
+@pytest.fixture
+def server():
+    server = BenchmarkServer([synthetic_page(1)], latency_ms=0, jitter_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps({
+        "tracking": {"requests_per_second_per_host": 100000, "max_retries": 0},
+        "blocking": {"backoff_seconds": 0.05, "jitter_pct": 0, "max_wait_seconds": 5},
+        "sessions": {"enabled": True, "size": 2, "min_spacing_seconds": 0, "evict_after_blocks": 5},
+        "database": {"path": str(tmp_path / 'tracker.db')},
+        "cache": {"enabled": True, "directory": str(tmp_path / 'page_cache')},
+        "retention": {"enabled": False}
+    }))
+    tracker = AmazonPriceTracker(str(config_file))
+    yield tracker
+    tracker.close()
+
+
+def test_empty_page_is_charged_to_the_session_that_fetched_it(server, tracker):
+    server.pages = [EMPTY_PAGE]
+    with pytest.raises(BlockedError):
+        tracker.get_product_info(server.url_for('B000000001'))
+
+    [fetched] = [pooled for pooled in tracker.sessions.sessions if pooled.requests]
+    [idle] = [pooled for pooled in tracker.sessions.sessions if not pooled.requests]
+    assert fetched.blocks == 1 and fetched.health < 1.0
+    assert idle.blocks == 0 and idle.health == 1.0
+
+
+def test_empty_page_from_the_cache_charges_no_session(server, tracker):
+    url = server.url_for('B000000001')
+    key = tracker.cache_key(url, 'B000000001')
+    tracker.page_cache.put(key, EMPTY_PAGE, None, None)
+
+    with pytest.raises(BlockedError):
+        tracker.get_product_info(url)
+
+    assert all((pooled.requests, pooled.blocks, pooled.health) == (0, 0, 1.0) for pooled in tracker.sessions.sessions)
+    assert tracker.page_cache.get(key) is None
@@ -0,0 +1,79 @@
+import pytest
+
+from migrations import migrate
+from scheduling import VOLATILITY_QUERY
+from storage import Database
+
+# Observations of four checks: (product_id, seller_name, price, availability)
+CHECKS = [
+    [(1, 'Amazon', 10.0, 'In Stock'), (1, 'Other', 12.0, 'In Stock'), (2, 'Amazon', 5.0, 'In Stock')],
+    [(1, 'Amazon', 10.0, 'In Stock'), (1, 'Other', 12.0, 'In Stock'), (2, 'Amazon', 5.0, 'In Stock')],
+    [(1, 'Amazon', 9.0, 'In Stock'), (1, 'Other', 12.0, 'Out of Stock'), (2, 'Amazon', 5.0, 'In Stock')],
+    [(1, 'Amazon', 9.0, 'In Stock'), (1, 'Amazon', 9.0, 'In Stock'), (2, 'Amazon', 6.0, 'In Stock')],
+]
+
+
+def make_db(path, change_only):
+    db = Database(path, change_only=change_only)
+    migrate(db)
+    with db.transaction() as cursor:
+        cursor.executemany('INSERT INTO products (url, title, asin) VALUES (?, ?, ?)', [
+            (f'https://www.amazon.com/dp/B00000000{i}', f'Product {i}', f'B00000000{i}') for i in (1, 2)
+        ])
+    return db
+
+
+def record_checks(db):
+    for number, rows in enumerate(CHECKS):
+        if number % 2:
+            # Monitoring passes buffer the writes
+            with db.batch():
+                db.record_prices(rows)
+        else:
+            db.record_prices(rows)
+
+
+def answers(db):
+    """What the tracker reads back from history"""
+    return {
+        'min_7_days': [db.query_one('''
+            SELECT MIN(price) FROM price_history
+            WHERE product_id = ? AND COALESCE(last_seen, timestamp) > datetime('now', '-7 days')
+        ''', (product_id,))[0] for product_id in (1, 2)],
+        'stats': db.query('SELECT * FROM product_price_stats ORDER BY product_id'),
+        'sellers': db.query('''
+            SELECT s.product_id, s.seller_name, s.price, s.availability, h.price, h.availability
+            FROM product_seller_prices s JOIN price_history h ON h.id = s.history_id
+            ORDER BY s.product_id, s.seller_name
+        '''),
+        'price_changes': [row[:1] + row[3:4] for row in db.query(
+            VOLATILITY_QUERY.format(filter='', filter_products='') + ' ORDER BY p.id', ['-30 days'])],
+    }
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    full = make_db(str(tmp_path / 'full.db'), change_only=False)
+    change_only = make_db(str(tmp_path / 'change_only.db'), change_only=True)
+    record_checks(full)
+    record_checks(change_only)
+    yield full, change_only
+    full.close()
+    change_only.close()
+
+
+def test_change_only_storage_gives_the_same_answers(dbs):
+    full, change_only = dbs
+    assert answers(change_only) == answers(full)
+    assert answers(full)['stats'] == [(1, 9.0, 12.0, 83.0, 8), (2, 5.0, 6.0, 21.0, 4)]
+
+
+def test_change_only_storage_skips_unchanged_observations(dbs):
+    full, change_only = dbs
+    assert full.query_one('SELECT COUNT(*) FROM price_history')[0] == 12
+    assert change_only.query('SELECT product_id, seller_name, price, availability FROM price_history ORDER BY id') == [
+        (1, 'Amazon', 10.0, 'In Stock'), (1, 'Other', 12.0, 'In Stock'), (2, 'Amazon', 5.0, 'In Stock'),
+        (1, 'Amazon', 9.0, 'In Stock'), (1, 'Other', 12.0, 'Out of Stock'), (2, 'Amazon', 6.0, 'In Stock'),
+    ]
+    # Unchanged observations extend the period their row covers instead
+    assert change_only.query_one('SELECT COUNT(*) FROM price_history WHERE last_seen IS NULL OR last_seen < timestamp')[0] == 0
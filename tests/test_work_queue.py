@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+
+import pytest
+
+from amazon_price_tracker import AmazonPriceTracker
+from benchmark import BenchmarkServer, add_benchmark_products, synthetic_page
+from work_queue import SQLiteLeaseQueue, run_worker
+
+PRODUCTS = 3
+
+
+@pytest.fixture
+def server():
+    server = BenchmarkServer([synthetic_page(i) for i in range(1, 4)], latency_ms=0, jitter_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_node(tmp_path, name):
+    """A worker node with its own tracker and connection on the shared database"""
+    workdir = tmp_path / name
+    workdir.mkdir()
+    config_file = workdir / 'config.json'
+    config_file.write_text(json.dumps({
+        "tracking": {"max_workers": 2, "requests_per_second_per_host": 100000, "max_retries": 0},
+        "database": {"path": str(tmp_path / 'shared.db')},
+        "cache": {"enabled": False},
+        "retention": {"enabled": False}
+    }))
+    tracker = AmazonPriceTracker(str(config_file))
+    tracker.sent_alerts = []
+    tracker.send_price_alert = tracker.sent_alerts.extend
+    return tracker, SQLiteLeaseQueue(tracker.db, node_id=name, lease_seconds=0.5)
+
+
+@pytest.fixture
+def nodes(tmp_path, server):
+    node_a = make_node(tmp_path, 'node-a')
+    node_b = make_node(tmp_path, 'node-b')
+    product_ids = add_benchmark_products(node_a[0], server, PRODUCTS, 'QQ')
+    with node_a[0].db.transaction() as cursor:
+        # An older, higher price so the first check is an alert-worthy drop
+        cursor.executemany('''
+            INSERT INTO price_history (product_id, seller_name, price, availability) VALUES (?, 'Amazon', 1000, 'In Stock')
+        ''', [(product_id,) for product_id in product_ids])
+    yield node_a, node_b, product_ids
+    node_a[0].close()
+    node_b[0].close()
+
+
+def start_worker(tracker, queue):
+    stop = threading.Event()
+    thread = threading.Thread(target=run_worker, args=(tracker, queue, stop), daemon=True)
+    thread.start()
+    return stop, thread
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def checked_count(tracker):
+    return tracker.db.query_one('SELECT COUNT(*) FROM products WHERE is_active = TRUE AND last_checked IS NOT NULL')[0]
+
+
+def history_count(tracker):
+    return tracker.db.query_one('SELECT COUNT(*) FROM price_history WHERE price < 1000')[0]
+
+
+def test_stalled_node_loses_its_leases_without_double_alerts(nodes):
+    (tracker_a, queue_a), (tracker_b, queue_b), product_ids = nodes
+
+    # Node A claims every product, then stalls in the middle of the fetches
+    fetching = threading.Event()
+    resume = threading.Event()
+    fetch = tracker_a._get_product_info_with_retries
+
+    def stalled_fetch(url):
+        fetching.set()
+        resume.wait(10)
+        return fetch(url)
+
+    tracker_a._get_product_info_with_retries = stalled_fetch
+    stop_a, thread_a = start_worker(tracker_a, queue_a)
+    assert fetching.wait(10)
+    assert queue_b.claim(10) == []
+
+    # Node B takes the products over once A's leases expire
+    stop_b, thread_b = start_worker(tracker_b, queue_b)
+    wait_until(lambda: checked_count(tracker_b) == PRODUCTS)
+    stop_b.set()
+    thread_b.join(15)
+    recorded = history_count(tracker_b)
+
+    # A wakes up after its leases were taken over: its results are discarded
+    stop_a.set()
+    resume.set()
+    thread_a.join(15)
+    assert not thread_a.is_alive() and not thread_b.is_alive()
+
+    assert tracker_a.sent_alerts == []
+    assert sorted({change['product_id'] for change in tracker_b.sent_alerts}) == product_ids
+    assert len(tracker_b.sent_alerts) == recorded
+    assert history_count(tracker_a) == recorded
+    assert queue_a.status()['leased'] == 0
+
+
+def test_failed_record_releases_the_lease(nodes, monkeypatch):
+    (tracker_a, queue_a), _, product_ids = nodes
+    failing = product_ids[0]
+    record_prices = tracker_a.db.record_prices
+
+    def flaky_record(rows, product_id=None):
+        if product_id == failing:
+            raise RuntimeError("disk I/O error")
+        record_prices(rows, product_id)
+
+    monkeypatch.setattr(tracker_a.db, 'record_prices', flaky_record)
+    stop, thread = start_worker(tracker_a, queue_a)
+    wait_until(lambda: checked_count(tracker_a) == PRODUCTS - 1)
+    wait_until(lambda: tracker_a.db.query_one(
+        'SELECT lease_owner IS NULL FROM work_queue WHERE product_id = ?', (failing,))[0])
+    stop.set()
+    thread.join(15)
+
+    # The lease is handed back for a retry, not completed with nothing recorded
+    next_due, attempts = tracker_a.db.query_one(
+        'SELECT next_due, attempts FROM work_queue WHERE product_id = ?', (failing,))
+    assert attempts == 1
+    assert next_due <= time.time() + queue_a.retry_delay_seconds
+    assert tracker_a.db.query_one(
+        'SELECT COUNT(*) FROM price_history WHERE product_id = ? AND price < 1000', (failing,))[0] == 0
+    assert {change['product_id'] for change in tracker_a.sent_alerts} == set(product_ids[1:])
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Amazon Price Tracker - Work Queue
+Lets several worker nodes (processes or machines sharing the database)
+monitor one product list. Nodes claim batches of due products with
+expiring leases; a crashed node's leases expire and the products are
+picked up by another node. Every claim bumps a lease token, and results
+are only written (and alerted on) while the token still matches, so a
+product is never recorded or alerted twice for one check.
+
+Usage:
+  python work_queue.py [config.json] [--node-id NAME]   # run a worker node
+  python work_queue.py [config.json] --status           # show queue state
+"""
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import schedule
+
+from scheduling import ProductScheduler
+from storage import Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = {
+    "enabled": False,
+    "node_id": "",                   # Defaults to hostname-pid
+    "batch_size": 20,                # Products claimed at a time
+    "lease_seconds": 300,            # Must comfortably exceed the time to check one batch
+    "max_attempts": 5,               # Failed checks before waiting a full interval
+    "retry_delay_seconds": 300
+}
+
+
+class Lease:
+    """A claimed product check"""
+
+    def __init__(self, product_id: int, url: str, token: int, attempts: int):
+        self.product_id = product_id
+        self.url = url
+        self.token = token
+        self.attempts = attempts
+
+
+class SQLiteLeaseQueue:
+    """
+    Work queue in the work_queue table of the shared database. Another
+    backend only needs the same sync/claim/complete/release methods.
+    """
+
+    def __init__(self, db: Database, node_id: Optional[str] = None, lease_seconds: float = 300,
+                 max_attempts: int = 5, retry_delay_seconds: float = 300):
+        self.db = db
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+
+    def sync(self, default_interval_hours: float):
+        """Queue new active products (due one interval after their last check) and drop inactive ones"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT OR IGNORE INTO work_queue (product_id, next_due)
+                SELECT id, COALESCE(CAST(strftime('%s', last_checked) AS REAL) + ?, 0)
+                FROM products WHERE is_active = TRUE
+            ''', (default_interval_hours * 3600,))
+            cursor.execute('''
+                DELETE FROM work_queue
+                WHERE product_id NOT IN (SELECT id FROM products WHERE is_active = TRUE)
+            ''')
+
+    def claim(self, limit: int) -> List[Lease]:
+        """Lease up to `limit` due products that nobody else holds a live lease on"""
+        now = time.time()
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                SELECT product_id FROM work_queue
+                WHERE next_due <= ? AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY next_due
+                LIMIT ?
+            ''', (now, now, limit))
+            product_ids = [row[0] for row in cursor.fetchall()]
+            if not product_ids:
+                return []
+
+            cursor.executemany('''
+                UPDATE work_queue
+                SET lease_owner = ?, lease_expires = ?, lease_token = lease_token + 1, attempts = attempts + 1
+                WHERE product_id = ?
+            ''', [(self.node_id, now + self.lease_seconds, product_id) for product_id in product_ids])
+
+            cursor.execute(f'''
+                SELECT q.product_id, p.url, q.lease_token, q.attempts
+                FROM work_queue q JOIN products p ON p.id = q.product_id
+                WHERE q.product_id IN ({','.join('?' * len(product_ids))})
+            ''', product_ids)
+            return [Lease(*row) for row in cursor.fetchall()]
+
+    def complete(self, cursor, lease: Lease, next_due: float) -> bool:
+        """
+        Finish a check inside the caller's transaction. Returns False if the
+        lease was lost (expired and claimed by another node): the caller
+        must then discard its results.
+        """
+        cursor.execute('''
+            UPDATE work_queue
+            SET next_due = ?, lease_owner = NULL, lease_expires = NULL, attempts = 0
+            WHERE product_id = ? AND lease_token = ? AND lease_owner = ?
+        ''', (next_due, lease.product_id, lease.token, self.node_id))
+        return cursor.rowcount == 1
+
+    def release(self, lease: Lease, interval_hours: float) -> bool:
+        """Give a failed check back, retried later (after a full interval once attempts run out)"""
+        if lease.attempts >= self.max_attempts:
+            next_due = time.time() + interval_hours * 3600
+            attempts = 0
+        else:
+            next_due = time.time() + self.retry_delay_seconds
+            attempts = lease.attempts
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                UPDATE work_queue
+                SET next_due = ?, lease_owner = NULL, lease_expires = NULL, attempts = ?
+                WHERE product_id = ? AND lease_token = ? AND lease_owner = ?
+            ''', (next_due, attempts, lease.product_id, lease.token, self.node_id))
+            return cursor.rowcount == 1
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Time until the next product becomes claimable (None when the queue is empty)"""
+        row = self.db.query_one('''
+            SELECT MIN(MAX(next_due, COALESCE(lease_expires, 0))) FROM work_queue
+        ''')
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0.0)
+
+    def status(self) -> Dict:
+        now = time.time()
+        row = self.db.query_one('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(next_due <= ? AND (lease_expires IS NULL OR lease_expires < ?)), 0),
+                   COALESCE(SUM(lease_expires >= ?), 0),
+                   COALESCE(SUM(lease_expires < ?), 0),
+                   COUNT(DISTINCT CASE WHEN lease_expires >= ? THEN lease_owner END)
+            FROM work_queue
+        ''', (now, now, now, now, now))
+        return dict(zip(('products', 'due', 'leased', 'expired_leases', 'active_nodes'), row))
+
+
+def run_worker(tracker, queue: SQLiteLeaseQueue, stop: Optional[threading.Event] = None):
+    """
+    Claim, check and complete batches of due products until stopped.
+    Pages are fetched on the worker pool; results are written and leases
+    completed in one transaction per batch, then alerts are sent. A
+    product whose results cannot be written keeps no partial writes and
+    its lease is given back for a retry.
+    """
+    settings = tracker.config['queue']
+    default_hours = tracker.config['tracking']['check_interval_hours']
+    # Queue mode always checks continuously, so always jitter the next due times
+    scheduler = ProductScheduler(tracker.db, {**tracker.config['scheduling'], 'continuous': True}, default_hours)
+    max_workers = max(1, tracker.config['tracking']['max_workers'])
+    last_sync = 0.0
+
+    logger.info(f"Worker node {queue.node_id} started ({max_workers} workers, batches of {settings['batch_size']})")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while stop is None or not stop.is_set():
+            if time.monotonic() - last_sync >= 60:
+                schedule.run_pending()
+                queue.sync(default_hours)
+                last_sync = time.monotonic()
+
+            leases = queue.claim(settings['batch_size'])
+            if not leases:
+                delay = queue.seconds_until_next()
+                delay = min(delay if delay is not None else 10, 10)
+                if stop is not None:
+                    stop.wait(delay)
+                else:
+                    time.sleep(delay)
+                continue
+
+            started_at = time.monotonic()
+            futures = {executor.submit(tracker._get_product_info_with_retries, lease.url): lease for lease in leases}
+            fetched = []
+            failed = []
+            for future in as_completed(futures):
+                lease = futures[future]
+                try:
+                    fetched.append((lease, future.result()))
+                except Exception as e:
+                    logger.error(f"Product {lease.product_id} could not be checked: {e}")
+                    failed.append(lease)
+
+            elapsed = time.monotonic() - started_at
+            if elapsed > queue.lease_seconds / 2:
+                logger.warning(f"Batch took {elapsed:.0f}s, close to the {queue.lease_seconds}s lease; "
+                               f"lower queue.batch_size or raise queue.lease_seconds")
+
+            intervals = scheduler.intervals_for(lease.product_id for lease in leases)
+            changes = []
+            checked = 0
+            lost = 0
+            now = time.time()
+            with tracker.db.transaction() as cursor:
+                for lease, current_info in fetched:
+                    interval = intervals.get(lease.product_id, default_hours)
+                    try:
+                        # Completing the lease and recording the prices succeed or fail together
+                        with tracker.db.savepoint():
+                            if not queue.complete(cursor, lease, now + scheduler.next_delay(interval)):
+                                lost += 1
+                                continue
+                            product_changes = tracker.check_price_changes(lease.product_id, current_info,
+                                                                          raise_errors=True)
+                    except Exception as e:
+                        logger.error(f"Product {lease.product_id} could not be recorded: {e}")
+                        failed.append(lease)
+                        continue
+                    changes.extend(product_changes)
+                    checked += 1
+            for lease in failed:
+                queue.release(lease, intervals.get(lease.product_id, default_hours))
+
+            if lost:
+                logger.warning(f"{lost} leases expired and were taken over by other nodes, results discarded")
+
+            significant_changes = tracker._significant_changes(changes)
+            if significant_changes:
+                tracker.send_price_alert(significant_changes)
+
+            logger.info(f"Batch completed: {checked} checked, {len(failed)} failed, {lost} lost "
+                        f"in {elapsed:.1f}s")
+
+
+def create_queue(tracker) -> SQLiteLeaseQueue:
+    """Queue for the tracker's database and queue settings"""
+    settings = tracker.config['queue']
+    return SQLiteLeaseQueue(
+        tracker.db,
+        node_id=settings['node_id'] or None,
+        lease_seconds=settings['lease_seconds'],
+        max_attempts=settings['max_attempts'],
+        retry_delay_seconds=settings['retry_delay_seconds']
+    )
+
+
+def main():
+    from amazon_price_tracker import AmazonPriceTracker
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    tracker = AmazonPriceTracker(args[0] if args and args[0].endswith('.json') else 'config.json')
+    if '--node-id' in sys.argv:
+        tracker.config['queue']['node_id'] = sys.argv[sys.argv.index('--node-id') + 1]
+    queue = create_queue(tracker)
+
+    if '--status' in sys.argv:
+        queue.sync(tracker.config['tracking']['check_interval_hours'])
+        print(queue.status())
+        return
+
+    tracker.start_metrics_server()
+    try:
+        run_worker(tracker, queue)
+    except KeyboardInterrupt:
+        logger.info("Worker node stopped")
+    finally:
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()